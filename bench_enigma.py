@@ -0,0 +1,245 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from multiprocessing import cpu_count
+
+from enigma_cracker_plugboard import simulated_annealing_plugboard_search
+from enigma_crib_cracker import crack_with_crib
+from enigma_crib_cracker_mt import crack_with_crib_mt
+from enigma_machine_sim import REFLECTOR_B, ROTOR_WIRINGS, EnigmaMachine, Plugboard, Reflector, Rotor
+
+logger = logging.getLogger(__name__)
+
+# Speed and memory benchmarks for the engine, the crib crackers and the
+# plugboard annealer.
+#
+# Every benchmark reports a rate (units per second, best of `repeat` timed
+# runs) and the peak traced memory of one extra run under tracemalloc, which
+# is kept separate because tracing slows the code down (for the
+# multi-process cracker only the parent process is traced). Results are written
+# as JSON and can be compared against a stored baseline:
+#
+#   python bench_enigma.py --save-baseline          # record bench_baseline.json
+#   python bench_enigma.py --baseline bench_baseline.json --threshold 0.2
+#
+# The second command exits with status 1 if any rate dropped, or any peak
+# memory grew, by more than the threshold. Baselines are machine-specific.
+
+BENCH_ROTORS = ('II', 'IV', 'V')
+BENCH_POSITION = 'BLA'
+BENCH_PLUGBOARD = {'A': 'Q', 'E': 'Z', 'K': 'T', 'M': 'R'}
+BENCH_PLAINTEXT = "WETTERVORHERSAGEBISKAYAKEINEBESONDERENVORKOMMNISSE"
+BENCH_CRIB = "WETTERVORHERSAGE"
+
+ENCODE_LENGTHS = (100, 1000, 10000)
+
+# Memory is compared with some slack: tiny peaks jump around between runs.
+MEMORY_FLOOR_KIB = 64
+
+
+def bench_machine():
+    rotors = [
+        Rotor(*ROTOR_WIRINGS[rotor_id], position=pos)
+        for rotor_id, pos in zip(BENCH_ROTORS, BENCH_POSITION)
+    ]
+    return EnigmaMachine(rotors, Reflector(REFLECTOR_B), Plugboard(BENCH_PLUGBOARD))
+
+
+def bench_ciphertext():
+    return bench_machine().encode_message(BENCH_PLAINTEXT)
+
+
+def measure(fn, units, unit, repeat=3):
+    """
+    Time fn() `repeat` times and trace its memory once. `units` is the
+    amount of work one call does, in `unit`s.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "unit": unit,
+        "rate": units / best,
+        "seconds": best,
+        "peak_kib": peak / 1024,
+    }
+
+
+def bench_encode(length, repeat=3):
+    text = (BENCH_PLAINTEXT * (length // len(BENCH_PLAINTEXT) + 1))[:length]
+
+    def run():
+        bench_machine().encode_message(text)
+
+    return measure(run, length, "letters/s", repeat)
+
+
+def bench_crack_with_crib(rotor_orders, repeat=1):
+    ciphertext = bench_ciphertext()
+
+    def run():
+        crack_with_crib(ciphertext, BENCH_CRIB, BENCH_PLUGBOARD, rotor_orders=rotor_orders)
+
+    return measure(run, len(rotor_orders) * 26 ** 3, "candidates/s", repeat)
+
+
+def bench_crack_with_crib_mt(rotor_orders, workers, repeat=1):
+    ciphertext = bench_ciphertext()
+
+    def run():
+        crack_with_crib_mt(
+            ciphertext, BENCH_CRIB, BENCH_PLUGBOARD, max_workers=workers, rotor_orders=rotor_orders
+        )
+
+    return measure(run, len(rotor_orders) * 26 ** 3, "candidates/s", repeat)
+
+
+def bench_annealer(iterations, repeat=3):
+    ciphertext = bench_ciphertext()
+
+    def run():
+        random.seed(0)
+        simulated_annealing_plugboard_search(
+            ciphertext, BENCH_CRIB, BENCH_ROTORS, BENCH_POSITION,
+            {'A': 'B', 'B': 'A', 'C': 'D', 'D': 'C'},
+            num_iterations=iterations,
+        )
+
+    return measure(run, iterations, "iterations/s", repeat)
+
+
+def bench_startup(repeat=5):
+    """Whole-process `enigma encode` of a short message, as a shell pipeline runs it."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "enigma_cli.py")
+    command = [sys.executable, script, "encode", BENCH_PLAINTEXT[:20], "--plugboard", "AB", "CD"]
+
+    def run():
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+
+    return measure(run, 1, "runs/s", repeat)
+
+
+def worker_counts(maximum=None):
+    """1, 2, 4, ... up to `maximum` (default: cpu_count()), always including it."""
+    maximum = maximum or cpu_count()
+    counts = []
+    n = 1
+    while n < maximum:
+        counts.append(n)
+        n *= 2
+    counts.append(maximum)
+    return counts
+
+
+def run_benchmarks(quick=False, workers=None):
+    """Run every benchmark and return the results keyed by name."""
+    rotor_orders = [BENCH_ROTORS] if quick else [BENCH_ROTORS, ('I', 'II', 'III'), ('V', 'III', 'I')]
+    lengths = ENCODE_LENGTHS[:2] if quick else ENCODE_LENGTHS
+    results = {}
+    for length in lengths:
+        results[f"encode_message[{length}]"] = bench_encode(length)
+    results["crack_with_crib"] = bench_crack_with_crib(rotor_orders)
+    results["simulated_annealing_plugboard_search"] = bench_annealer(500 if quick else 5000)
+    results["enigma_encode_startup"] = bench_startup(3 if quick else 5)
+
+    counts = workers or worker_counts()
+    single = None
+    for count in counts:
+        result = bench_crack_with_crib_mt(rotor_orders, count)
+        single = single or result["rate"] / count
+        # Parallel efficiency relative to the smallest worker count measured
+        result["efficiency"] = result["rate"] / (single * count)
+        results[f"crack_with_crib_mt[workers={count}]"] = result
+    return results
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    Regressions of `results` against `baseline` (both keyed by benchmark
+    name): a rate more than `threshold` below the baseline, or a peak memory
+    more than `threshold` above it. Benchmarks missing from either side are
+    skipped. Returns a list of messages, empty when nothing regressed.
+    """
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if result["rate"] < old["rate"] * (1 - threshold):
+            regressions.append(
+                f"{name}: {result['rate']:.0f} {result['unit']} vs baseline {old['rate']:.0f} "
+                f"({result['rate'] / old['rate'] - 1:+.0%})"
+            )
+        allowed = max(old["peak_kib"], MEMORY_FLOOR_KIB) * (1 + threshold)
+        if result["peak_kib"] > allowed:
+            regressions.append(
+                f"{name}: peak memory {result['peak_kib']:.0f} KiB vs baseline {old['peak_kib']:.0f} KiB"
+            )
+    return regressions
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enigma benchmarks")
+    parser.add_argument("--output", default="bench_results.json", help="where to write the results")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results to bench_baseline.json")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression (0.2 = 20%%)")
+    parser.add_argument("--quick", action="store_true", help="smaller workloads")
+    parser.add_argument("--workers", help="comma-separated worker counts for the scaling sweep")
+    args = parser.parse_args(argv)
+    if args.baseline and not os.path.exists(args.baseline):
+        parser.error(f"baseline file not found: {args.baseline}")
+
+    workers = [int(n) for n in args.workers.split(",")] if args.workers else None
+    results = run_benchmarks(quick=args.quick, workers=workers)
+    report = {"environment": environment(), "results": results}
+
+    for name, result in results.items():
+        print(f"{name:45} {result['rate']:>14,.0f} {result['unit']:14} peak {result['peak_kib']:>10,.0f} KiB")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open("bench_baseline.json", "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for message in regressions:
+            print("REGRESSION", message)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    sys.exit(main())
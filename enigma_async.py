@@ -0,0 +1,136 @@
+import asyncio
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from enigma_crib_cracker_mt import POSITIONS
+from enigma_jobs import crack_range
+from enigma_machine_sim import ROTOR_WIRINGS
+from enigma_pool import chunk_ranges
+
+logger = logging.getLogger(__name__)
+
+# asyncio front end for the crib search.
+#
+#     async for (rotor_ids, pos), decoded in crack_async(ciphertext, crib):
+#         ...
+#
+# Shards run on a process pool through run_in_executor, so the event loop
+# never blocks, and matches are yielded as soon as their shard finishes.
+# Backpressure: a job has at most `max_in_flight` shards running or waiting
+# to hand over their matches, and matches wait in a queue of `queue_size`
+# until the consumer takes them, so a slow consumer stops new shards from
+# being submitted. Cancelling the consuming task (or leaving the loop
+# early) cancels the job: queued shards are dropped and only those already
+# running in the pool finish.
+#
+# Several jobs can share one SharedPool. Every shard takes one of the
+# pool's slots first, and asyncio.Semaphore wakes waiters in FIFO order, so
+# with all slots busy the jobs take turns instead of the first job starving
+# the rest.
+
+
+class SharedPool:
+    def __init__(self, executor, slots=None):
+        """
+        Share `executor` between crack jobs, with at most `slots` shards
+        submitted at a time (twice the worker count by default).
+        """
+        self.executor = executor
+        if slots is None:
+            slots = 2 * getattr(executor, "_max_workers", 1)
+        self.slots = slots
+        self._semaphore = asyncio.Semaphore(slots)
+        self.in_flight = 0
+
+    async def run(self, fn, *args):
+        """Run fn(*args) in the pool once a slot is free."""
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+            finally:
+                self.in_flight -= 1
+
+
+_DONE = object()
+
+
+async def crack_async(
+    ciphertext,
+    crib,
+    plugboard_pairs=None,
+    rotor_orders=None,
+    pool=None,
+    shard_size=512,
+    max_in_flight=4,
+    queue_size=16,
+):
+    """
+    Async generator of crib matches, ((rotor_ids, pos), decoded) like
+    crack_with_crib, in the order shards finish. Without a SharedPool a
+    private process pool is started for the job and shut down after it.
+    """
+    ciphertext = ciphertext.upper().replace(' ', '')
+    crib = crib.upper()
+    if rotor_orders is None:
+        rotor_orders = list(itertools.permutations(ROTOR_WIRINGS.keys(), 3))
+    shards = [
+        (rotor_ids, start, stop)
+        for rotor_ids in rotor_orders
+        for start, stop in chunk_ranges(len(POSITIONS), shard_size)
+    ]
+
+    own_executor = None
+    if pool is None:
+        own_executor = ProcessPoolExecutor()
+        pool = SharedPool(own_executor)
+
+    queue = asyncio.Queue(maxsize=queue_size)
+    in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def run_shard(rotor_ids, start, stop):
+        try:
+            found = await pool.run(crack_range, rotor_ids, start, stop, ciphertext, crib, plugboard_pairs)
+            for match in found:
+                await queue.put(match)
+        finally:
+            in_flight.release()
+
+    async def produce():
+        tasks = set()
+        try:
+            for rotor_ids, start, stop in shards:
+                await in_flight.acquire()
+                task = asyncio.create_task(run_shard(rotor_ids, start, stop))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+            await queue.put(_DONE)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+        except Exception as e:
+            for task in tasks:
+                task.cancel()
+            await queue.put(e)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
+        if own_executor is not None:
+            own_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,141 @@
+import logging
+
+import numpy as np
+from enigma_crib_cracker_np import rotor_arrays, turnover_counts
+from enigma_machine_sim import LETTER_INDEX, M4_ROTOR_WIRINGS, REFLECTOR_B, wiring_to_table
+
+logger = logging.getLogger(__name__)
+
+# Many messages, each with its own key, encoded as one array job. A key is
+# (rotor_ids, positions, plugboard_pairs), e.g. (('I', 'II', 'III'), 'AQZ',
+# {'A': 'B'}), optionally followed by ring settings such as 'AJX'. Messages
+# go along axis 0 and key presses along axis 1; the rotor offsets of every
+# cell come from the same closed-form stepping as EnigmaMachine.advance,
+# and the wirings of all rotors sit in one stacked table, so each pass
+# through the scrambler is one gather for the batch.
+
+ROTOR_IDS = list(M4_ROTOR_WIRINGS)
+
+# Messages x key presses per block, to keep memory flat for big batches.
+BATCH_CELLS = 1 << 22
+
+
+def stacked_rotor_arrays():
+    """Forward/backward shifted tables of every rotor, shaped (rotors, 26, 26)."""
+    forward, backward = zip(*(rotor_arrays(rotor_id) for rotor_id in ROTOR_IDS))
+    return np.stack(forward), np.stack(backward)
+
+
+def key_arrays(keys):
+    """Rotor indices, notches, start offsets, ring offsets and plugboard tables per key."""
+    rotor_index = {rotor_id: k for k, rotor_id in enumerate(ROTOR_IDS)}
+    rotors = np.array([[rotor_index[r] for r in key[0]] for key in keys], dtype=np.intp)
+    # Two notch columns; single-notch rotors repeat theirs, counted once
+    notches = np.array(
+        [[LETTER_INDEX[c] for c in (notch * 2)[:2]] for _, notch in M4_ROTOR_WIRINGS.values()]
+    )[rotors]
+    starts = np.array([[LETTER_INDEX[c] for c in key[1]] for key in keys], dtype=np.int64)
+    rings = np.array(
+        [[LETTER_INDEX[c] for c in (key[3] if len(key) > 3 else "AAA")] for key in keys], dtype=np.int64
+    )
+    # Same cable rule as Plugboard.set_swaps, without building the objects
+    plug = []
+    for key in keys:
+        pairs = key[2]
+        table = list(range(26))
+        for a, b in (pairs or {}).items():
+            a, b = LETTER_INDEX[a], LETTER_INDEX[b]
+            table[a] = b
+            table[b] = a
+        plug.append(table)
+    return rotors, notches, starts, rings, np.array(plug, dtype=np.uint8)
+
+
+def rotor_turnovers(steps, start, notches):
+    """turnover_counts for per-key (first, second) notch pairs, shaped (keys, 2)."""
+    first, second = notches[:, 0:1], notches[:, 1:2]
+    return turnover_counts(steps, start, first) + np.where(
+        second != first, turnover_counts(steps, start, second), 0
+    )
+
+
+def encode_letter_block(letters, rotors, notches, starts, rings, plug, forward, backward, reflector):
+    """
+    Encode a (messages, presses) uint8 array of letter indices, where row k
+    uses key k and column j is the (j + 1)-th key press. Stepping follows the
+    window offsets; the wirings sit at the window offsets minus the rings.
+    """
+    rows = np.arange(letters.shape[0])[:, None]
+    presses = np.arange(1, letters.shape[1] + 1)[None, :]
+    left, middle, right = (starts[:, k:k + 1] for k in range(3))
+    middle_steps = rotor_turnovers(presses, right, notches[:, 2])
+    left_steps = rotor_turnovers(middle_steps, middle, notches[:, 1])
+    # Row offsets into the flattened (rotors, 26, 26) tables, so every pass
+    # through a rotor is a single flat gather
+    left, middle, right = (left - rings[:, 0:1], middle - rings[:, 1:2], right - rings[:, 2:3])
+    base_l = (rotors[:, 0:1] * 26 + (left + left_steps) % 26) * 26
+    base_m = (rotors[:, 1:2] * 26 + (middle + middle_steps) % 26) * 26
+    base_r = (rotors[:, 2:3] * 26 + (right + presses) % 26) * 26
+    forward = forward.reshape(-1)
+    backward = backward.reshape(-1)
+
+    x = plug[rows, letters]
+    x = forward[base_r + x]
+    x = forward[base_m + x]
+    x = forward[base_l + x]
+    x = reflector[x]
+    x = backward[base_l + x]
+    x = backward[base_m + x]
+    x = backward[base_r + x]
+    return plug[rows, x]
+
+
+def encode_batch(keys, messages):
+    """
+    Encode messages[k] with keys[k] and return the list of ciphertexts,
+    identical to EnigmaMachine.encode_message with the same settings.
+    """
+    if len(keys) != len(messages):
+        raise ValueError("Need exactly one key per message")
+    if not messages:
+        return []
+    texts = [message.upper().replace(' ', '') for message in messages]
+    forward, backward = stacked_rotor_arrays()
+    reflector = np.array(wiring_to_table(REFLECTOR_B), dtype=np.uint8)
+
+    # All messages side by side in one UTF-32 buffer: one code per character,
+    # so non-letters of any kind are copied through unchanged.
+    codes = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32).copy()
+    char_ends = np.cumsum([len(text) for text in texts])
+    is_letter = (codes >= 65) & (codes <= 90)
+    letter_at = np.flatnonzero(is_letter)
+    letter_message = np.searchsorted(char_ends, letter_at, side="right")
+    lengths = np.bincount(letter_message, minlength=len(texts))
+    # Key press number of each letter within its message
+    letter_press = np.arange(len(letter_at)) - np.concatenate(([0], np.cumsum(lengths)[:-1]))[letter_message]
+
+    # Messages sorted by length, so similar lengths share a block and little
+    # padding gets encoded. Padding letters are encoded but never read back.
+    order = np.argsort(lengths, kind="stable")
+    row_of = np.empty(len(texts), dtype=np.intp)
+    row_of[order] = np.arange(len(texts))
+    letter_row = row_of[letter_message]
+    start = 0
+    while start < len(order):
+        stop = start + 1
+        while stop < len(order) and (stop + 1 - start) * lengths[order[stop]] <= BATCH_CELLS:
+            stop += 1
+        block = order[start:stop]
+        selected = (letter_row >= start) & (letter_row < stop)
+        rows = letter_row[selected] - start
+        presses = letter_press[selected]
+        letters = np.zeros((len(block), max(1, int(lengths[block[-1]]))), dtype=np.uint8)
+        letters[rows, presses] = codes[letter_at[selected]] - 65
+        rotors, notches, starts, rings, plug = key_arrays([keys[k] for k in block])
+        out = encode_letter_block(letters, rotors, notches, starts, rings, plug, forward, backward, reflector)
+        codes[letter_at[selected]] = out[rows, presses] + 65
+        start = stop
+
+    encoded = codes.tobytes().decode('utf-32-le')
+    char_starts = char_ends - [len(text) for text in texts]
+    return [encoded[a:b] for a, b in zip(char_starts.tolist(), char_ends.tolist())]
@@ -0,0 +1,259 @@
+import itertools
+import logging
+from collections import deque
+
+import numpy as np
+from enigma_crib_cracker import legal_crib_offsets
+from enigma_crib_cracker_np import POSITIONS, scrambler_arrays, start_offsets
+from enigma_machine_sim import ALPHABET, LETTER_INDEX, ROTOR_WIRINGS
+from enigma_table_store import table_scramblers
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+
+# Turing-Welchman bombe for crib attacks with an unknown plugboard.
+#
+# Placing the crib against the ciphertext gives a "menu": a graph whose nodes
+# are letters and whose edges join crib[j] and ciphertext[offset + j] through
+# the scrambler at that letter. With plugboard P and scrambler S_t at letter t,
+# every edge (a, b, t) requires S_t(P(a)) == P(b). Guessing P for one letter
+# of a connected menu fixes P for all the others, and every loop in the menu
+# gives a closure that the guess has to satisfy. Rotor positions (stops) where
+# no guess survives are rejected without ever enumerating plugboards.
+
+
+class Menu:
+    def __init__(self, ciphertext, crib, offset):
+        self.offset = offset
+        self.edges = []
+        letter_index = 0
+        for i, c in enumerate(ciphertext):
+            if c not in LETTER_INDEX:
+                continue
+            j = i - offset
+            if 0 <= j < len(crib) and crib[j] in LETTER_INDEX:
+                self.edges.append((LETTER_INDEX[crib[j]], LETTER_INDEX[c], letter_index))
+            letter_index += 1
+
+        self.neighbours = {}
+        for k, (a, b, _) in enumerate(self.edges):
+            self.neighbours.setdefault(a, []).append((b, k))
+            self.neighbours.setdefault(b, []).append((a, k))
+        self.letters = sorted(self.neighbours)
+        self.components = self._find_components()
+
+    def _find_components(self):
+        """
+        Split the menu into connected components. Each one is returned as
+        (root, tree, closures): `tree` lists (parent, child, edge) in BFS
+        order and `closures` lists the edges that close a loop. Components
+        are sorted so that the one with the most loops comes first, and its
+        most connected letter is the root (the bombe's test register).
+        """
+        components = []
+        seen = set()
+        for start in sorted(self.letters, key=lambda x: -len(self.neighbours[x])):
+            if start in seen:
+                continue
+            seen.add(start)
+            tree, closures, used = [], [], set()
+            queue = deque([start])
+            while queue:
+                a = queue.popleft()
+                for b, k in self.neighbours[a]:
+                    if k in used:
+                        continue
+                    used.add(k)
+                    if b in seen:
+                        closures.append(k)
+                    else:
+                        seen.add(b)
+                        tree.append((a, b, k))
+                        queue.append(b)
+            components.append((start, tree, closures))
+        components.sort(key=lambda component: -len(component[2]))
+        return components
+
+    @property
+    def loops(self):
+        """Number of independent loops (closures) in the menu."""
+        return sum(len(closures) for _, _, closures in self.components)
+
+    @property
+    def positions(self):
+        return [t for _, _, t in self.edges]
+
+
+def prune_stops(menu, scramblers):
+    """
+    Vectorized test of the menu's main component for a block of stops.
+    `scramblers` has shape (stops, edges, 26). Returns a (stops, 26) bool
+    array: entry [s, x] is True when the guess P(root) = x survives at stop s.
+    """
+    root, tree, closures = menu.components[0]
+    stops = scramblers.shape[0]
+    values = {root: np.broadcast_to(np.arange(26, dtype=np.uint8), (stops, 26))}
+    for parent, child, k in tree:
+        values[child] = np.take_along_axis(scramblers[:, k, :], values[parent], axis=1)
+
+    alive = np.ones((stops, 26), dtype=bool)
+    for k in closures:
+        a, b, _ = menu.edges[k]
+        alive &= np.take_along_axis(scramblers[:, k, :], values[a], axis=1) == values[b]
+
+    # Diagonal board: the plugboard is an involution, so P(u) = v forces
+    # P(v) = u, and two letters can never share a partner.
+    letters = list(values)
+    for u, v in itertools.combinations(letters, 2):
+        alive &= values[u] != values[v]
+        alive &= (values[u] != v) | (values[v] == u)
+        alive &= (values[v] != u) | (values[u] == v)
+    return alive
+
+
+def propagate(menu, scrambler, plug, letter, partner):
+    """
+    Apply the hypothesis P(letter) = partner to the partial plugboard `plug`
+    (a list with -1 for unknown) and follow every implication through the
+    menu and the diagonal board. Returns False on a contradiction.
+    """
+    queue = deque([(letter, partner)])
+    while queue:
+        a, y = queue.popleft()
+        if plug[a] == y:
+            continue
+        if plug[a] != -1 or (plug[y] != -1 and plug[y] != a):
+            return False
+        plug[a] = y
+        if plug[y] == -1:
+            queue.append((y, a))
+        for b, k in menu.neighbours.get(a, ()):
+            queue.append((b, scrambler[k][y]))
+    return True
+
+
+def solve_stop(menu, scrambler, guesses):
+    """
+    Complete the plugboard for one stop, trying each surviving guess for the
+    main component and the first consistent guess for every other component.
+    Returns a list of plugboards (lists of 26 partners, -1 for unknown).
+    """
+    solutions = []
+    for guess in guesses:
+        plug = [-1] * 26
+        if not propagate(menu, scrambler, plug, menu.components[0][0], guess):
+            continue
+        if complete_components(menu, scrambler, plug, 1):
+            solutions.append(plug)
+    return solutions
+
+
+def complete_components(menu, scrambler, plug, index):
+    if index == len(menu.components):
+        return True
+    root = menu.components[index][0]
+    if plug[root] != -1:
+        return complete_components(menu, scrambler, plug, index + 1)
+    for guess in range(26):
+        attempt = list(plug)
+        if propagate(menu, scrambler, attempt, root, guess) and complete_components(
+            menu, scrambler, attempt, index + 1
+        ):
+            plug[:] = attempt
+            return True
+    return False
+
+
+def plug_to_pairs(plug):
+    """Turn a partner list into a plugboard_pairs dict, one entry per cable."""
+    return {
+        ALPHABET[a]: ALPHABET[b]
+        for a, b in enumerate(plug)
+        if b != -1 and a < b
+    }
+
+
+def bombe_rotor_order(rotor_ids, menu, block=4096, store=None):
+    """
+    Run the bombe for one rotor order and menu over all start positions.
+    Returns ((rotor_ids, pos), offset, plugboard_pairs) for every stop.
+    With an enigma_table_store.TableStore the scramblers are read from its
+    precomputed tables instead of being recomputed.
+    """
+    if not menu.edges:
+        return []
+    left, middle, right = start_offsets()
+    positions = menu.positions
+    table = store.table(rotor_ids) if store is not None else None
+    stops = []
+    for start in range(0, len(POSITIONS), block):
+        stop = min(start + block, len(POSITIONS))
+        block_offsets = (left[start:stop], middle[start:stop], right[start:stop])
+        if table is not None:
+            scramblers = table_scramblers(table, rotor_ids, positions, *block_offsets)
+        else:
+            scramblers = scrambler_arrays(rotor_ids, positions, *block_offsets)
+        alive = prune_stops(menu, scramblers)
+        for row in np.flatnonzero(alive.any(axis=1)):
+            scrambler = scramblers[row].tolist()
+            guesses = np.flatnonzero(alive[row]).tolist()
+            for plug in solve_stop(menu, scrambler, guesses):
+                stops.append(((rotor_ids, POSITIONS[start + row]), menu.offset, plug_to_pairs(plug)))
+    return stops
+
+
+def crack_with_bombe(ciphertext, crib, offsets=None, rotor_orders=None, store=None):
+    """
+    Crib attack with an unknown plugboard. Every legal crib offset (or the
+    given `offsets`) is turned into a menu and run against all rotor orders
+    and start positions.
+
+    Returns a list of ((rotor_ids, pos), offset, plugboard_pairs) stops. The
+    pairs are the cables deduced from the menu letters; letters that do not
+    appear in the menu are left unplugged.
+
+    Pass an enigma_table_store.TableStore as `store` to look the scramblers
+    up in its memory-mapped tables.
+    """
+    crib = crib.upper()
+    ciphertext = ciphertext.upper().replace(' ', '')
+    if offsets is None:
+        offsets = legal_crib_offsets(ciphertext, crib)
+    if rotor_orders is None:
+        rotor_orders = list(itertools.permutations(ROTOR_WIRINGS.keys(), 3))
+
+    menus = [Menu(ciphertext, crib, offset) for offset in offsets]
+    for menu in menus:
+        logger.info(f"Menu at offset {menu.offset}: {len(menu.letters)} letters, {menu.loops} loops")
+        if menu.loops == 0:
+            logger.warning(f"Menu at offset {menu.offset} has no loops; expect many false stops")
+
+    found = []
+    for rotor_ids in tqdm(rotor_orders, desc="Rotor Orders"):
+        for menu in menus:
+            for result in bombe_rotor_order(rotor_ids, menu, store=store):
+                logger.info(f"[Stop] Rotors: {rotor_ids}, Pos: {result[0][1]}, Offset: {menu.offset}, Plugboard: {result[2]}")
+                found.append(result)
+    return found
+
+
+if __name__ == "__main__":
+    from enigma_machine_sim import REFLECTOR_B, EnigmaMachine, Plugboard, Reflector, Rotor
+
+    logging.basicConfig(level=logging.INFO)
+
+    true_plugboard = {'A': 'M', 'F': 'I', 'N': 'V', 'P': 'S', 'T': 'U', 'W': 'Z',
+                      'B': 'Q', 'C': 'G', 'D': 'L', 'E': 'K'}
+    plaintext = "WETTERVORHERSAGEBISKAYAKEINEBESONDERENVORKOMMNISSE"
+    test_rotors = [
+        Rotor(*ROTOR_WIRINGS['II'], position='K'),
+        Rotor(*ROTOR_WIRINGS['V'], position='D'),
+        Rotor(*ROTOR_WIRINGS['III'], position='R'),
+    ]
+    test_machine = EnigmaMachine(test_rotors, Reflector(REFLECTOR_B), Plugboard(true_plugboard))
+    ciphertext = test_machine.encode_message(plaintext)
+    print("Generated Ciphertext:", ciphertext)
+
+    stops = crack_with_bombe(ciphertext, "WETTERVORHERSAGEBISKAYA", offsets=[0])
+    for (rotor_ids, pos), offset, pairs in stops:
+        print(f"Stop at rotors {rotor_ids} position {pos} offset {offset}: {pairs}")
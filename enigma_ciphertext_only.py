@@ -0,0 +1,172 @@
+import heapq
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import cpu_count
+
+import numpy as np
+from enigma_cracker_plugboard import PlugboardDecryption
+from enigma_crib_cracker_np import BLOCK_CELLS, POSITIONS, decode_block, start_offsets
+from enigma_machine_sim import ALPHABET, LETTER_INDEX, REFLECTOR_B, ROTOR_WIRINGS, wiring_to_table
+from enigma_scoring import IoCScorer
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+
+# Ciphertext-only attack. The plugboard only relabels letters on the way in
+# and out, so the right rotor order and start position already produce a
+# decryption with a clearly higher index of coincidence than random text,
+# even with the plugboard left out. Stage one ranks the whole keyspace by
+# that IoC; stage two hill-climbs a plugboard for the best few candidates.
+
+
+def rank_rotor_order(rotor_ids, cipher_letters, keep):
+    """
+    IoC of the plugboard-free decryption for every start position of one
+    rotor order. Returns the `keep` best as (ioc, rotor_ids, pos) tuples.
+    """
+    plug = np.arange(26, dtype=np.uint8)
+    reflector = np.array(wiring_to_table(REFLECTOR_B), dtype=np.uint8)
+    left, middle, right = start_offsets()
+    scorer = IoCScorer(weight=1.0)
+
+    best = []
+    block = max(1, BLOCK_CELLS // max(1, len(cipher_letters)))
+    for start in range(0, len(POSITIONS), block):
+        stop = min(start + block, len(POSITIONS))
+        decoded = decode_block(
+            rotor_ids, cipher_letters, plug, reflector,
+            left[start:stop], middle[start:stop], right[start:stop],
+        )
+        ioc = scorer.score_batch(decoded + 65)
+        for row in np.argsort(ioc)[-keep:]:
+            candidate = (float(ioc[row]), rotor_ids, POSITIONS[start + row])
+            if len(best) < keep:
+                heapq.heappush(best, candidate)
+            else:
+                heapq.heappushpop(best, candidate)
+    return best
+
+
+def rank_by_ioc(ciphertext, keep=100, rotor_orders=None, max_workers=None):
+    """
+    Stage one: rank all rotor orders and start positions by the IoC of the
+    plugboard-free decryption and return the `keep` best, best first.
+    Rotor orders are spread over `max_workers` processes (1 runs inline).
+    """
+    if rotor_orders is None:
+        rotor_orders = list(itertools.permutations(ROTOR_WIRINGS.keys(), 3))
+    cipher_letters = np.array(
+        [LETTER_INDEX[c] for c in ciphertext if c in LETTER_INDEX], dtype=np.uint8
+    )
+    num_workers = max_workers or cpu_count()
+
+    best = []
+    if num_workers == 1:
+        results = (rank_rotor_order(rotor_ids, cipher_letters, keep) for rotor_ids in rotor_orders)
+        for result in tqdm(results, total=len(rotor_orders), desc="IoC sweep"):
+            best.extend(result)
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            results = executor.map(
+                rank_rotor_order,
+                rotor_orders,
+                itertools.repeat(cipher_letters),
+                itertools.repeat(keep),
+            )
+            for result in tqdm(results, total=len(rotor_orders), desc="IoC sweep"):
+                best.extend(result)
+    return heapq.nlargest(keep, best)
+
+
+def hill_climb_plugboard(decryption, scorer, max_pairs=10):
+    """
+    Greedy plugboard search: in each round try every cable A-B (re-plugging
+    letters that are already used) and keep the one that improves the score
+    most, until `max_pairs` cables are placed or nothing improves.
+    Returns (plugboard, score) with the plugboard as a symmetric dict.
+    """
+    plugboard = {}
+    text = decryption.decrypt(plugboard)
+    score = scorer.score(text)
+
+    while True:
+        best = None
+        for a, b in itertools.combinations(ALPHABET, 2):
+            if plugboard.get(a) == b:
+                continue
+            trial = dict(plugboard)
+            for letter in (a, b):
+                partner = trial.pop(letter, None)
+                if partner is not None:
+                    trial.pop(partner, None)
+            if len(trial) // 2 >= max_pairs:
+                continue
+            trial[a] = b
+            trial[b] = a
+            trial_text = decryption.decrypt(trial)
+            changed = np.flatnonzero(trial_text != text)
+            trial_score = scorer.rescore(text, trial_text, changed, score)
+            if trial_score > score and (best is None or trial_score > best[1]):
+                best = (trial, trial_score, trial_text)
+        if best is None:
+            return plugboard, score
+        plugboard, score, text = best
+
+
+def crack_ciphertext_only(
+    ciphertext,
+    survivors=100,
+    max_pairs=10,
+    scorer=None,
+    rotor_orders=None,
+    max_workers=None,
+):
+    """
+    Ciphertext-only attack: rank the keyspace by IoC, keep the best
+    `survivors` rotor settings, and hill-climb a plugboard for each.
+
+    `scorer` is used for the hill-climb (default: IoC; a quadgram scorer
+    from enigma_scoring works better on longer messages).
+
+    Returns a list of ((rotor_ids, pos, plugboard), score, decrypted), best
+    first.
+    """
+    ciphertext = ciphertext.upper().replace(' ', '')
+    if scorer is None:
+        scorer = IoCScorer()
+
+    candidates = rank_by_ioc(ciphertext, survivors, rotor_orders, max_workers)
+    logger.info(f"Kept {len(candidates)} rotor settings for the plugboard hill-climb")
+
+    results = []
+    for ioc, rotor_ids, pos in tqdm(candidates, desc="Plugboard hill-climb"):
+        decryption = PlugboardDecryption(ciphertext, rotor_ids, pos)
+        plugboard, score = hill_climb_plugboard(decryption, scorer, max_pairs)
+        decrypted = decryption.decrypt(plugboard).tobytes().decode("latin-1")
+        results.append(((rotor_ids, pos, plugboard), score, decrypted))
+    results.sort(key=lambda result: result[1], reverse=True)
+    return results
+
+
+if __name__ == "__main__":
+    from enigma_machine_sim import EnigmaMachine, Plugboard, Reflector, Rotor
+
+    logging.basicConfig(level=logging.INFO)
+
+    plaintext = (
+        "THEWEATHERREPORTFORTHENORTHERNSECTORFOLLOWSATDAWNNOENEMYACTIVITYWASOBSERVED"
+        "OVERNIGHTANDTHECONVOYWILLPROCEEDASPLANNEDTOTHEHARBOURWHERETHESUPPLYSHIPSARE"
+        "WAITINGFORFURTHERORDERSFROMTHEHEADQUARTERSOFTHENORTHERNCOMMANDSTOP"
+    )
+    test_rotors = [
+        Rotor(*ROTOR_WIRINGS['IV'], position='G'),
+        Rotor(*ROTOR_WIRINGS['I'], position='M'),
+        Rotor(*ROTOR_WIRINGS['V'], position='C'),
+    ]
+    test_machine = EnigmaMachine(test_rotors, Reflector(REFLECTOR_B), Plugboard({'A': 'K', 'E': 'Q'}))
+    ciphertext = test_machine.encode_message(plaintext)
+    print("Generated Ciphertext:", ciphertext)
+
+    for (rotor_ids, pos, plugboard), score, decrypted in crack_ciphertext_only(ciphertext, survivors=10)[:3]:
+        print(f"Rotors: {rotor_ids}, Position: {pos}, Score: {score:.1f}, Decrypted: {decrypted}")
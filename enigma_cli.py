@@ -0,0 +1,156 @@
+import argparse
+import logging
+import sys
+
+from enigma_stream import add_key_arguments, encode_file, machine_from_args, parse_plugboard
+
+logger = logging.getLogger(__name__)
+
+# The `enigma` command.
+#
+#   enigma encode [TEXT] --rotors I II III --positions AQZ ...   (stdin if no TEXT)
+#   enigma decode ...                                           (same operation)
+#   enigma crack-crib CIPHERTEXT CRIB [--engine np|mt|python] [--rings]
+#   enigma crack-plugboard CIPHERTEXT CRIB --rotors ... --positions ...
+#   enigma bench [--quick --baseline FILE ...]                 (bench_enigma options)
+#
+# Shell pipelines may run `enigma encode` thousands of times, so startup
+# matters: this module only imports argparse and the pure-Python machine,
+# and NumPy, tqdm and the process pools are imported by the subcommands that
+# use them. STARTUP_BUDGET is the wall time allowed for a whole `enigma
+# encode` of a short message; bench_enigma measures it and a test keeps it.
+# The crack subcommands print their matches and write no files.
+
+STARTUP_BUDGET = 0.5
+
+
+def encode(args, parser):
+    machine = machine_from_args(parser, args)
+    if args.text is not None:
+        print(machine.encode_message(" ".join(args.text)))
+        return 0
+    encode_chunk = None
+    if args.table:
+        from enigma_stream import keystream_encoder
+
+        encode_chunk = keystream_encoder(machine)
+    encode_file(machine, sys.stdin.buffer, sys.stdout.buffer, encode_chunk=encode_chunk)
+    sys.stdout.flush()
+    return 0
+
+
+def crack_crib(args, parser):
+    try:
+        plugboard = parse_plugboard(args.plugboard)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.rings and args.engine != "np":
+        parser.error("--rings needs --engine np")
+
+    if args.engine == "np":
+        from enigma_crib_cracker_np import crack_with_crib_np, crack_with_crib_rings_np
+
+        crack = crack_with_crib_rings_np if args.rings else crack_with_crib_np
+        matches = crack(args.ciphertext, args.crib, plugboard, output=None)
+    elif args.engine == "mt":
+        from enigma_crib_cracker_mt import crack_with_crib_mt
+
+        matches = crack_with_crib_mt(
+            args.ciphertext, args.crib, plugboard, max_workers=args.workers, output=None
+        )
+    else:
+        from enigma_crib_cracker import crack_with_crib
+
+        matches = crack_with_crib(args.ciphertext, args.crib, plugboard, output=None)
+
+    for key, decoded in matches:
+        rotor_ids, *settings = key
+        print(" ".join(rotor_ids), *settings, decoded)
+    return 0 if matches else 1
+
+
+def crack_plugboard(args, parser):
+    import random
+
+    from enigma_cracker_plugboard import decrypt_message, simulated_annealing_plugboard_search
+
+    if len(args.rotors) != 3 or len(args.positions) != 3:
+        parser.error("crack-plugboard takes three rotors and three positions")
+    random.seed(args.seed)
+    try:
+        initial = parse_plugboard(args.initial)
+    except ValueError as e:
+        parser.error(str(e))
+    if not initial:
+        letters = random.sample("ABCDEFGHIJKLMNOPQRSTUVWXYZ", 2 * args.pairs)
+        initial = parse_plugboard([a + b for a, b in zip(letters[::2], letters[1::2])])
+
+    ciphertext = args.ciphertext.upper().replace(" ", "")
+    positions = args.positions.upper()
+    best, score = simulated_annealing_plugboard_search(
+        ciphertext, args.crib.upper(), args.rotors, positions, initial, num_iterations=args.iterations
+    )
+    pairs = sorted({"".join(sorted(pair)) for pair in best.items()})
+    print("Plugboard:", " ".join(pairs))
+    print("Score:", score)
+    print("Decryption:", decrypt_message(ciphertext, args.rotors, positions, best))
+    return 0
+
+
+def bench(args, parser):
+    from bench_enigma import main as bench_main
+
+    return bench_main(args.extra)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="enigma", description="Enigma machine simulator and crackers")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress to stderr")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name, help_text in (("encode", "encrypt text"), ("decode", "decrypt text (the same operation)")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("text", nargs="*", default=None, help="message (default: read stdin)")
+        add_key_arguments(command)
+        command.add_argument("--table", action="store_true", help="compile a keystream table (for big inputs)")
+        command.set_defaults(run=encode)
+
+    command = commands.add_parser("crack-crib", help="find rotor orders and positions from a crib")
+    command.add_argument("ciphertext")
+    command.add_argument("crib")
+    command.add_argument("--plugboard", nargs="*", default=[], help="known cables, e.g. AB CD")
+    command.add_argument("--engine", choices=("np", "mt", "python"), default="np")
+    command.add_argument("--rings", action="store_true", help="search ring settings too (np engine)")
+    command.add_argument("--workers", type=int, default=None, help="processes for the mt engine")
+    command.set_defaults(run=crack_crib)
+
+    command = commands.add_parser("crack-plugboard", help="anneal the plugboard for known rotor settings")
+    command.add_argument("ciphertext")
+    command.add_argument("crib")
+    command.add_argument("--rotors", nargs=3, required=True)
+    command.add_argument("--positions", required=True)
+    command.add_argument("--initial", nargs="*", default=[], help="starting cables (default: random)")
+    command.add_argument("--pairs", type=int, default=10, help="random starting cables")
+    command.add_argument("--iterations", type=int, default=10000)
+    command.add_argument("--seed", type=int, default=None)
+    command.set_defaults(run=crack_plugboard)
+
+    command = commands.add_parser("bench", help="run bench_enigma (takes its options)", add_help=False)
+    command.set_defaults(run=bench)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command != "bench":
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.extra = extra
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    if args.command in ("encode", "decode") and not args.text:
+        args.text = None
+    return args.run(args, parser)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+import argparse
+import itertools
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Client, Listener
+
+from enigma_bombe import Menu, bombe_rotor_order
+from enigma_crib_cracker import legal_crib_offsets
+from enigma_crib_cracker_mt import POSITIONS, crack_chunk
+from enigma_machine_sim import ROTOR_WIRINGS
+from enigma_pool import chunk_ranges
+
+logger = logging.getLogger(__name__)
+
+# Multi-node keyspace search.
+#
+# A coordinator cuts the keyspace into shards and serves them over TCP
+# (multiprocessing.connection, authenticated with a shared key). Workers on
+# any number of machines connect, receive the job once, then loop: ask for a
+# shard, search it, send back the results. A shard stays leased to its worker
+# until the results arrive; if the worker's connection drops, or the lease
+# runs out, the shard goes back to the queue for someone else. Results for a
+# shard that was already completed are ignored, so a slow worker coming back
+# late cannot duplicate matches.
+#
+# Messages are tuples:
+#   worker -> coordinator: ("hello", host, pid), ("request",),
+#                          ("result", shard_id, results)
+#   coordinator -> worker: ("job", job), ("shard", shard_id, shard),
+#                          ("wait", seconds), ("done",)
+
+# Connections unpickle what they receive, so the shared key is what stands
+# between the network and code execution on every node. There is no default:
+# it must come from the caller or from ENIGMA_CLUSTER_KEY.
+AUTHKEY_ENV = "ENIGMA_CLUSTER_KEY"
+
+# How long an idle worker waits before asking again while the last shards
+# are still leased to others.
+RETRY_DELAY = 0.2
+
+
+def cluster_authkey(authkey=None):
+    """The shared key as bytes: `authkey` if given, else $ENIGMA_CLUSTER_KEY."""
+    if authkey is None:
+        authkey = os.environ.get(AUTHKEY_ENV)
+    if not authkey:
+        raise ValueError(f"No cluster key: set {AUTHKEY_ENV} or pass an authkey")
+    return authkey.encode() if isinstance(authkey, str) else authkey
+
+
+def crib_shards(rotor_orders, shard_size=2048):
+    """Shards for the crib search: (rotor_ids, start, stop) position ranges."""
+    return [
+        (rotor_ids, start, stop)
+        for rotor_ids in rotor_orders
+        for start, stop in chunk_ranges(len(POSITIONS), shard_size)
+    ]
+
+
+def bombe_shards(rotor_orders, offsets):
+    """Shards for the bombe: one (rotor_ids, crib offset) menu run each."""
+    return [(rotor_ids, offset) for rotor_ids in rotor_orders for offset in offsets]
+
+
+_MENUS = {}
+
+
+def run_shard(job, shard):
+    """Search one shard of `job` on this worker."""
+    if job["kind"] == "crib":
+        rotor_ids, start, stop = shard
+        return crack_chunk(
+            rotor_ids, POSITIONS[start:stop], job["ciphertext"], job["crib"], job["plugboard_pairs"]
+        )
+    if job["kind"] == "bombe":
+        rotor_ids, offset = shard
+        key = (job["ciphertext"], job["crib"], offset)
+        if key not in _MENUS:
+            _MENUS[key] = Menu(job["ciphertext"], job["crib"], offset)
+        return bombe_rotor_order(rotor_ids, _MENUS[key])
+    raise ValueError(f"Unknown job kind: {job['kind']}")
+
+
+class Coordinator:
+    def __init__(self, job, shards, address=("127.0.0.1", 0), authkey=None, lease_timeout=600.0):
+        """
+        Serve `shards` of `job` to workers connecting on `address` (port 0
+        picks a free port, see `.address`). A shard that is not returned
+        within `lease_timeout` seconds is handed out again.
+        """
+        self.job = job
+        self.shards = list(shards)
+        self.lease_timeout = lease_timeout
+        self.results = []
+
+        self._pending = deque(range(len(self.shards)))
+        self._leases = {}
+        self._done = set()
+        self._cond = threading.Condition()
+        self._closed = False
+        authkey = cluster_authkey(authkey)
+        self._listener = Listener(address, authkey=authkey)
+        self.address = self._listener.address
+        self._authkey = authkey
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logger.info(f"Coordinator serving {len(self.shards)} shards on {self.address[0]}:{self.address[1]}")
+        return self
+
+    @property
+    def finished(self):
+        return len(self._done) == len(self.shards)
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError):
+                if self._closed:
+                    return
+                continue
+            if self._closed:
+                conn.close()
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        worker = None
+        try:
+            _, host, pid = conn.recv()
+            worker = f"{host}:{pid}"
+            logger.info(f"Worker {worker} connected")
+            conn.send(("job", self.job))
+            while True:
+                message = conn.recv()
+                if message[0] == "request":
+                    conn.send(self._next_shard(worker))
+                elif message[0] == "result":
+                    self._complete(message[1], message[2])
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            self._release(worker)
+
+    def _next_shard(self, worker):
+        with self._cond:
+            self._expire_leases()
+            if self._pending:
+                shard_id = self._pending.popleft()
+                self._leases[shard_id] = (worker, time.monotonic() + self.lease_timeout)
+                return ("shard", shard_id, self.shards[shard_id])
+            if self._leases:
+                return ("wait", RETRY_DELAY)
+            return ("done",)
+
+    def _expire_leases(self):
+        now = time.monotonic()
+        for shard_id, (worker, deadline) in list(self._leases.items()):
+            if deadline < now:
+                logger.warning(f"Lease on shard {shard_id} held by {worker} expired; reassigning")
+                del self._leases[shard_id]
+                self._pending.appendleft(shard_id)
+
+    def _complete(self, shard_id, results):
+        with self._cond:
+            if shard_id in self._done:
+                return
+            self._leases.pop(shard_id, None)
+            if shard_id in self._pending:
+                self._pending.remove(shard_id)
+            self._done.add(shard_id)
+            self.results.extend(results)
+            self._cond.notify_all()
+
+    def _release(self, worker):
+        """Put the shards of a disconnected worker back in the queue."""
+        with self._cond:
+            for shard_id, (owner, _) in list(self._leases.items()):
+                if owner == worker:
+                    logger.warning(f"Worker {worker} disconnected; reassigning shard {shard_id}")
+                    del self._leases[shard_id]
+                    self._pending.appendleft(shard_id)
+            self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """Block until every shard is done. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self.finished:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                # Wake up now and then to expire leases of hung workers
+                self._cond.wait(min(remaining or 1.0, 1.0))
+                self._expire_leases()
+        return True
+
+    def close(self):
+        self._closed = True
+        try:
+            # Unblock accept() with a throwaway connection
+            Client(self.address, authkey=self._authkey).close()
+        except OSError:
+            pass
+        self._listener.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def run_worker(address, authkey=None):
+    """
+    Connect to a coordinator and search shards until it reports that the
+    job is done or goes away. Returns the number of shards searched.
+    """
+    authkey = cluster_authkey(authkey)
+    searched = 0
+    try:
+        with Client(tuple(address), authkey=authkey) as conn:
+            conn.send(("hello", socket.gethostname(), os.getpid()))
+            _, job = conn.recv()
+            while True:
+                conn.send(("request",))
+                message = conn.recv()
+                if message[0] == "done":
+                    break
+                if message[0] == "wait":
+                    time.sleep(message[1])
+                    continue
+                _, shard_id, shard = message
+                conn.send(("result", shard_id, run_shard(job, shard)))
+                searched += 1
+    except (EOFError, ConnectionError):
+        logger.info("Coordinator went away")
+    return searched
+
+
+def start_local_workers(address, count, authkey=None):
+    """Start `count` worker processes on this machine."""
+    authkey = cluster_authkey(authkey)
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(address, authkey), daemon=True)
+        for _ in range(count)
+    ]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+def crack_with_crib_cluster(
+    ciphertext,
+    crib,
+    plugboard_pairs=None,
+    address=("127.0.0.1", 0),
+    authkey=None,
+    local_workers=0,
+    shard_size=2048,
+    rotor_orders=None,
+    bombe=False,
+    lease_timeout=600.0,
+):
+    """
+    Coordinate a crib search across worker nodes. Remote workers join with
+    `python enigma_cluster.py worker HOST:PORT`; `local_workers` starts that
+    many on this machine as well.
+
+    With `bombe=True` the unknown-plugboard bombe is run instead (one shard
+    per rotor order and crib offset) and `plugboard_pairs` is ignored.
+
+    Returns the same results as crack_with_crib_mt (or crack_with_bombe),
+    sorted by rotor order and position.
+    """
+    crib = crib.upper()
+    ciphertext = ciphertext.upper().replace(' ', '')
+    authkey = cluster_authkey(authkey)
+    if rotor_orders is None:
+        rotor_orders = list(itertools.permutations(ROTOR_WIRINGS.keys(), 3))
+
+    if bombe:
+        job = {"kind": "bombe", "ciphertext": ciphertext, "crib": crib}
+        shards = bombe_shards(rotor_orders, legal_crib_offsets(ciphertext, crib))
+    else:
+        job = {"kind": "crib", "ciphertext": ciphertext, "crib": crib, "plugboard_pairs": plugboard_pairs}
+        shards = crib_shards(rotor_orders, shard_size)
+
+    with Coordinator(job, shards, address, authkey, lease_timeout) as coordinator:
+        workers = start_local_workers(coordinator.address, local_workers, authkey)
+        coordinator.wait()
+    for worker in workers:
+        worker.join()
+
+    order = {rotor_ids: n for n, rotor_ids in enumerate(rotor_orders)}
+    return sorted(coordinator.results, key=lambda result: (order[result[0][0]], result[0][1]))
+
+
+def parse_address(text):
+    host, port = text.rsplit(":", 1)
+    return host, int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed Enigma crib search")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    coordinator = commands.add_parser("coordinator", help="serve a crib search")
+    coordinator.add_argument("ciphertext")
+    coordinator.add_argument("crib")
+    coordinator.add_argument(
+        "--listen", default="127.0.0.1:5125", type=parse_address,
+        help="address to serve on (default: this host only; use 0.0.0.0:PORT for remote workers)",
+    )
+    coordinator.add_argument("--local-workers", type=int, default=0)
+    coordinator.add_argument("--shard-size", type=int, default=2048)
+    coordinator.add_argument("--bombe", action="store_true", help="unknown plugboard")
+
+    worker = commands.add_parser("worker", help="join a coordinator")
+    worker.add_argument("address", type=parse_address)
+    worker.add_argument("--processes", type=int, default=os.cpu_count())
+
+    for command in (coordinator, worker):
+        command.add_argument("--authkey", default=None, help=f"shared cluster key (default: ${AUTHKEY_ENV})")
+
+    args = parser.parse_args()
+    try:
+        authkey = cluster_authkey(args.authkey)
+    except ValueError as e:
+        parser.error(str(e))
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "coordinator":
+        results = crack_with_crib_cluster(
+            args.ciphertext, args.crib, address=args.listen, authkey=authkey,
+            local_workers=args.local_workers, shard_size=args.shard_size, bombe=args.bombe,
+        )
+        for result in results:
+            print(result)
+    else:
+        for process in start_local_workers(args.address, args.processes, authkey):
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
 import itertools
 import logging
+import os
 import string
 import random
-import math
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
 from multiprocessing import cpu_count
 
+import enigma_cracker_plugboard as plugboard_annealing
+from enigma_crib_cracker import legal_crib_offsets
+from enigma_journal import Journal, read_params
+from enigma_metrics import Metrics
 from enigma_machine_sim import (
     REFLECTOR_B,
     ROTOR_WIRINGS,
@@ -14,10 +18,14 @@ from enigma_machine_sim import (
     Reflector,
     Rotor,
 )
+from enigma_pool import run_bounded
 from tqdm import tqdm
 
 logger = logging.getLogger(__name__)
 
+# Machines reused by decrypt_message, keyed by rotor order.
+_MACHINES = {}
+
 
 def random_initial_plugboard(num_pairs):
     """
@@ -40,13 +48,15 @@ def decrypt_message(ciphertext, rotor_ids, rotor_position, plugboard_config):
     Decrypt the ciphertext using the specified rotor order, rotor starting positions,
     and plugboard configuration.
     """
-    reflector = Reflector(REFLECTOR_B)
-    rotors = [
-        Rotor(*ROTOR_WIRINGS[rotor_ids[0]], position=rotor_position[0]),
-        Rotor(*ROTOR_WIRINGS[rotor_ids[1]], position=rotor_position[1]),
-        Rotor(*ROTOR_WIRINGS[rotor_ids[2]], position=rotor_position[2]),
-    ]
-    machine = EnigmaMachine(rotors, reflector, Plugboard(plugboard_config))
+    # Reuse one machine per rotor order; only its state is reset per call.
+    key = tuple(rotor_ids)
+    machine = _MACHINES.get(key)
+    if machine is None:
+        rotors = [Rotor(*ROTOR_WIRINGS[rotor_id]) for rotor_id in rotor_ids]
+        machine = EnigmaMachine(rotors, Reflector(REFLECTOR_B), Plugboard({}))
+        _MACHINES[key] = machine
+    machine.set_positions(rotor_position)
+    machine.plugboard.set_swaps(plugboard_config)
     return machine.encode_message(ciphertext)
 
 
@@ -114,45 +124,28 @@ def simulated_annealing_plugboard_search(
     num_iterations=10000,
     start_temp=10.0,
     cooling_rate=0.0001,
+    scorer=None,
+    metrics=None,
 ):
     """
     Given a rotor candidate (order and starting positions), use simulated annealing to search
     for a plugboard configuration that yields a decryption containing the crib.
+
+    Uses the incremental annealer from enigma_cracker_plugboard, which runs the rotors once
+    per candidate and only recomposes cached scrambler tables with each trial plugboard.
     """
-    current_plugboard = initial_plugboard
-    current_decryption = decrypt_message(
-        ciphertext, rotor_ids, rotor_position, current_plugboard
+    return plugboard_annealing.simulated_annealing_plugboard_search(
+        ciphertext,
+        crib,
+        rotor_ids,
+        rotor_position,
+        initial_plugboard,
+        num_iterations,
+        start_temp,
+        cooling_rate,
+        scorer,
+        metrics,
     )
-    current_score = score_text(current_decryption, crib)
-    best_plugboard = current_plugboard
-    best_score = current_score
-    temp = start_temp
-
-    for iteration in range(num_iterations):
-        neighbor = generate_neighbor(current_plugboard)
-        neighbor_decryption = decrypt_message(
-            ciphertext, rotor_ids, rotor_position, neighbor
-        )
-        neighbor_score = score_text(neighbor_decryption, crib)
-        delta = neighbor_score - current_score
-
-        # Accept the neighbor if it improves the score or with a probability
-        if delta > 0 or random.random() < math.exp(delta / temp):
-            current_plugboard = neighbor
-            current_score = neighbor_score
-
-        if current_score > best_score:
-            best_plugboard = current_plugboard
-            best_score = current_score
-
-        temp *= 1 - cooling_rate
-        # Optional early exit if the crib is already found.
-        if crib in decrypt_message(
-            ciphertext, rotor_ids, rotor_position, best_plugboard
-        ):
-            break
-
-    return best_plugboard, best_score
 
 
 def search_rotor_candidate(
@@ -164,11 +157,15 @@ def search_rotor_candidate(
     num_iterations,
     start_temp,
     cooling_rate,
+    scorer=None,
+    metrics=None,
 ):
     """
     For a given rotor candidate (order and positions), perform plugboard search via simulated annealing.
     Returns the candidate settings and decryption if the crib is found.
     """
+    if metrics is not None:
+        metrics.count("candidates")
     initial_plugboard = random_initial_plugboard(num_plugboard_pairs)
     best_plugboard, best_score = simulated_annealing_plugboard_search(
         ciphertext,
@@ -179,14 +176,64 @@ def search_rotor_candidate(
         num_iterations,
         start_temp,
         cooling_rate,
+        scorer,
+        metrics,
     )
     decrypted = decrypt_message(ciphertext, rotor_ids, rotor_position, best_plugboard)
-    if crib in decrypted:
+    # Only accept the crib where Enigma could actually have produced it.
+    if any(decrypted.startswith(crib, i) for i in legal_crib_offsets(ciphertext, crib)):
+        if metrics is not None:
+            metrics.count("matches")
         return ((rotor_ids, rotor_position, best_plugboard), decrypted)
     return None
 
 
-def crack_with_crib_rotor_plugboard_mt(
+# Search parameters set in each worker by init_search_worker, so a task only
+# carries its batch of (rotor_ids, position) candidates.
+_SEARCH = {}
+
+
+def init_search_worker(ciphertext, crib, search_args, collect_metrics=False):
+    _SEARCH.update(
+        ciphertext=ciphertext,
+        crib=crib,
+        search_args=search_args,
+        metrics=Metrics() if collect_metrics else None,
+    )
+
+
+def search_candidate_batch(candidates):
+    """
+    Worker task: run search_rotor_candidate for a batch of candidates.
+    Returns the matches, plus this worker's metrics delta (None when
+    metrics are off).
+    """
+    metrics = _SEARCH["metrics"]
+    results = []
+    for rotor_ids, pos in candidates:
+        result = search_rotor_candidate(
+            _SEARCH["ciphertext"], _SEARCH["crib"], rotor_ids, pos, *_SEARCH["search_args"],
+            metrics=metrics,
+        )
+        if result is not None:
+            results.append(result)
+    if metrics is None:
+        return results, None
+    delta = metrics.take()
+    delta["worker"] = os.getpid()
+    return results, delta
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_crack_with_crib_rotor_plugboard_mt(
     ciphertext,
     crib,
     num_plugboard_pairs=1,
@@ -194,23 +241,37 @@ def crack_with_crib_rotor_plugboard_mt(
     start_temp=10.0,
     cooling_rate=0.0001,
     limit_positions=None,
+    max_workers=None,
+    batch_size=64,
+    max_in_flight=None,
+    scorer=None,
+    journal=None,
+    resume=False,
+    fsync_interval=1.0,
+    metrics=None,
 ):
     """
-    Combined multithreaded rotor/position search with plugboard optimization.
+    Streaming form of crack_with_crib_rotor_plugboard_mt: yields each
+    matching candidate as soon as its batch finishes.
 
-    Parameters:
-      - ciphertext: The ciphertext to be decrypted.
-      - crib: Known plaintext fragment.
-      - num_plugboard_pairs: Number of plugboard pairs to search (affects candidate space).
-      - num_iterations, start_temp, cooling_rate: Parameters for simulated annealing.
-      - limit_positions: (Optional) Limit on the number of rotor positions to test (for demo purposes).
+    Candidates are generated lazily and grouped into batches of `batch_size`,
+    and at most `max_in_flight` batches (default: 4 per worker) are queued
+    at any time, so memory stays flat however large the keyspace is.
 
-    Returns:
-      A list of candidate settings (rotor order, starting positions, plugboard config) that yield a decryption
-      containing the crib.
+    With `journal` (a path), every finished batch and its matches are
+    recorded as the search runs; with `resume`, batches already in the
+    journal are skipped and their matches are yielded first.
+
+    `metrics` is an optional enigma_metrics.Metrics that aggregates the
+    workers' candidate counts, decrypt/score timers and matches.
     """
     crib = crib.upper()
-    ciphertext = ciphertext.upper()
+    ciphertext = ciphertext.upper().replace(' ', '')
+
+    # Nothing to search if every crib placement maps a letter to itself.
+    if not legal_crib_offsets(ciphertext, crib):
+        logger.info("No legal crib offsets in ciphertext")
+        return
 
     # Generate all rotor orders (usually 3 rotors selected from available ones)
     rotor_orders = list(itertools.permutations(ROTOR_WIRINGS.keys(), 3))
@@ -222,37 +283,132 @@ def crack_with_crib_rotor_plugboard_mt(
         for c in string.ascii_uppercase
     ]
     # Optionally, limit the number of positions for demonstration purposes.
+    # A resumed search reuses the sample recorded in its journal.
+    previous = read_params(journal) if journal is not None and resume else None
     if limit_positions is not None and limit_positions < len(all_positions):
-        positions = random.sample(all_positions, limit_positions)
+        if previous is not None and previous.get("limit_positions") == limit_positions:
+            positions = previous["positions"]
+        else:
+            positions = random.sample(all_positions, limit_positions)
     else:
         positions = all_positions
 
-    num_threads = cpu_count()
-    results = []
-    futures = []
-    with ProcessPoolExecutor(max_workers=num_threads) as executor:
-        for rotor_ids in rotor_orders:
-            for pos in positions:
-                futures.append(
-                    executor.submit(
-                        search_rotor_candidate,
-                        ciphertext,
-                        crib,
-                        rotor_ids,
-                        pos,
-                        num_plugboard_pairs,
-                        num_iterations,
-                        start_temp,
-                        cooling_rate,
-                    )
-                )
-        for future in tqdm(
-            as_completed(futures), total=len(futures), desc="Processing"
-        ):
-            result = future.result()
-            if result is not None:
-                results.append(result)
-    return results
+    num_workers = max_workers or cpu_count()
+    candidates = itertools.product(rotor_orders, positions)
+    batches = batched(candidates, batch_size)
+    search_args = (num_plugboard_pairs, num_iterations, start_temp, cooling_rate, scorer)
+
+    done = None
+    if journal is not None:
+        params = {
+            "search": "crib_rotor_plugboard_mt",
+            "ciphertext": ciphertext,
+            "crib": crib,
+            "search_args": [num_plugboard_pairs, num_iterations, start_temp, cooling_rate],
+            "scorer": type(scorer).__name__ if scorer is not None else None,
+            "limit_positions": limit_positions,
+            "positions": positions if positions is not all_positions else None,
+            "batch_size": batch_size,
+        }
+        done = Journal(journal, params, resume, fsync_interval)
+        yield from done.results
+        # A batch is identified by its first candidate
+        batches = (batch for batch in batches if not done.is_done(batch[0]))
+
+    pool_stats = {}
+    if metrics is not None:
+        metrics.set("keyspace", len(rotor_orders) * len(positions))
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=init_search_worker,
+            initargs=(ciphertext, crib, search_args, metrics is not None),
+        ) as executor:
+            results = run_bounded(
+                executor,
+                search_candidate_batch,
+                ((batch,) for batch in batches),
+                max_in_flight or num_workers * 4,
+                pool_stats,
+            )
+            with tqdm(total=len(rotor_orders) * len(positions), desc="Processing") as progress:
+                if done is not None:
+                    progress.update(len(done.done) * batch_size)
+                try:
+                    for (batch,), (matches, delta) in results:
+                        progress.update(len(batch))
+                        if metrics is not None:
+                            if delta is not None:
+                                metrics.merge(delta, worker=delta.pop("worker"))
+                            metrics.set("in_flight", pool_stats["in_flight"])
+                            metrics.maybe_export()
+                        if done is not None:
+                            done.record(batch[0], matches)
+                        yield from matches
+                finally:
+                    results.close()
+    finally:
+        if done is not None:
+            done.close()
+        if metrics is not None:
+            metrics.export()
+
+
+def crack_with_crib_rotor_plugboard_mt(
+    ciphertext,
+    crib,
+    num_plugboard_pairs=1,
+    num_iterations=10000,
+    start_temp=10.0,
+    cooling_rate=0.0001,
+    limit_positions=None,
+    max_workers=None,
+    batch_size=64,
+    scorer=None,
+    journal=None,
+    resume=False,
+    fsync_interval=1.0,
+    metrics=None,
+):
+    """
+    Combined multithreaded rotor/position search with plugboard optimization.
+
+    Parameters:
+      - ciphertext: The ciphertext to be decrypted.
+      - crib: Known plaintext fragment.
+      - num_plugboard_pairs: Number of plugboard pairs to search (affects candidate space).
+      - num_iterations, start_temp, cooling_rate: Parameters for simulated annealing.
+      - limit_positions: (Optional) Limit on the number of rotor positions to test (for demo purposes).
+      - max_workers: (Optional) Number of worker processes (default: cpu_count()).
+      - batch_size: Number of rotor candidates per worker task.
+      - scorer: (Optional) Fitness scorer from enigma_scoring used by the annealer.
+      - journal, resume, fsync_interval: (Optional) Progress journal, see
+        iter_crack_with_crib_rotor_plugboard_mt.
+      - metrics: (Optional) enigma_metrics.Metrics collecting live counters and timers.
+
+    Returns:
+      A list of candidate settings (rotor order, starting positions, plugboard config) that yield a decryption
+      containing the crib.
+    """
+    return list(
+        iter_crack_with_crib_rotor_plugboard_mt(
+            ciphertext,
+            crib,
+            num_plugboard_pairs,
+            num_iterations,
+            start_temp,
+            cooling_rate,
+            limit_positions,
+            max_workers,
+            batch_size,
+            scorer=scorer,
+            journal=journal,
+            resume=resume,
+            fsync_interval=fsync_interval,
+            metrics=metrics,
+        )
+    )
 
 
 if __name__ == "__main__":
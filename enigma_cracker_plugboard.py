@@ -4,7 +4,10 @@ import string
 import random
 import math
 
+import numpy as np
+
 from enigma_machine_sim import (
+    LETTER_INDEX,
     REFLECTOR_B,
     ROTOR_WIRINGS,
     EnigmaMachine,
@@ -16,19 +19,24 @@ from tqdm import tqdm
 
 logger = logging.getLogger(__name__)
 
+# Machines reused by decrypt_message, keyed by rotor order.
+_MACHINES = {}
+
 
 def decrypt_message(ciphertext, rotor_ids, rotor_position, plugboard_config):
     """
     Decrypt the ciphertext using the specified rotor setting, rotor positions,
     and plugboard configuration.
     """
-    reflector = Reflector(REFLECTOR_B)
-    rotors = [
-        Rotor(*ROTOR_WIRINGS[rotor_ids[0]], position=rotor_position[0]),
-        Rotor(*ROTOR_WIRINGS[rotor_ids[1]], position=rotor_position[1]),
-        Rotor(*ROTOR_WIRINGS[rotor_ids[2]], position=rotor_position[2]),
-    ]
-    machine = EnigmaMachine(rotors, reflector, Plugboard(plugboard_config))
+    # Reuse one machine per rotor order; only its state is reset per call.
+    key = tuple(rotor_ids)
+    machine = _MACHINES.get(key)
+    if machine is None:
+        rotors = [Rotor(*ROTOR_WIRINGS[rotor_id]) for rotor_id in rotor_ids]
+        machine = EnigmaMachine(rotors, Reflector(REFLECTOR_B), Plugboard({}))
+        _MACHINES[key] = machine
+    machine.set_positions(rotor_position)
+    machine.plugboard.set_swaps(plugboard_config)
     return machine.encode_message(ciphertext)
 
 
@@ -51,6 +59,75 @@ def score_text(text, crib):
     return score
 
 
+class CribScorer:
+    """
+    score_text as an incremental scorer over uint8 arrays of ASCII codes.
+    rescore() only looks at the changed letters for the vowel count and uses
+    a C-level substring search for the crib bonus.
+    """
+
+    VOWELS = np.zeros(256, dtype=np.int64)
+    VOWELS[list(b"AEIOU")] = 1
+
+    def __init__(self, crib):
+        self.crib = crib.encode("latin-1", "replace")
+
+    def score(self, text):
+        score = 1000 if self.crib in text.tobytes() else 0
+        return score + int(self.VOWELS[text].sum())
+
+    def rescore(self, old_text, new_text, changed, score):
+        """Score of new_text, which differs from old_text (scored `score`) at `changed`."""
+        vowels = self.VOWELS
+        score += int(vowels[new_text[changed]].sum() - vowels[old_text[changed]].sum())
+        found_after = self.crib in new_text.tobytes()
+        found_before = self.crib in old_text.tobytes()
+        return score + 1000 * (found_after - found_before)
+
+
+def plugboard_table(plugboard):
+    """Same table as Plugboard(plugboard).table, as a uint8 array."""
+    table = list(range(26))
+    for a, b in plugboard.items():
+        table[LETTER_INDEX[a]] = LETTER_INDEX[b]
+        table[LETTER_INDEX[b]] = LETTER_INDEX[a]
+    return np.array(table, dtype=np.uint8)
+
+
+class PlugboardDecryption:
+    """
+    Decryption of one ciphertext with a fixed rotor order and start position,
+    where only the plugboard changes. The plugboard-free scrambler
+    permutation for every letter is computed once, so trying a plugboard
+    only recomposes those cached tables with it.
+    """
+
+    def __init__(self, ciphertext, rotor_ids, rotor_position):
+        ciphertext = ciphertext.upper().replace(' ', '')
+        rotors = [Rotor(*ROTOR_WIRINGS[rotor_id]) for rotor_id in rotor_ids]
+        machine = EnigmaMachine(rotors, Reflector(REFLECTOR_B), Plugboard({}))
+        machine.set_positions(rotor_position)
+
+        cipher, tables = [], []
+        for c in ciphertext:
+            if c in LETTER_INDEX:
+                machine.step_rotors()
+                cipher.append(LETTER_INDEX[c])
+                tables.append(machine.scrambler_table())
+        self.letter_mask = np.array([c in LETTER_INDEX for c in ciphertext], dtype=bool)
+        self.cipher = np.array(cipher, dtype=np.uint8)
+        self.tables = np.array(tables, dtype=np.uint8).reshape(-1, 26)
+        self.rows = np.arange(len(cipher))
+        self.text = np.frombuffer(ciphertext.encode("latin-1", "replace"), dtype=np.uint8).copy()
+
+    def decrypt(self, plugboard):
+        """Return the decryption under `plugboard` as a uint8 array of ASCII codes."""
+        plug = plugboard_table(plugboard)
+        text = self.text.copy()
+        text[self.letter_mask] = plug[self.tables[self.rows, plug[self.cipher]]] + 65
+        return text
+
+
 def generate_neighbor(plugboard):
     """
     Generate a neighboring plugboard configuration by swapping letters between two pairs.
@@ -106,45 +183,62 @@ def simulated_annealing_plugboard_search(
     num_iterations=10000,
     start_temp=10.0,
     cooling_rate=0.0001,
+    scorer=None,
+    metrics=None,
 ):
     """
     Given a ciphertext, crib, rotor configuration, and an initial plugboard guess,
     use simulated annealing to search for a plugboard configuration that yields a
     better (more English-like) decryption.
 
+    The rotor stack is run once per call: each neighbour is decrypted by
+    recomposing the cached scrambler tables with its plugboard, and only the
+    letters that changed are rescored.
+
+    `scorer` is any fitness object from enigma_scoring (e.g. a quadgram
+    scorer); the default CribScorer reproduces score_text.
+
     Returns the best plugboard configuration found and its score.
     """
+    if scorer is None:
+        scorer = CribScorer(crib)
+    crib_bytes = crib.encode("latin-1", "replace")
+    decryption = PlugboardDecryption(ciphertext, rotor_ids, rotor_position)
+    decrypt = decryption.decrypt
+    rescore = scorer.rescore
+    if metrics is not None:
+        decrypt = metrics.timed("decrypt", decrypt)
+        rescore = metrics.timed("score", rescore)
+
     current_plugboard = initial_plugboard
-    current_decryption = decrypt_message(
-        ciphertext, rotor_ids, rotor_position, current_plugboard
-    )
-    current_score = score_text(current_decryption, crib)
+    current_text = decryption.decrypt(current_plugboard)
+    current_score = scorer.score(current_text)
     best_plugboard = current_plugboard
     best_score = current_score
+    best_has_crib = crib_bytes in current_text.tobytes()
     temp = start_temp
 
     for iteration in range(num_iterations):
         neighbor = generate_neighbor(current_plugboard)
-        neighbor_decryption = decrypt_message(
-            ciphertext, rotor_ids, rotor_position, neighbor
-        )
-        neighbor_score = score_text(neighbor_decryption, crib)
+        neighbor_text = decrypt(neighbor)
+        changed = np.flatnonzero(neighbor_text != current_text)
+        neighbor_score = rescore(current_text, neighbor_text, changed, current_score)
         delta = neighbor_score - current_score
 
         # Accept the neighbor if it's better, or with a probability if worse.
         if delta > 0 or random.random() < math.exp(delta / temp):
             current_plugboard = neighbor
+            current_text = neighbor_text
             current_score = neighbor_score
 
         if current_score > best_score:
             best_plugboard = current_plugboard
             best_score = current_score
+            best_has_crib = crib_bytes in current_text.tobytes()
 
         temp *= 1 - cooling_rate
         # Optionally, exit early if the crib is found.
-        if crib in decrypt_message(
-            ciphertext, rotor_ids, rotor_position, best_plugboard
-        ):
+        if best_has_crib:
             break
 
     return best_plugboard, best_score
@@ -8,58 +8,136 @@ logger = logging.getLogger(__name__)
 
 # Crib-cracking utility for Enigma
 
-def crack_with_crib(ciphertext, crib, plugboard_pairs=None):
+def legal_crib_offsets(ciphertext, crib):
+    """
+    Offsets where the crib can sit under the ciphertext. Enigma never maps a
+    letter to itself, so any offset that lines a crib letter up with the same
+    ciphertext letter is ruled out before anything is decrypted.
+    """
+    return [
+        i for i in range(len(ciphertext) - len(crib) + 1)
+        if all(ciphertext[i + j] != crib[j] for j in range(len(crib)))
+    ]
+
+
+def letters_before(text):
+    """Key presses before each index of text (non-letters don't step the rotors)."""
+    counts = []
+    count = 0
+    for c in text:
+        counts.append(count)
+        if c in string.ascii_uppercase:
+            count += 1
+    return counts
+
+
+def letter_indices(text):
+    """Letter indices 0-25 for text, with None for anything that is not a letter."""
+    return [string.ascii_uppercase.find(c) if c in string.ascii_uppercase else None for c in text]
+
+
+def crib_window_match(machine, cipher_indices, crib_indices, offsets, steps_before):
+    """
+    Decrypt only the crib windows at the given (ascending) offsets, giving up
+    on each window at its first mismatching letter. The rotors are moved
+    between windows arithmetically. The machine must be at its start position
+    and is reset there before returning. Returns the first matching offset,
+    or None.
+    """
+    encode_index = machine.encode_index
+    pressed = 0
+    for i in offsets:
+        target = steps_before[i]
+        if target < pressed:
+            machine.reset_rotors()
+            pressed = 0
+        if target != pressed:
+            machine.advance(target - pressed)
+            pressed = target
+        for j, expected in enumerate(crib_indices):
+            c = cipher_indices[i + j]
+            # At a legal offset a non-letter on either side can never match.
+            if c is None or expected is None:
+                break
+            pressed += 1
+            if encode_index(c) != expected:
+                break
+        else:
+            machine.reset_rotors()
+            return i
+    machine.reset_rotors()
+    return None
+
+
+def crack_with_crib(
+    ciphertext, crib, plugboard_pairs=None, rotor_orders=None, metrics=None, output="decoded_matches.txt"
+):
+    """
+    Try every rotor order and start position with a known plugboard.
+    `metrics` is an optional enigma_metrics.Metrics that records candidates,
+    decryption time and matches as the search runs. The matches are also
+    written to `output` unless it is None.
+    """
     crib = crib.upper()
-    ciphertext = ciphertext.upper()
+    ciphertext = ciphertext.upper().replace(' ', '')
 
     # Generate all rotor order permutations (5 choose 3, ordered)
-    rotor_orders = list(itertools.permutations(ROTOR_WIRINGS.keys(), 3))
+    if rotor_orders is None:
+        rotor_orders = list(itertools.permutations(ROTOR_WIRINGS.keys(), 3))
 
     # Create all rotor starting positions (17,576 total)
     positions = [a + b + c for a in string.ascii_uppercase
                              for b in string.ascii_uppercase
                              for c in string.ascii_uppercase]
 
+    # Place the crib first, so only the legal windows are ever decrypted
+    offsets = legal_crib_offsets(ciphertext, crib)
+    steps_before = letters_before(ciphertext)
+    cipher_indices = letter_indices(ciphertext)
+    crib_indices = letter_indices(crib)
+
     reflector = Reflector(REFLECTOR_B)
     found = []
     total_combinations = len(rotor_orders) * len(positions)
 
     logger.info(f"Total combinations to try: {total_combinations}")
+    logger.info(f"Legal crib offsets: {len(offsets)} of {max(0, len(ciphertext) - len(crib) + 1)}")
+
+    plugboard = Plugboard(plugboard_pairs or {})
+
+    match_window = crib_window_match
+    if metrics is not None:
+        metrics.set("keyspace", total_combinations)
+        match_window = metrics.timed("decrypt", crib_window_match, count="candidates")
 
     for rotor_ids in tqdm(rotor_orders, desc="Rotor Orders"):
-        for pos in positions:
-            # Setup rotors fresh each time
-            rotors = [
-                Rotor(*ROTOR_WIRINGS[rotor_ids[0]], position=pos[0]),
-                Rotor(*ROTOR_WIRINGS[rotor_ids[1]], position=pos[1]),
-                Rotor(*ROTOR_WIRINGS[rotor_ids[2]], position=pos[2]),
-            ]
-
-            plugboard = Plugboard(plugboard_pairs or {})
-            machine = EnigmaMachine(rotors, reflector, plugboard)
+        if not offsets:
+            break
+        # One machine per rotor order, walked through every start position
+        rotors = [Rotor(*ROTOR_WIRINGS[rotor_id]) for rotor_id in rotor_ids]
+        machine = EnigmaMachine(rotors, reflector, plugboard)
+
+        for pos in machine.walk_positions(positions):
+            if match_window(machine, cipher_indices, crib_indices, offsets, steps_before) is None:
+                continue
+
             decoded = machine.encode_message(ciphertext)
+            found.append(((rotor_ids, pos), decoded))
+            logger.info(f"[Match] Rotors: {rotor_ids}, Pos: {pos}, Decoded: {decoded}")
+            if metrics is not None:
+                metrics.count("matches")
+
+        if metrics is not None:
+            metrics.maybe_export()
 
-            # Debug: check for any character mapping to itself
-            for original, transformed in zip(ciphertext, decoded):
-                if original == transformed:
-                    logger.debug(f"[Warning] Self-mapping detected: {original} -> {transformed} at rotor setting {rotor_ids} pos {pos}")
-
-            # Check segments of decoded message for crib match
-            for i in range(len(decoded) - len(crib) + 1):
-                segment = decoded[i:i+len(crib)]
-                if crib == segment:
-                    # Enigma can't map a letter to itself: check ciphertext vs crib at same position
-                    if all(ciphertext[i + j] != crib[j] for j in range(len(crib))):
-                        found.append(((rotor_ids, pos), decoded))
-                        logger.info(f"[Match] Rotors: {rotor_ids}, Pos: {pos}, Decoded: {decoded}")
-                        break
-                    else:
-                        logger.debug(f"[Skip] Self-reflection at pos {i}: crib={crib}, ct segment={ciphertext[i:i+len(crib)]}")
+    if metrics is not None:
+        metrics.export()
 
     # Save all matches to a file
-    with open("decoded_matches.txt", "w") as f:
-        for (rotor_ids, pos), decoded in found:
-            f.write(f"Rotors: {rotor_ids}, Position: {pos}, Decoded: {decoded}\n")
+    if output is not None:
+        with open(output, "w") as f:
+            for (rotor_ids, pos), decoded in found:
+                f.write(f"Rotors: {rotor_ids}, Position: {pos}, Decoded: {decoded}\n")
 
     return found
 
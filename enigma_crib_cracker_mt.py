@@ -1,9 +1,19 @@
 import itertools
 import logging
+import multiprocessing
+import os
 import string
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
 from multiprocessing import cpu_count
 
+from enigma_crib_cracker import (
+    crib_window_match,
+    legal_crib_offsets,
+    letter_indices,
+    letters_before,
+)
+from enigma_journal import Journal, read_params
+from enigma_metrics import Metrics
 from enigma_machine_sim import (
     REFLECTOR_B,
     ROTOR_WIRINGS,
@@ -12,67 +22,202 @@ from enigma_machine_sim import (
     Reflector,
     Rotor,
 )
+from enigma_pool import chunk_ranges, run_bounded, shard_size_for
 from tqdm import tqdm
 
 logger = logging.getLogger(__name__)
 
-def crack_chunk(rotor_ids, positions, ciphertext, crib, plugboard_pairs):
-    reflector = Reflector(REFLECTOR_B)
-    found = []
-
-    for pos in positions:
-        rotors = [
-            Rotor(*ROTOR_WIRINGS[rotor_ids[0]], position=pos[0]),
-            Rotor(*ROTOR_WIRINGS[rotor_ids[1]], position=pos[1]),
-            Rotor(*ROTOR_WIRINGS[rotor_ids[2]], position=pos[2]),
-        ]
-        plugboard = Plugboard(plugboard_pairs or {})
-        machine = EnigmaMachine(rotors, reflector, plugboard)
-        decoded = machine.encode_message(ciphertext)
-
-        for i in range(len(decoded) - len(crib) + 1):
-            segment = decoded[i:i+len(crib)]
-            if crib == segment:
-                if all(ciphertext[i + j] != crib[j] for j in range(len(crib))):
-                    found.append(((rotor_ids, pos), decoded))
-                    break
-    return found
-
-def crack_with_crib_mt(ciphertext, crib, plugboard_pairs=None):
-    crib = crib.upper()
-    ciphertext = ciphertext.upper()
+# Set in each worker process by init_worker, so the read-only inputs are
+# sent once per worker instead of being pickled into every task.
+_WORKER = {}
 
-    rotor_orders = list(itertools.permutations(ROTOR_WIRINGS.keys(), 3))
-    positions = [a + b + c for a in string.ascii_uppercase for b in string.ascii_uppercase for c in string.ascii_uppercase]
+# How many positions crack_chunk tests between checks of the stop flag.
+STOP_CHECK_INTERVAL = 256
 
-    logger.info(f"Total combinations to try: {len(rotor_orders) * len(positions)}")
+POSITIONS = [a + b + c for a in string.ascii_uppercase for b in string.ascii_uppercase for c in string.ascii_uppercase]
 
-    num_threads = cpu_count()
-    logger.info(f"Using {num_threads} threads")
 
-    chunk_size = len(positions) // num_threads
+def crack_chunk(rotor_ids, positions, ciphertext, crib, plugboard_pairs, stop_event=None, metrics=None):
+    reflector = Reflector(REFLECTOR_B)
+    offsets = legal_crib_offsets(ciphertext, crib)
+    steps_before = letters_before(ciphertext)
+    cipher_indices = letter_indices(ciphertext)
+    crib_indices = letter_indices(crib)
     found = []
-
-    with ProcessPoolExecutor(max_workers=num_threads) as executor:
-        futures = []
-        for rotor_ids in rotor_orders:
-            for i in range(0, len(positions), chunk_size):
-                chunk = positions[i:i+chunk_size]
-                futures.append(executor.submit(crack_chunk, rotor_ids, chunk, ciphertext, crib, plugboard_pairs))
-
-        for future in tqdm(as_completed(futures), total=len(futures), desc="Processing"):
-            result = future.result()
-            if result:
-                found.extend(result)
-
-    with open("decoded_matches_mt.txt", "w") as f:
-        for (rotor_ids, pos), decoded in found:
-            f.write(f"Rotors: {rotor_ids}, Position: {pos}, Decoded: {decoded}")
-
+    if not offsets:
+        return found
+
+    rotors = [Rotor(*ROTOR_WIRINGS[rotor_id]) for rotor_id in rotor_ids]
+    machine = EnigmaMachine(rotors, reflector, Plugboard(plugboard_pairs or {}))
+    match_window = crib_window_match
+    if metrics is not None:
+        match_window = metrics.timed("decrypt", crib_window_match, count="candidates")
+
+    for n, pos in enumerate(machine.walk_positions(positions)):
+        if stop_event is not None and n % STOP_CHECK_INTERVAL == 0 and stop_event.is_set():
+            break
+        if match_window(machine, cipher_indices, crib_indices, offsets, steps_before) is not None:
+            found.append(((rotor_ids, pos), machine.encode_message(ciphertext)))
+            if metrics is not None:
+                metrics.count("matches")
     return found
 
 
+def init_worker(ciphertext, crib, plugboard_pairs, stop_event, collect_metrics=False):
+    _WORKER.update(
+        ciphertext=ciphertext,
+        crib=crib,
+        plugboard_pairs=plugboard_pairs,
+        stop_event=stop_event,
+        metrics=Metrics() if collect_metrics else None,
+    )
+
+
+def crack_shard(rotor_ids, start, stop):
+    """
+    Worker task: test positions[start:stop] of one rotor order. Returns the
+    matches, plus this worker's metrics delta (None when metrics are off).
+    """
+    if _WORKER["stop_event"].is_set():
+        return [], None
+    metrics = _WORKER["metrics"]
+    found = crack_chunk(
+        rotor_ids,
+        POSITIONS[start:stop],
+        _WORKER["ciphertext"],
+        _WORKER["crib"],
+        _WORKER["plugboard_pairs"],
+        _WORKER["stop_event"],
+        metrics,
+    )
+    if metrics is None:
+        return found, None
+    delta = metrics.take()
+    delta["worker"] = os.getpid()
+    return found, delta
+
+
+def crack_with_crib_mt(
+    ciphertext,
+    crib,
+    plugboard_pairs=None,
+    max_workers=None,
+    stop_on_first=False,
+    max_results=None,
+    shard_size=None,
+    journal=None,
+    resume=False,
+    fsync_interval=1.0,
+    rotor_orders=None,
+    metrics=None,
+    output="decoded_matches_mt.txt",
+):
+    """
+    Multi-process crib search. The keyspace is cut into small shards
+    (rotor order x a slice of start positions) that idle workers pull from a
+    bounded queue, so every core stays busy until the end of the sweep.
+
+    Parameters:
+      - max_workers: Number of worker processes (default: cpu_count()).
+      - stop_on_first: Stop the whole pool after the first match.
+      - max_results: Stop the whole pool once this many matches are found.
+      - shard_size: Positions per task (default: sized to the worker count).
+      - journal: Path of a progress journal (see enigma_journal) that
+        records every finished shard and its matches as the sweep runs.
+      - resume: Skip the shards already recorded in `journal` and start from
+        the matches it holds.
+      - fsync_interval: Seconds between fsyncs of the journal.
+      - rotor_orders: Rotor orders to search (default: all of them).
+      - metrics: An enigma_metrics.Metrics that aggregates the workers'
+        counters and timers, per-worker rates and the task queue depth.
+      - output: File the matches are written to (None: don't write one).
+    """
+    crib = crib.upper()
+    ciphertext = ciphertext.upper().replace(' ', '')
+    if stop_on_first:
+        max_results = 1
+
+    if rotor_orders is None:
+        rotor_orders = list(itertools.permutations(ROTOR_WIRINGS.keys(), 3))
+    total = len(rotor_orders) * len(POSITIONS)
+    logger.info(f"Total combinations to try: {total}")
+
+    num_workers = max_workers or cpu_count()
+    if shard_size is None:
+        # A resumed sweep keeps the shards recorded in its journal, whatever
+        # the worker count is now
+        previous = read_params(journal) if journal is not None and resume else None
+        if previous is not None and "shard_size" in previous:
+            shard_size = previous["shard_size"]
+        else:
+            shard_size = shard_size_for(total, num_workers)
+    shards = [
+        (rotor_ids, start, stop)
+        for rotor_ids in rotor_orders
+        for start, stop in chunk_ranges(len(POSITIONS), shard_size)
+    ]
+    found = []
+    progress = None
+    if journal is not None:
+        params = {
+            "search": "crib_mt",
+            "ciphertext": ciphertext,
+            "crib": crib,
+            "plugboard_pairs": plugboard_pairs or {},
+            "shard_size": shard_size,
+            "rotor_orders": [list(rotor_ids) for rotor_ids in rotor_orders],
+        }
+        progress = Journal(journal, params, resume, fsync_interval)
+        found.extend(progress.results)
+        shards = [shard for shard in shards if not progress.is_done(shard)]
+    logger.info(f"Using {num_workers} workers, {len(shards)} shards of up to {shard_size} positions")
+
+    context = multiprocessing.get_context()
+    stop_event = context.Event()
+    pool_stats = {}
+    if metrics is not None:
+        metrics.set("keyspace", sum(stop - start for _, start, stop in shards))
+
+    try:
+        if max_results is None or len(found) < max_results:
+            with ProcessPoolExecutor(
+                max_workers=num_workers,
+                mp_context=context,
+                initializer=init_worker,
+                initargs=(ciphertext, crib, plugboard_pairs, stop_event, metrics is not None),
+            ) as executor:
+                results = run_bounded(executor, crack_shard, shards, num_workers * 4, pool_stats)
+                for shard, (result, delta) in tqdm(results, total=len(shards), desc="Processing"):
+                    found.extend(result)
+                    if metrics is not None:
+                        if delta is not None:
+                            metrics.merge(delta, worker=delta.pop("worker"))
+                        metrics.count("shards")
+                        metrics.set("in_flight", pool_stats["in_flight"])
+                        metrics.maybe_export()
+                    # A shard cut short by the stop flag is not complete
+                    if progress is not None and not stop_event.is_set():
+                        progress.record(shard, result)
+                    if max_results is not None and len(found) >= max_results:
+                        # Tell running shards to stop and drop the queued ones
+                        stop_event.set()
+                        results.close()
+                        break
+    finally:
+        if progress is not None:
+            progress.close()
+        if metrics is not None:
+            metrics.export()
+
+    if max_results is not None:
+        found = found[:max_results]
+
+    if output is not None:
+        with open(output, "w") as f:
+            for (rotor_ids, pos), decoded in found:
+                f.write(f"Rotors: {rotor_ids}, Position: {pos}, Decoded: {decoded}")
 
+    return found
 
 
 if __name__ == "__main__":
@@ -0,0 +1,507 @@
+import itertools
+import logging
+import string
+
+import numpy as np
+from enigma_machine_sim import (
+    GREEK_WIRINGS,
+    LETTER_INDEX,
+    M4_ROTOR_WIRINGS,
+    REFLECTOR_B,
+    ROTOR_WIRINGS,
+    THIN_REFLECTORS,
+    EnigmaMachine,
+    Plugboard,
+    Reflector,
+    Rotor,
+    rotor_spec,
+    rotor_tables,
+    wiring_to_table,
+)
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+
+# All 26^3 start positions in odometer order: index = 676*left + 26*middle + right.
+POSITIONS = [a + b + c for a in string.ascii_uppercase
+                       for b in string.ascii_uppercase
+                       for c in string.ascii_uppercase]
+
+# Upper bound on positions x letters held in one block, to keep memory flat
+# for long ciphertexts.
+BLOCK_CELLS = 1 << 22
+
+
+def start_offsets():
+    """Return (left, middle, right) offset arrays for all start positions."""
+    index = np.arange(len(POSITIONS))
+    return index // 676, (index // 26) % 26, index % 26
+
+
+def turnover_counts(steps, start, notch):
+    """
+    Number of times a rotor that has stepped `steps` times, starting from
+    `start`, has left its notch position. This is how often it turned its
+    left-hand neighbour over.
+    """
+    gap = (notch - start) % 26
+    return np.where(steps > gap, (steps - gap - 1) // 26 + 1, 0)
+
+
+def notch_turnovers(steps, start, notches):
+    """turnover_counts summed over a rotor's notches (none, one or two)."""
+    total = np.zeros_like(np.asarray(steps))
+    for notch in notches:
+        total = total + turnover_counts(steps, start, notch)
+    return total
+
+
+def rotor_notches(rotor_id):
+    return tuple(LETTER_INDEX[c] for c in rotor_spec(rotor_id)[1])
+
+
+def rotor_offsets(rotor_ids, length, left, middle, right):
+    """
+    Rotor offsets for every start position (rows) and letter (columns), using
+    the same stepping rule as EnigmaMachine.step_rotors: the rotors step
+    before each letter is encoded.
+    """
+    presses = np.arange(1, length + 1)[None, :]
+    right = right[:, None]
+    middle = middle[:, None]
+    middle_steps = notch_turnovers(presses, right, rotor_notches(rotor_ids[2]))
+    left_steps = notch_turnovers(middle_steps, middle, rotor_notches(rotor_ids[1]))
+    return (
+        ((left[:, None] + left_steps) % 26).astype(np.uint8),
+        ((middle + middle_steps) % 26).astype(np.uint8),
+        ((right + presses) % 26).astype(np.uint8),
+    )
+
+
+def rotor_arrays(rotor_id):
+    _, _, forward_at, backward_at = rotor_tables(rotor_spec(rotor_id)[0])
+    return np.array(forward_at, dtype=np.uint8), np.array(backward_at, dtype=np.uint8)
+
+
+def encode_codes(text, symbols):
+    """
+    Map text to uint8 codes: letters to 0-25, anything else to a code of 26 or
+    more shared through `symbols`, so non-letters only ever equal themselves.
+    """
+    codes = np.empty(len(text), dtype=np.uint8)
+    for i, c in enumerate(text):
+        if c in LETTER_INDEX:
+            codes[i] = LETTER_INDEX[c]
+        else:
+            if c not in symbols:
+                if len(symbols) >= 256 - 26:
+                    raise ValueError("Too many distinct non-letter characters")
+                symbols[c] = 26 + len(symbols)
+            codes[i] = symbols[c]
+    return codes
+
+
+def decode_block(
+    rotor_ids, cipher_letters, plug, reflector, left, middle, right, letter_indices=None, table=None
+):
+    """
+    Decrypt ciphertext letters for a block of start positions. By default
+    `cipher_letters` is the whole ciphertext; with `letter_indices` it holds
+    only the letters at those key presses. `table` is an optional
+    (26, 26, 26, 26) scrambler table from enigma_table_store, which replaces
+    the wiring lookups with a single gather (`reflector` is then unused).
+    """
+    if letter_indices is None:
+        off_l, off_m, off_r = rotor_offsets(rotor_ids, len(cipher_letters), left, middle, right)
+    else:
+        length = int(letter_indices[-1]) + 1 if len(letter_indices) else 0
+        off_l, off_m, off_r = (
+            offsets[:, letter_indices]
+            for offsets in rotor_offsets(rotor_ids, length, left, middle, right)
+        )
+
+    return decode_offsets(rotor_ids, cipher_letters, plug, reflector, off_l, off_m, off_r, table)
+
+
+def decode_offsets(rotor_ids, cipher_letters, plug, reflector, off_l, off_m, off_r, table=None):
+    """
+    Decrypt ciphertext letters (columns) at the given rotor offset arrays,
+    one row per key. These are the offsets the wirings sit at, i.e. the
+    window offsets minus any ring settings.
+    """
+    x = np.broadcast_to(plug[cipher_letters], off_r.shape)
+    if table is not None:
+        return plug[table[off_l, off_m, off_r, x]]
+
+    forward_l, backward_l = rotor_arrays(rotor_ids[0])
+    forward_m, backward_m = rotor_arrays(rotor_ids[1])
+    forward_r, backward_r = rotor_arrays(rotor_ids[2])
+    x = forward_r[off_r, x]
+    x = forward_m[off_m, x]
+    x = forward_l[off_l, x]
+    x = reflector[x]
+    x = backward_l[off_l, x]
+    x = backward_m[off_m, x]
+    x = backward_r[off_r, x]
+    return plug[x]
+
+
+def scrambler_arrays(rotor_ids, letter_indices, left, middle, right):
+    """
+    Plugboard-free scrambler permutation of every start position (axis 0) at
+    each of the given letter indices (axis 1), as a uint8 array of shape
+    (positions, len(letter_indices), 26).
+    """
+    letter_indices = np.asarray(letter_indices, dtype=np.intp)
+    length = int(letter_indices.max()) + 1 if letter_indices.size else 0
+    off_l, off_m, off_r = (
+        offsets[:, letter_indices, None]
+        for offsets in rotor_offsets(rotor_ids, length, left, middle, right)
+    )
+    forward_l, backward_l = rotor_arrays(rotor_ids[0])
+    forward_m, backward_m = rotor_arrays(rotor_ids[1])
+    forward_r, backward_r = rotor_arrays(rotor_ids[2])
+    reflector = np.array(wiring_to_table(REFLECTOR_B), dtype=np.uint8)
+
+    x = np.broadcast_to(np.arange(26, dtype=np.uint8), off_r.shape[:2] + (26,))
+    x = forward_r[off_r, x]
+    x = forward_m[off_m, x]
+    x = forward_l[off_l, x]
+    x = reflector[x]
+    x = backward_l[off_l, x]
+    x = backward_m[off_m, x]
+    return backward_r[off_r, x]
+
+
+def crib_windows(text, crib):
+    """
+    Codes and crib windows shared by the numpy crackers. Offsets where the
+    crib would put a letter on top of itself are illegal, and only letters
+    inside a legal crib window need decrypting. Returns None if no offset
+    is legal.
+    """
+    width = len(text) - len(crib) + 1
+    if width <= 0 or not crib:
+        return None
+
+    symbols = {}
+    cipher_codes = encode_codes(text, symbols)
+    crib_codes = encode_codes(crib, symbols)
+    letter_mask = cipher_codes < 26
+
+    legal = np.ones(width, dtype=bool)
+    for j, code in enumerate(crib_codes):
+        legal &= cipher_codes[j:j + width] != code
+    if not legal.any():
+        return None
+    in_window = np.zeros(len(text), dtype=bool)
+    for j in range(len(crib)):
+        in_window[j:j + width] |= legal
+    letter_indices = np.cumsum(letter_mask) - 1
+    window_letters = in_window & letter_mask
+    return symbols, cipher_codes, crib_codes, letter_mask, legal, window_letters, letter_indices
+
+
+def crib_hits(windows, crib_codes, legal):
+    """Rows of `windows` (keys x ciphertext codes) where the crib fits at some legal offset."""
+    width = len(legal)
+    hits = np.broadcast_to(legal, (len(windows), width)).copy()
+    for j, code in enumerate(crib_codes):
+        hits &= windows[:, j:j + width] == code
+    return np.flatnonzero(hits.any(axis=1))
+
+
+def crack_rotor_order_np(rotor_ids, ciphertext, crib, plugboard_pairs=None, table=None, reflector=REFLECTOR_B):
+    """
+    Try every start position of one rotor order at once. The ciphertext and
+    crib must already be upper-cased. Returns ((rotor_ids, pos), decoded)
+    tuples in position order, like crack_chunk. `table` is passed on to
+    decode_block; `reflector` is a wiring string.
+    """
+    text = ciphertext.replace(' ', '')
+    prepared = crib_windows(text, crib)
+    if prepared is None:
+        return []
+    symbols, cipher_codes, crib_codes, letter_mask, legal, window_letters, letter_indices = prepared
+    cipher_letters = cipher_codes[letter_mask]
+
+    plug = np.array(Plugboard(plugboard_pairs or {}).table, dtype=np.uint8)
+    reflector = np.array(wiring_to_table(reflector), dtype=np.uint8)
+    left, middle, right = start_offsets()
+
+    block = max(1, BLOCK_CELLS // max(1, len(text)))
+    found = []
+    for start in range(0, len(POSITIONS), block):
+        stop = min(start + block, len(POSITIONS))
+        windows = np.empty((stop - start, len(text)), dtype=np.uint8)
+        windows[:, ~letter_mask] = cipher_codes[~letter_mask]
+        windows[:, window_letters] = decode_block(
+            rotor_ids, cipher_codes[window_letters], plug, reflector,
+            left[start:stop], middle[start:stop], right[start:stop],
+            letter_indices[window_letters], table,
+        )
+
+        for row in crib_hits(windows, crib_codes, legal):
+            index = start + row
+            decoded = cipher_codes.copy()
+            decoded[letter_mask] = decode_block(
+                rotor_ids, cipher_letters, plug, reflector,
+                left[index:index + 1], middle[index:index + 1], right[index:index + 1],
+                table=table,
+            )[0]
+            found.append(((rotor_ids, POSITIONS[index]), codes_to_text(decoded, symbols)))
+    return found
+
+
+# Ring settings. The ring turns a rotor's wiring against its lettered ring:
+# the wiring sits at (window offset - ring), while stepping still follows
+# the window, since the notch is on the ring. For the left rotor, which
+# turns nothing over, only the difference matters, so its ring is fixed at
+# A and folded into the start position. For the middle and right rotors the
+# search does not sweep 26**2 ring pairs. Instead:
+#
+# - Every key is described by the wiring offsets at the start (the 26**3
+#   "effective" positions) plus the window positions of the middle and
+#   right rotors, which only decide when they turn their neighbours over.
+# - With no middle or left stepping, the right rotor alone gives a base
+#   decryption D[e, t] of letter t for every effective position e, computed
+#   once per rotor order: one ordinary sweep.
+# - Any key with steps m(t) and l(t) of the middle and left rotors before
+#   letter t decrypts it as D[e shifted by (l(t), m(t)), t]. So each stepping
+#   pattern is a row shuffle of D, not a new decryption, and D's columns for
+#   each distinct (t, l, m) are gathered only once.
+# - Window positions that step identically within the crib windows give
+#   identical decryptions there, so they collapse into one pattern, and
+#   only one representative key of each collapsed group is reported.
+
+def stepping_patterns(rotor_ids, length):
+    """
+    Distinct stepping patterns of the middle and left rotors over `length`
+    key presses, as (middle_window, right_window, middle_steps, left_steps)
+    with one step count per press.
+    """
+    presses = np.arange(1, length + 1)
+    seen_right = set()
+    for right_window in range(26):
+        middle_steps = notch_turnovers(presses, right_window, rotor_notches(rotor_ids[2]))
+        if middle_steps.tobytes() in seen_right:
+            continue
+        seen_right.add(middle_steps.tobytes())
+        seen_middle = set()
+        for middle_window in range(26):
+            left_steps = notch_turnovers(middle_steps, middle_window, rotor_notches(rotor_ids[1]))
+            if left_steps.tobytes() in seen_middle:
+                continue
+            seen_middle.add(left_steps.tobytes())
+            yield middle_window, right_window, middle_steps, left_steps
+
+
+def crack_rotor_order_rings_np(
+    rotor_ids, ciphertext, crib, plugboard_pairs=None, table=None, reflector=REFLECTOR_B
+):
+    """
+    Like crack_rotor_order_np, but over the ring settings of the middle and
+    right rotors as well. Returns ((rotor_ids, positions, rings), decoded)
+    tuples; the left ring is always A.
+    """
+    text = ciphertext.replace(' ', '')
+    prepared = crib_windows(text, crib)
+    if prepared is None:
+        return []
+    symbols, cipher_codes, crib_codes, letter_mask, legal, window_letters, letter_indices = prepared
+
+    plug = np.array(Plugboard(plugboard_pairs or {}).table, dtype=np.uint8)
+    reflect = np.array(wiring_to_table(reflector), dtype=np.uint8)
+    left, middle, right = start_offsets()
+
+    presses = letter_indices[window_letters]
+    length = int(presses[-1]) + 1
+    base = decode_offsets(
+        rotor_ids, cipher_codes[window_letters], plug, reflect,
+        left[:, None], middle[:, None], (right[:, None] + presses + 1) % 26, table,
+    )
+
+    columns = {}
+    windows = np.empty((len(POSITIONS), len(text)), dtype=np.uint8)
+    windows[:, ~letter_mask] = cipher_codes[~letter_mask]
+    window_columns = np.flatnonzero(window_letters)
+    found = []
+    for middle_window, right_window, middle_steps, left_steps in stepping_patterns(rotor_ids, length):
+        for k, press in enumerate(presses):
+            key = (k, int(left_steps[press]), int(middle_steps[press]))
+            if key not in columns:
+                _, l, m = key
+                rows = ((left + l) % 26) * 676 + ((middle + m) % 26) * 26 + right
+                columns[key] = base[rows, k]
+            windows[:, window_columns[k]] = columns[key]
+
+        for index in crib_hits(windows, crib_codes, legal):
+            positions, rings = ring_key(index, middle_window, right_window)
+            machine = ring_machine(rotor_ids, positions, rings, plugboard_pairs, reflector)
+            found.append(((rotor_ids, positions, rings), machine.encode_message(text)))
+    return found
+
+
+def ring_key(index, middle_window, right_window):
+    """Window positions and rings of a key given as an effective position and window offsets."""
+    effective_left, effective_middle, effective_right = index // 676, (index // 26) % 26, index % 26
+    letters = string.ascii_uppercase
+    positions = letters[effective_left] + letters[middle_window] + letters[right_window]
+    rings = 'A' + letters[(middle_window - effective_middle) % 26] + letters[(right_window - effective_right) % 26]
+    return positions, rings
+
+
+def ring_machine(rotor_ids, positions, rings, plugboard_pairs=None, reflector=REFLECTOR_B):
+    rotors = [
+        Rotor(*rotor_spec(rotor_id), position=pos, ring=ring)
+        for rotor_id, pos, ring in zip(rotor_ids, positions, rings)
+    ]
+    return EnigmaMachine(rotors, Reflector(reflector), Plugboard(plugboard_pairs or {}))
+
+
+def codes_to_text(codes, symbols):
+    names = list(string.ascii_uppercase) + list(symbols)
+    return ''.join(names[c] for c in codes)
+
+
+def crack_with_crib_np(ciphertext, crib, plugboard_pairs=None, store=None, output="decoded_matches_np.txt"):
+    """
+    Batched version of crack_with_crib: each rotor order is decrypted for all
+    17,576 start positions as one array job and the crib is tested at every
+    offset with vectorized comparisons. With an enigma_table_store.TableStore
+    as `store`, decryption is a lookup in its memory-mapped tables. The
+    matches are also written to `output` unless it is None.
+    """
+    crib = crib.upper()
+    ciphertext = ciphertext.upper()
+
+    rotor_orders = list(itertools.permutations(ROTOR_WIRINGS.keys(), 3))
+    logger.info(f"Total combinations to try: {len(rotor_orders) * len(POSITIONS)}")
+
+    found = []
+    for rotor_ids in tqdm(rotor_orders, desc="Rotor Orders"):
+        table = store.table(rotor_ids) if store is not None else None
+        for match in crack_rotor_order_np(rotor_ids, ciphertext, crib, plugboard_pairs, table):
+            logger.info(f"[Match] Rotors: {rotor_ids}, Pos: {match[0][1]}, Decoded: {match[1]}")
+            found.append(match)
+
+    if output is not None:
+        with open(output, "w") as f:
+            for (rotor_ids, pos), decoded in found:
+                f.write(f"Rotors: {rotor_ids}, Position: {pos}, Decoded: {decoded}\n")
+
+    return found
+
+
+def crack_with_crib_rings_np(
+    ciphertext, crib, plugboard_pairs=None, store=None, output="decoded_matches_rings_np.txt"
+):
+    """
+    crack_with_crib_np over ring settings too (see crack_rotor_order_rings_np).
+    Matches are ((rotor_ids, positions, rings), decoded).
+    """
+    crib = crib.upper()
+    ciphertext = ciphertext.upper()
+
+    rotor_orders = list(itertools.permutations(ROTOR_WIRINGS.keys(), 3))
+    logger.info(f"Total combinations to try: {len(rotor_orders) * len(POSITIONS) * 26 ** 2}")
+
+    found = []
+    for rotor_ids in tqdm(rotor_orders, desc="Rotor Orders"):
+        table = store.table(rotor_ids) if store is not None else None
+        for match in crack_rotor_order_rings_np(rotor_ids, ciphertext, crib, plugboard_pairs, table):
+            (_, positions, rings), decoded = match
+            logger.info(f"[Match] Rotors: {rotor_ids}, Pos: {positions}, Rings: {rings}, Decoded: {decoded}")
+            found.append(match)
+
+    if output is not None:
+        with open(output, "w") as f:
+            for (rotor_ids, positions, rings), decoded in found:
+                f.write(f"Rotors: {rotor_ids}, Position: {positions}, Rings: {rings}, Decoded: {decoded}\n")
+
+    return found
+
+
+# M4. The Greek rotor never steps, so together with the thin reflector it
+# acts as one fixed reflector for each of its 26 offsets (its ring, like the
+# left ring, only shifts that offset and is fixed at A). An M4 key is then a
+# three-rotor key with one of these effective reflectors, and the sweep
+# costs 26 three-rotor sweeps per Greek rotor and thin reflector.
+
+def m4_reflectors(greek_id, reflector_id):
+    """Effective reflector wirings of a Greek rotor plus thin reflector, one per Greek offset."""
+    _, _, forward_at, backward_at = rotor_tables(GREEK_WIRINGS[greek_id][0])
+    thin = wiring_to_table(THIN_REFLECTORS[reflector_id])
+    return [
+        ''.join(string.ascii_uppercase[backward_at[g][thin[forward_at[g][x]]]] for x in range(26))
+        for g in range(26)
+    ]
+
+
+def crack_with_crib_m4_np(
+    ciphertext,
+    crib,
+    plugboard_pairs=None,
+    rotor_orders=None,
+    greek_ids=tuple(GREEK_WIRINGS),
+    reflector_ids=tuple(THIN_REFLECTORS),
+    rings=False,
+    output="decoded_matches_m4_np.txt",
+):
+    """
+    Crib search over M4 keys: rotor orders from I-VIII (all 336 by default),
+    each Greek rotor and thin reflector, and with rings=True the middle and
+    right ring settings too. Matches are ((rotor_ids, positions, reflector_id),
+    decoded), or ((rotor_ids, positions, rings, reflector_id), decoded) with
+    rings, where rotor_ids and positions start with the Greek rotor. The
+    matches are also written to `output` unless it is None.
+    """
+    crib = crib.upper()
+    ciphertext = ciphertext.upper()
+    if rotor_orders is None:
+        rotor_orders = list(itertools.permutations(M4_ROTOR_WIRINGS.keys(), 3))
+    settings = [(greek_id, reflector_id) for greek_id in greek_ids for reflector_id in reflector_ids]
+    logger.info(
+        f"Total combinations to try: {len(rotor_orders) * len(settings) * 26 * len(POSITIONS) * (676 if rings else 1)}"
+    )
+
+    crack_order = crack_rotor_order_rings_np if rings else crack_rotor_order_np
+    found = []
+    for greek_id, reflector_id in settings:
+        reflectors = m4_reflectors(greek_id, reflector_id)
+        for rotor_ids in tqdm(rotor_orders, desc=f"Rotor Orders ({greek_id}, thin {reflector_id})"):
+            for greek_offset, reflector in enumerate(reflectors):
+                greek_position = string.ascii_uppercase[greek_offset]
+                for key, decoded in crack_order(rotor_ids, ciphertext, crib, plugboard_pairs, reflector=reflector):
+                    ids = (greek_id,) + tuple(rotor_ids)
+                    key = (ids, greek_position + key[1]) + (('A' + key[2],) if rings else ()) + (reflector_id,)
+                    logger.info(f"[Match] M4 key: {key}, Decoded: {decoded}")
+                    found.append((key, decoded))
+
+    if output is not None:
+        with open(output, "w") as f:
+            for key, decoded in found:
+                f.write(f"Key: {key}, Decoded: {decoded}\n")
+
+    return found
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    plugboard_settings = {'A': 'B', 'C': 'D'}
+    plaintext = "HELLOWORLD"
+
+    test_rotors = [
+        Rotor(*ROTOR_WIRINGS['I'], position='A'),
+        Rotor(*ROTOR_WIRINGS['II'], position='A'),
+        Rotor(*ROTOR_WIRINGS['III'], position='A')
+    ]
+    test_machine = EnigmaMachine(test_rotors, Reflector(REFLECTOR_B), Plugboard(plugboard_settings))
+    ciphertext = test_machine.encode_message(plaintext)
+    print("Generated Ciphertext:", ciphertext)
+
+    matches = crack_with_crib_np(ciphertext, "HELLO", plugboard_settings)
+
+    for (rotor_ids, pos), decoded in matches:
+        print(f"Match at rotors {rotor_ids} with position {pos}: {decoded}")
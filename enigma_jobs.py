@@ -0,0 +1,125 @@
+import itertools
+import logging
+import threading
+import time
+
+from enigma_crib_cracker_mt import POSITIONS, crack_chunk
+from enigma_machine_sim import ROTOR_WIRINGS
+from enigma_pool import chunk_ranges, run_bounded
+
+logger = logging.getLogger(__name__)
+
+# Background crib searches on a long-lived, shared process pool.
+#
+# A CrackJob feeds its shards to the pool from a thread of its own, so the
+# caller (a UI rerun, a request handler) returns at once and can poll
+# `progress` and `matches` while the search runs. Because the pool outlives
+# the job, tasks carry their inputs instead of relying on a pool
+# initializer. Cancelling stops submitting shards and drops the queued ones;
+# a shard that is already running finishes, which takes a fraction of a
+# second at the default shard size.
+
+
+def crack_range(rotor_ids, start, stop, ciphertext, crib, plugboard_pairs):
+    """Pool task: positions[start:stop] of one rotor order."""
+    return crack_chunk(rotor_ids, POSITIONS[start:stop], ciphertext, crib, plugboard_pairs)
+
+
+class CrackJob:
+    PENDING, RUNNING, FINISHED, CANCELLED, FAILED = "pending", "running", "finished", "cancelled", "failed"
+
+    def __init__(
+        self,
+        executor,
+        ciphertext,
+        crib,
+        plugboard_pairs=None,
+        rotor_orders=None,
+        shard_size=512,
+        max_in_flight=8,
+    ):
+        self.executor = executor
+        self.ciphertext = ciphertext.upper().replace(' ', '')
+        self.crib = crib.upper()
+        self.plugboard_pairs = plugboard_pairs
+        if rotor_orders is None:
+            rotor_orders = list(itertools.permutations(ROTOR_WIRINGS.keys(), 3))
+        self.shards = [
+            (rotor_ids, start, stop)
+            for rotor_ids in rotor_orders
+            for start, stop in chunk_ranges(len(POSITIONS), shard_size)
+        ]
+        self.max_in_flight = max_in_flight
+        self.total = len(rotor_orders) * len(POSITIONS)
+        self.searched = 0
+        self.status = self.PENDING
+        self.error = None
+        self.started = None
+        self.finished = None
+        self._matches = []
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.status = self.RUNNING
+        self.started = time.monotonic()
+        self._thread.start()
+        return self
+
+    def _tasks(self):
+        for rotor_ids, start, stop in self.shards:
+            if self._cancel.is_set():
+                return
+            yield rotor_ids, start, stop, self.ciphertext, self.crib, self.plugboard_pairs
+
+    def _run(self):
+        try:
+            results = run_bounded(self.executor, crack_range, self._tasks(), self.max_in_flight)
+            try:
+                for task, found in results:
+                    with self._lock:
+                        self.searched += task[2] - task[1]
+                        self._matches.extend(found)
+                    if self._cancel.is_set():
+                        break
+            finally:
+                results.close()
+            self.status = self.CANCELLED if self._cancel.is_set() else self.FINISHED
+        except Exception as e:
+            logger.exception("Crack job failed")
+            self.error = e
+            self.status = self.FAILED
+        finally:
+            self.finished = time.monotonic()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    @property
+    def running(self):
+        return self.status in (self.PENDING, self.RUNNING)
+
+    @property
+    def matches(self):
+        with self._lock:
+            return list(self._matches)
+
+    @property
+    def progress(self):
+        return self.searched / self.total if self.total else 1.0
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rate(self):
+        """Candidates per second so far."""
+        return self.searched / self.elapsed if self.elapsed > 0 else 0.0
@@ -0,0 +1,109 @@
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Progress journal for long sweeps.
+#
+# A JSON-lines file: a header line with the search parameters, then one line
+# per finished shard holding its key and the results it produced. Lines are
+# appended as shards finish and fsync'd at most every `fsync_interval`
+# seconds, so a killed run loses only the last few shards. A torn last line
+# (the process died mid-write) is ignored on load.
+
+
+class Journal:
+    def __init__(self, path, params, resume=False, fsync_interval=1.0):
+        """
+        Open the journal at `path` for a sweep described by `params` (a
+        JSON-serializable dict). With `resume`, shards already recorded in an
+        existing journal are loaded; the journal must have been written for
+        the same params, otherwise ValueError is raised. Without `resume`,
+        any existing journal is overwritten.
+        """
+        self.path = path
+        self.params = params
+        self.fsync_interval = fsync_interval
+        self.done = set()
+        self.results = []
+
+        if resume and os.path.exists(path):
+            self._load()
+            self._file = open(path, "a")
+            logger.info(f"Resuming from {path}: {len(self.done)} shards done, {len(self.results)} results")
+        else:
+            self._file = open(path, "w")
+            self._write({"type": "header", "params": params})
+            self.sync()
+        self._last_sync = time.monotonic()
+
+    def _load(self):
+        with open(self.path) as f:
+            lines = f.read().split("\n")
+        # Everything after the last newline is a partial write
+        complete = lines[:-1]
+        if not complete:
+            raise ValueError(f"Journal {self.path} has no header")
+        header = json.loads(complete[0])
+        if header.get("params") != self.params:
+            raise ValueError(
+                f"Journal {self.path} was written for {header.get('params')}, not {self.params}"
+            )
+        for line in complete[1:]:
+            record = json.loads(line)
+            self.done.add(freeze(record["key"]))
+            self.results.extend(freeze(result) for result in record["results"])
+        if lines[-1]:
+            # Cut the torn line off so new records start on a fresh line
+            with open(self.path, "r+") as f:
+                f.truncate(sum(len(line) + 1 for line in complete))
+
+    def _write(self, record):
+        self._file.write(json.dumps(record) + "\n")
+
+    def record(self, key, results):
+        """Append a finished shard and its results."""
+        self._write({"type": "shard", "key": key, "results": results})
+        self.done.add(freeze(key))
+        self.results.extend(freeze(result) for result in results)
+        if time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def is_done(self, key):
+        return freeze(key) in self.done
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_params(path):
+    """Params of an existing journal, or None if there is no journal yet."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        line = f.readline()
+    return json.loads(line)["params"] if line.endswith("\n") else None
+
+
+def freeze(value):
+    """Turn the lists JSON gives back into tuples, recursively."""
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, dict):
+        return {key: freeze(item) for key, item in value.items()}
+    return value
@@ -0,0 +1,129 @@
+import logging
+
+import numpy as np
+from enigma_crib_cracker_np import notch_turnovers
+from enigma_machine_sim import BYTE_CODES, BYTE_SKIP
+
+logger = logging.getLogger(__name__)
+
+# Compiled keystream for one fixed key.
+#
+# With the key fixed, the substitution for a key press depends only on the
+# rotor state, and the rotor states repeat every 26**3 presses (the
+# right rotor turns the middle one over once per 26 presses, the middle one
+# turns the left one over once per 676). A KeystreamTable stores, for each
+# press in that period, a 256-entry byte map: letters (either case) go to
+# their encoded capital and every other byte maps to itself. Encrypting a
+# buffer is then one gather, table[press, byte], instead of a Python call
+# per letter. Rows are computed in segments the first time they are needed,
+# or all at once with lazy=False (26**3 x 256 bytes = 4.5 MB).
+
+PERIOD = 26 ** 3
+SEGMENT = 1024
+
+_IS_LETTER = np.array([code >= 0 for code in BYTE_CODES])
+_IS_SPACE = np.array([code == BYTE_SKIP for code in BYTE_CODES])
+
+
+class KeystreamTable:
+    def __init__(self, machine, lazy=True):
+        """
+        Compile `machine` from its current rotor state. The machine itself
+        is not moved; the table keeps its own position, starting at the
+        machine's current state.
+        """
+        self.rotors = [
+            (np.array(rotor.forward_at, dtype=np.uint8), np.array(rotor.backward_at, dtype=np.uint8),
+             rotor.offset, rotor.notch_offsets)
+            for rotor in machine.rotors
+        ]
+        self.reflector = np.array(machine.reflector.table, dtype=np.uint8)
+        self.plug = np.array(machine.plugboard.table, dtype=np.uint8)
+        self.position = 0
+        self.maps = np.empty((PERIOD, 256), dtype=np.uint8)
+        self._built = np.zeros(-(-PERIOD // SEGMENT), dtype=bool)
+        if not lazy:
+            self._build(0, PERIOD)
+            self._built[:] = True
+
+    def _offsets(self, presses):
+        """Offsets of every rotor after each number of key presses, rotors first."""
+        offsets = [None] * len(self.rotors)
+        steps = presses
+        for k in range(len(self.rotors) - 1, -1, -1):
+            _, _, start, notches = self.rotors[k]
+            if k < len(self.rotors) - 3:
+                # Only the three rightmost rotors ever step
+                offsets[k] = np.full_like(presses, start)
+                continue
+            offsets[k] = (start + steps) % 26
+            steps = notch_turnovers(steps, start, notches)
+        return offsets
+
+    def _build(self, start, stop):
+        presses = np.arange(start + 1, stop + 1)[:, None]
+        offsets = self._offsets(presses)
+        x = np.broadcast_to(self.plug, (stop - start, 26))
+        for (forward, _, _, _), offset in zip(reversed(self.rotors), reversed(offsets)):
+            x = forward[offset, x]
+        x = self.reflector[x]
+        for (_, backward, _, _), offset in zip(self.rotors, offsets):
+            x = backward[offset, x]
+        permutations = self.plug[x]
+
+        maps = self.maps[start:stop]
+        maps[:] = np.arange(256, dtype=np.uint8)
+        maps[:, 65:91] = permutations + 65
+        maps[:, 97:123] = permutations + 65
+
+    def _ensure(self, first, count):
+        """Build the segments holding presses first .. first + count - 1 (mod the period)."""
+        if self._built.all() or count <= 0:
+            return
+        segments = range(first // SEGMENT, (first + min(count, PERIOD) - 1) // SEGMENT + 1)
+        for segment in segments:
+            segment %= len(self._built)
+            if not self._built[segment]:
+                start = segment * SEGMENT
+                self._build(start, min(start + SEGMENT, PERIOD))
+                self._built[segment] = True
+
+    def permutation(self, press):
+        """Letter substitution (26 indices) used for the press-th key press, from 0."""
+        press %= PERIOD
+        self._ensure(press, 1)
+        return tuple(int(c) - 65 for c in self.maps[press, 65:91])
+
+    def seek(self, offset):
+        """Continue from `offset` key presses after the compiled state."""
+        self.position = offset % PERIOD
+
+    def encode_into(self, data, out):
+        """
+        Encode bytes-like `data` into the writable buffer `out` (at least as
+        long as data) with the rules of EnigmaMachine.encode_bytes, and return
+        the number of bytes written. Neither buffer is copied unless data
+        contains spaces, which are dropped.
+        """
+        source = np.frombuffer(data, dtype=np.uint8)
+        if _IS_SPACE[source].any():
+            source = source[~_IS_SPACE[source]]
+        letters = _IS_LETTER[source]
+        pressed = np.cumsum(letters, dtype=np.int64)
+        count = int(pressed[-1]) if len(pressed) else 0
+        # Row for each byte: the press it makes. Non-letters take the row of
+        # the next press, which maps them to themselves like every row does,
+        # so that one has to be built as well.
+        rows = (pressed - letters + self.position) % PERIOD
+        self._ensure(self.position, count + 1)
+        target = np.frombuffer(out, dtype=np.uint8)[:len(source)]
+        np.take(self.maps.reshape(-1), rows * 256 + source, out=target)
+        self.position = (self.position + count) % PERIOD
+        return len(source)
+
+    def encode_bytes(self, data):
+        """Drop-in for EnigmaMachine.encode_bytes; returns new bytes."""
+        out = bytearray(memoryview(data).nbytes)
+        n = self.encode_into(data, out)
+        del out[n:]
+        return bytes(out)
@@ -1,75 +1,263 @@
 import logging
 import string
-from typing import Dict
+from functools import lru_cache
+from typing import Dict, Mapping, Tuple
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+ALPHABET = string.ascii_uppercase
+LETTER_INDEX = {c: i for i, c in enumerate(ALPHABET)}
+
+
+Table = Tuple[int, ...]
+
+# Byte value -> letter index for encode_bytes: A-Z and a-z map to 0-25,
+# spaces are dropped (BYTE_SKIP) and everything else passes through
+# unchanged (BYTE_PASS), the same rules encode_message applies to text.
+BYTE_SKIP = -2
+BYTE_PASS = -1
+BYTE_CODES = tuple(
+    b - 65 if 65 <= b <= 90 else b - 97 if 97 <= b <= 122 else BYTE_SKIP if b == 32 else BYTE_PASS
+    for b in range(256)
+)
+
+
+def wiring_to_table(wiring: str) -> Table:
+    return tuple(LETTER_INDEX[c] for c in wiring)
+
+
+def invert_table(table: Table) -> Table:
+    inverse = [0] * 26
+    for i, j in enumerate(table):
+        inverse[j] = i
+    return tuple(inverse)
+
+
+def shifted_tables(table: Table) -> Tuple[Table, ...]:
+    # One 26-entry table per rotor offset, so the hot path is a single lookup
+    # instead of two additions and two modulo operations.
+    return tuple(
+        tuple((table[(i + p) % 26] - p) % 26 for i in range(26)) for p in range(26)
+    )
+
+
+@lru_cache(maxsize=None)
+def rotor_tables(wiring: str) -> Tuple[Table, Table, Tuple[Table, ...], Tuple[Table, ...]]:
+    # Rotors are rebuilt constantly by the crackers, so the tables for each
+    # wiring are computed once and shared between instances. They are tuples
+    # so that sharing them is safe.
+    forward = wiring_to_table(wiring)
+    backward = invert_table(forward)
+    return forward, backward, shifted_tables(forward), shifted_tables(backward)
+
+
+@lru_cache(maxsize=None)
+def ring_tables(wiring: str, ring: int) -> Tuple[Tuple[Table, ...], Tuple[Table, ...]]:
+    # The ring setting turns the wiring against the lettered ring, so at
+    # window offset p the wiring sits at p - ring. Rotating the per-offset
+    # tables by the ring keeps the hot path a single lookup by window offset.
+    _, _, forward_at, backward_at = rotor_tables(wiring)
+    return (
+        tuple(forward_at[(p - ring) % 26] for p in range(26)),
+        tuple(backward_at[(p - ring) % 26] for p in range(26)),
+    )
+
+
 class Rotor:
-    def __init__(self, wiring: str, notch: str, position: str = 'A'):
+    def __init__(self, wiring: str, notch: str, position: str = 'A', ring: str = 'A'):
+        self._ring_offset = LETTER_INDEX[ring]
         self.wiring = wiring
         self.notch = notch
-        self.position = position
+        self.offset = LETTER_INDEX[position]
+
+    @property
+    def wiring(self) -> str:
+        return self._wiring
+
+    @wiring.setter
+    def wiring(self, value: str):
+        # Keep the integer tables in step with the wiring string.
+        self._wiring = value
+        self._build_tables()
+
+    @property
+    def ring(self) -> str:
+        """Ring setting (Ringstellung), 'A' for none."""
+        return ALPHABET[self._ring_offset]
+
+    @ring.setter
+    def ring(self, value: str):
+        self._ring_offset = LETTER_INDEX[value]
+        self._build_tables()
+
+    @property
+    def ring_offset(self) -> int:
+        return self._ring_offset
+
+    def _build_tables(self):
+        self.forward, self.backward, self.forward_at, self.backward_at = rotor_tables(self._wiring)
+        if self._ring_offset:
+            self.forward_at, self.backward_at = ring_tables(self._wiring, self._ring_offset)
+
+    @property
+    def notch(self) -> str:
+        return self._notch
+
+    @notch.setter
+    def notch(self, value: str):
+        # One letter for most rotors, two for the naval rotors VI-VIII and
+        # none for the Greek rotors, which never step.
+        self._notch = value
+        self.notch_offsets = tuple(LETTER_INDEX[c] for c in value)
+        self.turnover_at = tuple(p in self.notch_offsets for p in range(26))
+
+    @property
+    def position(self) -> str:
+        return ALPHABET[self.offset]
+
+    @position.setter
+    def position(self, value: str):
+        self.offset = LETTER_INDEX[value]
 
     def encode_forward(self, c: str) -> str:
-        pos_offset = string.ascii_uppercase.index(self.position)
-        input_index = (string.ascii_uppercase.index(c) + pos_offset) % 26
-        wired_letter = self.wiring[input_index]
-        output_index = (string.ascii_uppercase.index(wired_letter) - pos_offset) % 26
-        result = string.ascii_uppercase[output_index]
-        logger.debug(f"  Rotor {self.wiring[:4]} (fwd): {c} -> {result} [pos {self.position}]")
+        result = ALPHABET[self.forward_at[self.offset][LETTER_INDEX[c]]]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"  Rotor {self.wiring[:4]} (fwd): {c} -> {result} [pos {self.position}]")
         return result
 
     def encode_backward(self, c: str) -> str:
-        pos_offset = string.ascii_uppercase.index(self.position)
-        # Adjust for position offset (opposite direction as forward path)
-        adjusted_c_idx = (string.ascii_uppercase.index(c) + pos_offset) % 26
-        adjusted_c = string.ascii_uppercase[adjusted_c_idx]
-
-        # Find where this letter would be output in the wiring
-        wired_idx = self.wiring.find(adjusted_c)
-
-        # Adjust back for position offset
-        result_idx = (wired_idx - pos_offset) % 26
-        result = string.ascii_uppercase[result_idx]
-
-        logger.debug(
-            f"  Rotor {self.wiring[:4]} (bwd): {c} -> {result} [pos {self.position}]"
-        )
+        result = ALPHABET[self.backward_at[self.offset][LETTER_INDEX[c]]]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"  Rotor {self.wiring[:4]} (bwd): {c} -> {result} [pos {self.position}]"
+            )
         return result
 
 
     def step(self):
-        was_at_notch = self.position == self.notch
-        prev_pos = self.position
-        self.position = string.ascii_uppercase[(string.ascii_uppercase.index(self.position) + 1) % 26]
-        logger.debug(f"  Stepping rotor from {prev_pos} to {self.position} (notch at {self.notch})")
+        was_at_notch = self.turnover_at[self.offset]
+        prev_offset = self.offset
+        self.offset = (self.offset + 1) % 26
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"  Stepping rotor from {ALPHABET[prev_offset]} to {self.position} (notch at {self.notch})")
         return was_at_notch
 
 class Reflector:
     def __init__(self, wiring: str):
         self.wiring = wiring
 
+    @property
+    def wiring(self) -> str:
+        return self._wiring
+
+    @wiring.setter
+    def wiring(self, value: str):
+        self._wiring = value
+        self.table = wiring_to_table(value)
+
     def reflect(self, c: str) -> str:
-        result = self.wiring[string.ascii_uppercase.index(c)]
-        logger.debug(f"  Reflector: {c} -> {result}")
+        result = self.wiring[LETTER_INDEX[c]]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"  Reflector: {c} -> {result}")
         return result
 
 
+class PlugboardMapping(dict):
+    """A plugboard's letter mapping; every change rebuilds the plugboard's table."""
+
+    def __init__(self, plugboard: "Plugboard", mapping: Mapping[str, str]):
+        super().__init__(mapping)
+        self._plugboard = plugboard
+
+    def _changed(self):
+        self._plugboard.table = tuple(LETTER_INDEX.get(self.get(c, c), i) for i, c in enumerate(ALPHABET))
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._changed()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._changed()
+
+    def setdefault(self, key, default=None):
+        result = super().setdefault(key, default)
+        self._changed()
+        return result
+
+    def pop(self, *args):
+        result = super().pop(*args)
+        self._changed()
+        return result
+
+    def popitem(self):
+        result = super().popitem()
+        self._changed()
+        return result
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+
 class Plugboard:
     def __init__(self, swaps: Dict[str, str]):
-        self.mapping = {c: c for c in string.ascii_uppercase}
+        self.set_swaps(swaps)
+
+    def set_swaps(self, swaps: Dict[str, str]):
+        mapping = {c: c for c in string.ascii_uppercase}
         for a, b in swaps.items():
-            self.mapping[a] = b
-            self.mapping[b] = a
+            mapping[a] = b
+            mapping[b] = a
+        self.mapping = mapping
+
+    @property
+    def mapping(self) -> Dict[str, str]:
+        # The integer table is derived from the mapping, which rebuilds it
+        # whenever it is changed or replaced.
+        return self._mapping
+
+    @mapping.setter
+    def mapping(self, value: Mapping[str, str]):
+        self._mapping = PlugboardMapping(self, value)
+        self._mapping._changed()
+
+    def __getstate__(self):
+        # Pickle a plain dict; the table and the link back are rebuilt on load
+        return {"mapping": dict(self._mapping)}
+
+    def __setstate__(self, state):
+        self.mapping = state["mapping"]
 
     def swap(self, c: str) -> str:
         result = self.mapping.get(c, c)
-        if c != result:
+        if c != result and logger.isEnabledFor(logging.DEBUG):
             logger.debug(f"  Plugboard: {c} -> {result}")
         return result
 
 
+def turnover_count(steps: int, start: int, notch: int) -> int:
+    """
+    Number of times a rotor that steps `steps` times from offset `start`
+    leaves its notch, i.e. how often it turns its left-hand neighbour over.
+    """
+    gap = (notch - start) % 26
+    return (steps - gap - 1) // 26 + 1 if steps > gap else 0
+
+
+def turnover_total(steps: int, start: int, notches: Tuple[int, ...]) -> int:
+    """turnover_count summed over all notches of a rotor."""
+    return sum(turnover_count(steps, start, notch) for notch in notches)
+
+
 class EnigmaMachine:
     def __init__(self, rotors: list, reflector: Reflector, plugboard: Plugboard):
         self._initial_positions = [rotor.position for rotor in rotors]
@@ -77,10 +265,61 @@ class EnigmaMachine:
         self.reflector = reflector
         self.plugboard = plugboard
 
+    def step_rotors(self):
+        # Same stepping rule as the letter-level path below: the right rotor
+        # always steps, and each rotor to its left steps only when its
+        # neighbour was sitting on its notch before stepping.
+        rotors = self.rotors
+        if not rotors:
+            return
+        right = rotors[-1]
+        turnover = right.turnover_at[right.offset]
+        right.offset = (right.offset + 1) % 26
+        if turnover and len(rotors) >= 2:
+            middle = rotors[-2]
+            turnover = middle.turnover_at[middle.offset]
+            middle.offset = (middle.offset + 1) % 26
+            if turnover and len(rotors) >= 3:
+                left = rotors[-3]
+                left.offset = (left.offset + 1) % 26
+
+    def encode_index(self, i: int) -> int:
+        """Step the rotors and encode one letter given as an index 0-25."""
+        self.step_rotors()
+        plug = self.plugboard.table
+        i = plug[i]
+        rotors = self.rotors
+        for rotor in reversed(rotors):
+            i = rotor.forward_at[rotor.offset][i]
+        i = self.reflector.table[i]
+        for rotor in rotors:
+            i = rotor.backward_at[rotor.offset][i]
+        return plug[i]
+
+    def scrambler_table(self) -> Table:
+        """
+        Permutation applied by the rotors and reflector at the current rotor
+        offsets, without the plugboard and without stepping.
+        """
+        rotors = self.rotors
+        reflect = self.reflector.table
+        table = []
+        for i in range(26):
+            for rotor in reversed(rotors):
+                i = rotor.forward_at[rotor.offset][i]
+            i = reflect[i]
+            for rotor in rotors:
+                i = rotor.backward_at[rotor.offset][i]
+            table.append(i)
+        return tuple(table)
+
     def encode_letter(self, c: str) -> str:
         if c not in string.ascii_uppercase:
             return c
 
+        if not logger.isEnabledFor(logging.DEBUG):
+            return ALPHABET[self.encode_index(LETTER_INDEX[c])]
+
         logger.debug(f"\nEncoding letter: {c}")
 
         # Step the rotors (right to left)
@@ -118,13 +357,111 @@ class EnigmaMachine:
         logger.debug(f"  Final encoded letter: {c}")
         return c
 
+    def set_rings(self, rings: str):
+        """Set the ring settings, left to right, e.g. 'AJX'."""
+        for rotor, ring in zip(self.rotors, rings):
+            rotor.ring = ring
+
     def reset_rotors(self):
         for rotor, initial_pos in zip(self.rotors, self._initial_positions):
             rotor.position = initial_pos
 
+    def set_positions(self, positions: str):
+        """Move the rotors to new start positions in place (also the reset point)."""
+        for k, (rotor, pos) in enumerate(zip(self.rotors, positions)):
+            rotor.offset = LETTER_INDEX[pos]
+            self._initial_positions[k] = pos
+
+    def walk_positions(self, positions):
+        """
+        Put the machine at each start position in turn, in place, and yield it.
+        This lets a sweep reuse one machine for the whole keyspace instead of
+        building rotors, a plugboard and a machine per position. Positions
+        are strings such as 'AQZ', normally in odometer order.
+        """
+        rotors = self.rotors
+        initial = self._initial_positions
+        for pos in positions:
+            for k, letter in enumerate(pos):
+                rotors[k].offset = LETTER_INDEX[letter]
+                initial[k] = letter
+            yield pos
+
+    def advance(self, steps: int):
+        """
+        Move the rotors forward by `steps` key presses without encoding,
+        computing the new offsets arithmetically instead of stepping.
+        """
+        for rotor in reversed(self.rotors[-3:]):
+            if not steps:
+                break
+            start = rotor.offset
+            rotor.offset = (start + steps) % 26
+            steps = turnover_total(steps, start, rotor.notch_offsets)
+
+    def seek(self, offset: int):
+        """
+        Put the rotors where they are after `offset` key presses from the
+        start positions, as if the first `offset` letters had been encoded.
+        Only letters press keys, so offset counts letters, not characters.
+        """
+        self.reset_rotors()
+        self.advance(offset)
+
+    def snapshot(self) -> Tuple[Tuple[int, ...], Tuple[str, ...]]:
+        """Current rotor offsets and start positions, for restore()."""
+        return tuple(rotor.offset for rotor in self.rotors), tuple(self._initial_positions)
+
+    def restore(self, state: Tuple[Tuple[int, ...], Tuple[str, ...]]):
+        offsets, initial_positions = state
+        for rotor, offset in zip(self.rotors, offsets):
+            rotor.offset = offset
+        self._initial_positions[:] = initial_positions
+
     def encode_message(self, message: str) -> str:
         message = message.upper().replace(' ', '')
-        return ''.join(self.encode_letter(c) for c in message)
+        if logger.isEnabledFor(logging.DEBUG):
+            return ''.join(self.encode_letter(c) for c in message)
+        encode_index = self.encode_index
+        out = []
+        for c in message:
+            i = LETTER_INDEX.get(c)
+            out.append(c if i is None else ALPHABET[encode_index(i)])
+        return ''.join(out)
+
+    def encode_bytes(self, data) -> bytes:
+        """
+        encode_message for ASCII data given as bytes, bytearray or memoryview.
+        Letters are upper-cased and encoded, spaces are dropped and every
+        other byte is copied through. The rotors keep their state afterwards,
+        so a long input can be encoded chunk by chunk.
+        """
+        if logger.isEnabledFor(logging.DEBUG):
+            return self.encode_message(bytes(data).decode('latin-1')).encode('latin-1')
+        encode_index = self.encode_index
+        codes = BYTE_CODES
+        out = bytearray()
+        append = out.append
+        for b in data:
+            i = codes[b]
+            if i >= 0:
+                append(65 + encode_index(i))
+            elif i == BYTE_PASS:
+                append(b)
+        return bytes(out)
+
+    def encode_stream(self, chunks):
+        """
+        Encode an iterable of chunks (str, or bytes-like for encode_bytes) and
+        yield each encoded chunk as soon as it is done. The rotor state
+        carries over from one chunk to the next, so the output is the same as
+        encoding the whole input at once, and memory stays at one chunk.
+        """
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                yield self.encode_message(chunk)
+            else:
+                yield self.encode_bytes(chunk)
 
 
 # Example rotors and reflector
@@ -137,10 +474,41 @@ ROTOR_WIRINGS = {
 }
 
 REFLECTOR_B = 'YRUHQSLDPXNGOKMIEBFZCWVJAT'
+REFLECTOR_C = 'FVPJIAOYEDRZXWGCTKUQSBNMHL'
+
+# Naval M4: the extra rotors with two notches, the non-stepping Greek
+# rotors that sit left of the three stepping ones, and the thin reflectors
+# that leave room for them. Beta at A with thin B is the same as reflector
+# B, and Gamma at A with thin C the same as reflector C.
+NAVAL_ROTOR_WIRINGS = {
+    'VI':   ('JPGVOUMFYQBENHZRDKASXLICTW', 'ZM'),
+    'VII':  ('NZJHGRCXMYSWBOUFAIVLPEKQDT', 'ZM'),
+    'VIII': ('FKQHTLXOCBJSPDZRAMEWNIUYGV', 'ZM'),
+}
+M4_ROTOR_WIRINGS = {**ROTOR_WIRINGS, **NAVAL_ROTOR_WIRINGS}
+
+GREEK_WIRINGS = {
+    'Beta':  ('LEYJVCNIXWPBQMDRTAKZGFUHOS', ''),
+    'Gamma': ('FSOKANUERHMBTIYCWLQPZXVGJD', ''),
+}
+
+THIN_REFLECTORS = {
+    'B': 'ENKQAUYWJICOPBLMDXZVFTHRGS',
+    'C': 'RDOBJNTKVEHMLFCWZAXGYIPSUQ',
+}
+
+
+def rotor_spec(rotor_id: str) -> Tuple[str, str]:
+    """(wiring, notches) of any rotor: I-VIII, Beta or Gamma."""
+    if rotor_id in GREEK_WIRINGS:
+        return GREEK_WIRINGS[rotor_id]
+    if rotor_id in NAVAL_ROTOR_WIRINGS:
+        return NAVAL_ROTOR_WIRINGS[rotor_id]
+    return ROTOR_WIRINGS[rotor_id]
 
 
 def main():
-    logging.getLogger().setLevel(logging.DEBUG)
+    logging.basicConfig(level=logging.DEBUG)
 
     # Setup example
     rotors = [
@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Live counters and timers for the crackers.
+#
+# The crackers take an optional `metrics=Metrics(...)`. They report at
+# their hot points: the "candidates" counter at each candidate start, the
+# "decrypt" and "score" timers around decryption and scoring, and the
+# "matches" counter for every match. With metrics=None nothing is wrapped,
+# so the hot loops run exactly as before.
+#
+# Worker processes keep their own Metrics and send the delta back with each
+# task result (see take/merge); the parent aggregates them, tracks
+# per-worker candidate counts and exports a report every `interval` seconds,
+# as JSON lines (appended) or in Prometheus text format (rewritten in place,
+# e.g. for the node_exporter textfile collector).
+
+
+class Metrics:
+    def __init__(self, export_path=None, export_format="jsonl", interval=10.0):
+        if export_format not in ("jsonl", "prometheus"):
+            raise ValueError(f"Unknown export format: {export_format}")
+        self.export_path = export_path
+        self.export_format = export_format
+        self.interval = interval
+        self.counters = {}
+        self.timers = {}
+        self.gauges = {}
+        self.workers = {}
+        self.started = time.monotonic()
+        self._last_export = self.started
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, name, seconds, calls=1):
+        total = self.timers.setdefault(name, [0.0, 0])
+        total[0] += seconds
+        total[1] += calls
+
+    def set(self, name, value):
+        self.gauges[name] = value
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def timed(self, name, fn, count=None):
+        """
+        Wrap fn so that every call adds to timer `name` (and to counter
+        `count`, if given). The hot loops only wrap their calls when metrics
+        are enabled.
+        """
+        perf_counter = time.perf_counter
+        timer = self.timers.setdefault(name, [0.0, 0])
+        counters = self.counters
+
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timer[0] += perf_counter() - start
+                timer[1] += 1
+                if count is not None:
+                    counters[count] = counters.get(count, 0) + 1
+
+        return wrapper
+
+    def take(self):
+        """Return the counters and timers gathered so far and start again from zero."""
+        delta = {
+            "counters": dict(self.counters),
+            "timers": {name: list(total) for name, total in self.timers.items()},
+        }
+        self.counters.clear()
+        # timed() wrappers hold on to their timer lists, so reset in place
+        for total in self.timers.values():
+            total[0], total[1] = 0.0, 0
+        return delta
+
+    def merge(self, delta, worker=None):
+        """Add a delta from take(), credited to `worker` if given."""
+        if delta is None:
+            return
+        for name, n in delta["counters"].items():
+            self.count(name, n)
+        for name, (seconds, calls) in delta["timers"].items():
+            self.add_time(name, seconds, calls)
+        if worker is not None:
+            self.workers[worker] = self.workers.get(worker, 0) + delta["counters"].get("candidates", 0)
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        candidates = self.counters.get("candidates", 0)
+        rate = candidates / elapsed if elapsed > 0 else 0.0
+        report = {
+            "time": time.time(),
+            "elapsed": elapsed,
+            "counters": dict(self.counters),
+            "timers": {
+                name: {"seconds": seconds, "calls": calls} for name, (seconds, calls) in self.timers.items()
+            },
+            "gauges": dict(self.gauges),
+            "candidates_per_second": rate,
+            "workers": {
+                str(worker): {"candidates": n, "candidates_per_second": n / elapsed if elapsed > 0 else 0.0}
+                for worker, n in self.workers.items()
+            },
+        }
+        keyspace = self.gauges.get("keyspace")
+        if keyspace and rate > 0:
+            report["eta_seconds"] = max(0.0, keyspace - candidates) / rate
+        return report
+
+    def maybe_export(self):
+        """Export if `interval` seconds have passed since the last export."""
+        if self.export_path is not None and time.monotonic() - self._last_export >= self.interval:
+            self.export()
+
+    def export(self):
+        if self.export_path is None:
+            return
+        self._last_export = time.monotonic()
+        report = self.report()
+        if self.export_format == "jsonl":
+            with open(self.export_path, "a") as f:
+                f.write(json.dumps(report) + "\n")
+        else:
+            tmp_path = f"{self.export_path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(prometheus_text(report))
+            os.replace(tmp_path, self.export_path)
+
+
+def prometheus_text(report):
+    lines = []
+
+    def metric(name, kind, samples):
+        lines.append(f"# TYPE enigma_{name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+            lines.append(f"enigma_{name}{{{label_text}}} {value}" if label_text else f"enigma_{name} {value}")
+
+    for name, value in sorted(report["counters"].items()):
+        metric(f"{name}_total", "counter", [({}, value)])
+    timers = sorted(report["timers"].items())
+    metric("time_seconds_total", "counter", [({"phase": name}, t["seconds"]) for name, t in timers])
+    metric("calls_total", "counter", [({"phase": name}, t["calls"]) for name, t in timers])
+    for name, value in sorted(report["gauges"].items()):
+        metric(name, "gauge", [({}, value)])
+    metric("candidates_per_second", "gauge", [({}, report["candidates_per_second"])])
+    metric(
+        "worker_candidates_total",
+        "counter",
+        [({"worker": worker}, w["candidates"]) for worker, w in sorted(report["workers"].items())],
+    )
+    if "eta_seconds" in report:
+        metric("eta_seconds", "gauge", [({}, report["eta_seconds"])])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,52 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, wait
+from itertools import islice
+
+logger = logging.getLogger(__name__)
+
+# Helpers for feeding process pools from large keyspaces without creating
+# every future up front.
+
+
+def run_bounded(executor, fn, tasks, max_in_flight, stats=None):
+    """
+    Submit fn(*task) for each task with at most `max_in_flight` futures
+    outstanding, and yield (task, result) pairs as they complete. `tasks`
+    may be a lazy iterator, so memory stays flat however large the keyspace
+    is. Closing the generator early cancels work that has not started.
+    If `stats` is a dict, its "in_flight" entry tracks the queue depth.
+    """
+    tasks = iter(tasks)
+    pending = {}
+
+    def fill():
+        for task in islice(tasks, max_in_flight - len(pending)):
+            pending[executor.submit(fn, *task)] = task
+        if stats is not None:
+            stats["in_flight"] = len(pending)
+
+    try:
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = pending.pop(future)
+                yield task, future.result()
+            fill()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def chunk_ranges(total, size):
+    """Split range(total) into (start, stop) pairs of at most `size` items."""
+    return [(start, min(start + size, total)) for start in range(0, total, size)]
+
+
+def shard_size_for(total, workers, tasks_per_worker=16, max_size=2048):
+    """
+    Pick a task size that gives every worker many small tasks, so idle
+    workers keep pulling work and a cancellation takes effect quickly.
+    """
+    size = -(-total // (workers * tasks_per_worker))
+    return max(1, min(max_size, size))
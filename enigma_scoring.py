@@ -0,0 +1,191 @@
+import logging
+import math
+from functools import lru_cache
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Fitness functions for plaintext candidates.
+#
+# Every scorer works on texts given as uint8 arrays of ASCII codes (what
+# enigma_cracker_plugboard.PlugboardDecryption produces) and offers:
+#   - score(text): fitness of one text, higher is more English-like
+#   - rescore(old_text, new_text, changed, score): fitness of new_text, which
+#     differs from old_text (whose fitness was `score`) only at `changed`
+#   - score_batch(texts): fitness of every row of a 2-D array at once
+# Anything that is not A-Z is ignored.
+
+# Relative frequency of each letter in English text, A-Z.
+ENGLISH_LETTER_FREQUENCIES = (
+    0.08167, 0.01492, 0.02782, 0.04253, 0.12702, 0.02228, 0.02015,
+    0.06094, 0.06966, 0.00153, 0.00772, 0.04025, 0.02406, 0.06749,
+    0.07507, 0.01929, 0.00095, 0.05987, 0.06327, 0.09056, 0.02758,
+    0.00978, 0.02360, 0.00150, 0.01974, 0.00074,
+)
+
+
+def letter_codes(text):
+    """Letter indices 0-25 as int64, with -1 for anything else."""
+    codes = np.asarray(text).astype(np.int64) - 65
+    codes[(codes < 0) | (codes >= 26)] = -1
+    return codes
+
+
+class NgramScorer:
+    """
+    Sum of log10 probabilities of every n-gram in the text, looked up in a
+    flat float32 table of 26**n entries (26**4 = 457k entries for quadgrams).
+    """
+
+    N = None
+
+    def __init__(self, table, n=None):
+        self.n = n = n if n is not None else self.N
+        self.table = np.asarray(table, dtype=np.float32).reshape(26 ** n)
+
+    @classmethod
+    def from_counts(cls, counts, n):
+        """Build a table from a mapping of n-gram strings to counts."""
+        total = sum(counts.values())
+        # Unseen n-grams get a probability a little below one occurrence
+        table = np.full(26 ** n, math.log10(0.01 / total), dtype=np.float32)
+        for gram, count in counts.items():
+            index = 0
+            for c in gram:
+                index = index * 26 + ord(c) - 65
+            table[index] = math.log10(count / total)
+        return cls(table, n)
+
+    @classmethod
+    def from_corpus(cls, corpus, n):
+        """Count the n-grams of a reference text (non-letters are dropped)."""
+        letters = ''.join(c for c in corpus.upper() if 'A' <= c <= 'Z')
+        counts = {}
+        for i in range(len(letters) - n + 1):
+            gram = letters[i:i + n]
+            counts[gram] = counts.get(gram, 0) + 1
+        return cls.from_counts(counts, n)
+
+    def _window_sum(self, codes, starts):
+        n = self.n
+        index = np.zeros(len(starts), dtype=np.int64)
+        valid = np.ones(len(starts), dtype=bool)
+        for k in range(n):
+            c = codes[starts + k]
+            valid &= c >= 0
+            index = index * 26 + c
+        return float(self.table[index[valid]].sum(dtype=np.float64))
+
+    def score(self, text):
+        codes = letter_codes(text)
+        return self._window_sum(codes, np.arange(max(0, len(codes) - self.n + 1)))
+
+    def rescore(self, old_text, new_text, changed, score):
+        if len(changed) == 0:
+            return score
+        n = self.n
+        last = len(new_text) - n
+        # Only the windows that overlap a changed letter can change
+        starts = (np.asarray(changed)[:, None] - np.arange(n)[None, :]).ravel()
+        starts = np.unique(starts[(starts >= 0) & (starts <= last)])
+        return (
+            score
+            + self._window_sum(letter_codes(new_text), starts)
+            - self._window_sum(letter_codes(old_text), starts)
+        )
+
+    def score_batch(self, texts):
+        codes = letter_codes(texts)
+        n = self.n
+        width = codes.shape[1] - n + 1
+        if width <= 0:
+            return np.zeros(codes.shape[0])
+        index = np.zeros((codes.shape[0], width), dtype=np.int64)
+        valid = np.ones((codes.shape[0], width), dtype=bool)
+        for k in range(n):
+            c = codes[:, k:k + width]
+            valid &= c >= 0
+            index = index * 26 + c
+        return np.where(valid, self.table[np.where(valid, index, 0)], 0).sum(axis=1, dtype=np.float64)
+
+
+class UnigramScorer(NgramScorer):
+    """Single-letter log probabilities, defaulting to English frequencies."""
+
+    N = 1
+
+    def __init__(self, table=None, n=None):
+        if table is None:
+            table = np.log10(np.array(ENGLISH_LETTER_FREQUENCIES))
+        super().__init__(table, n)
+
+
+class BigramScorer(NgramScorer):
+    N = 2
+
+
+class TrigramScorer(NgramScorer):
+    N = 3
+
+
+class QuadgramScorer(NgramScorer):
+    N = 4
+
+
+class IoCScorer:
+    """
+    Index of coincidence of the letters, scaled by `weight` so that it sits on
+    a range comparable to the annealing temperature. English is about 0.066,
+    random text about 0.038.
+    """
+
+    def __init__(self, weight=1000.0):
+        self.weight = weight
+
+    def score(self, text):
+        return float(self.score_batch(np.asarray(text)[None, :])[0])
+
+    def rescore(self, old_text, new_text, changed, score):
+        # Letter counts are a C-level pass, cheaper than tracking them in Python
+        return self.score(new_text) if len(changed) else score
+
+    def score_batch(self, texts):
+        codes = letter_codes(texts)
+        rows = np.repeat(np.arange(codes.shape[0]), codes.shape[1])
+        flat = codes.ravel()
+        keep = flat >= 0
+        counts = np.bincount(
+            rows[keep] * 26 + flat[keep], minlength=codes.shape[0] * 26
+        ).reshape(codes.shape[0], 26)
+        total = counts.sum(axis=1)
+        pairs = (counts * (counts - 1)).sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ioc = np.where(total > 1, pairs / (total * (total - 1)), 0.0)
+        return self.weight * ioc
+
+
+SCORERS_BY_LENGTH = {1: UnigramScorer, 2: BigramScorer, 3: TrigramScorer, 4: QuadgramScorer}
+
+
+@lru_cache(maxsize=None)
+def load_ngram_scorer(path):
+    """
+    Load an n-gram table once per process from a text file with one
+    "NGRAM COUNT" pair per line (e.g. "TION 13168375"), or from a .npy file
+    holding a 26**n float32 table of log probabilities.
+    """
+    if str(path).endswith(".npy"):
+        table = np.load(path, mmap_mode="r")
+        n = round(math.log(table.size, 26))
+        return SCORERS_BY_LENGTH[n](np.asarray(table))
+
+    counts = {}
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 2:
+                counts[parts[0].upper()] = int(parts[1])
+    n = len(next(iter(counts)))
+    logger.info(f"Loaded {len(counts)} {n}-grams from {path}")
+    return SCORERS_BY_LENGTH[n].from_counts(counts, n)
@@ -0,0 +1,366 @@
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from enigma_machine_sim import M4_ROTOR_WIRINGS, ROTOR_WIRINGS, rotor_tables
+from enigma_stream import REFLECTORS, machine_from_key, parse_plugboard
+
+logger = logging.getLogger(__name__)
+
+# Long-running local job server.
+#
+# One process pool is started with the server and kept warm: every worker
+# imports the NumPy modules and builds the rotor tables once, in the pool
+# initializer, so a request only pays for its own work. Jobs are split into
+# tasks (a crack job into one task per rotor order, a batch into chunks of
+# messages) and a dispatcher thread feeds the pool from the queued jobs,
+# lowest `priority` value first and oldest first within a priority, keeping
+# at most `slots` tasks in the pool. A small urgent job therefore starts as
+# soon as one task slot frees up, even behind a long crack. Cancelling a
+# job drops its queued tasks; tasks already in the pool run to the end and
+# their results are discarded.
+#
+# HTTP/JSON API (localhost by default):
+#   POST   /jobs          {"kind": "encode" | "batch-encode" | "crack", "priority": 0, ...}
+#                         -> 202 {"id": ...}
+#   GET    /jobs          -> statuses of all jobs
+#   GET    /jobs/<id>     -> status, progress and (when finished) the result;
+#                            ?wait=SECONDS blocks until the job ends or times out
+#   DELETE /jobs/<id>     -> cancel
+#
+# Job parameters:
+#   encode:       rotors, positions, message, and optionally plugboard
+#                 ("AB CD" or a list of pairs), rings, reflector
+#   batch-encode: keys (a list of [rotors, positions, plugboard, rings?]) and
+#                 messages
+#   crack:        ciphertext, crib, and optionally plugboard, rotor_orders
+
+DEFAULT_PORT = 8765
+BATCH_CHUNK = 1000
+FINISHED_JOBS_KEPT = 1000
+
+
+def warm_worker():
+    """Pool initializer: import the heavy modules and build every rotor table once."""
+    from enigma_batch import stacked_rotor_arrays
+    from enigma_crib_cracker_np import rotor_arrays
+
+    for rotor_id, (wiring, _) in M4_ROTOR_WIRINGS.items():
+        rotor_tables(wiring)
+        rotor_arrays(rotor_id)
+    stacked_rotor_arrays()
+
+
+def ping():
+    return os.getpid()
+
+
+def encode_task(rotors, positions, message, plugboard=None, rings=None, reflector=None):
+    reflector = REFLECTORS[reflector or ("B-thin" if len(rotors) == 4 else "B")]
+    machine = machine_from_key(rotors, positions, parse_plugboard(plugboard or []), rings, reflector)
+    return machine.encode_message(message)
+
+
+def batch_task(keys, messages):
+    from enigma_batch import encode_batch
+
+    keys = [(tuple(key[0]), key[1], parse_plugboard(key[2] or []), *key[3:]) for key in keys]
+    return encode_batch(keys, messages)
+
+
+def crack_task(rotor_ids, ciphertext, crib, plugboard=None):
+    from enigma_crib_cracker_np import crack_rotor_order_np
+
+    matches = crack_rotor_order_np(tuple(rotor_ids), ciphertext, crib, parse_plugboard(plugboard or []))
+    return [{"rotors": list(ids), "positions": pos, "decoded": decoded} for (ids, pos), decoded in matches]
+
+
+def first_result(results):
+    return results[0]
+
+
+def concatenate(results):
+    return [item for result in results for item in result]
+
+
+class Job:
+    QUEUED, RUNNING, FINISHED, FAILED, CANCELLED = "queued", "running", "finished", "failed", "cancelled"
+
+    def __init__(self, job_id, kind, priority, tasks, combine):
+        self.id = job_id
+        self.kind = kind
+        self.priority = priority
+        self.tasks = tasks
+        self.combine = combine
+        self.results = [None] * len(tasks)
+        self.next_task = 0
+        self.done = 0
+        self.running = 0
+        self.status = self.QUEUED
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.ended = threading.Event()
+
+    def info(self, with_result=True):
+        info = {
+            "id": self.id,
+            "kind": self.kind,
+            "priority": self.priority,
+            "status": self.status,
+            "progress": self.done / len(self.tasks) if self.tasks else 1.0,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+        if self.error is not None:
+            info["error"] = self.error
+        if with_result and self.status == self.FINISHED:
+            info["result"] = self.result
+        return info
+
+
+class JobServer:
+    def __init__(self, workers=None, slots=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.slots = slots or 2 * self.workers
+        self.executor = ProcessPoolExecutor(self.workers, initializer=warm_worker)
+        self.jobs = {}
+        self._queue = []
+        self._ids = itertools.count(1)
+        self._in_flight = 0
+        self._closed = False
+        self._lock = threading.Condition()
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+
+    def start(self):
+        # Start every worker now so the first request finds them warm
+        for future in [self.executor.submit(ping) for _ in range(self.workers)]:
+            future.result()
+        self._dispatcher.start()
+        logger.info(f"Job server ready with {self.workers} warm workers")
+        return self
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, request):
+        """Queue a job from a request dict and return its id. Raises ValueError on bad input."""
+        kind = request.get("kind")
+        priority = int(request.get("priority", 0))
+        try:
+            if kind == "encode":
+                tasks = [(encode_task, (
+                    request["rotors"], request["positions"], request["message"],
+                    request.get("plugboard"), request.get("rings"), request.get("reflector"),
+                ))]
+                combine = first_result
+            elif kind == "batch-encode":
+                keys, messages = request["keys"], request["messages"]
+                if len(keys) != len(messages):
+                    raise ValueError("Need exactly one key per message")
+                tasks = [
+                    (batch_task, (keys[k:k + BATCH_CHUNK], messages[k:k + BATCH_CHUNK]))
+                    for k in range(0, len(messages), BATCH_CHUNK)
+                ]
+                combine = concatenate
+            elif kind == "crack":
+                ciphertext = request["ciphertext"].upper()
+                crib = request["crib"].upper()
+                rotor_orders = request.get("rotor_orders") or list(itertools.permutations(ROTOR_WIRINGS, 3))
+                plugboard = request.get("plugboard")
+                parse_plugboard(plugboard or [])
+                tasks = [(crack_task, (list(ids), ciphertext, crib, plugboard)) for ids in rotor_orders]
+                combine = concatenate
+            else:
+                raise ValueError(f"Unknown job kind: {kind!r}")
+        except KeyError as e:
+            raise ValueError(f"Missing parameter for {kind} job: {e.args[0]}")
+
+        with self._lock:
+            job = Job(next(self._ids), kind, priority, tasks, combine)
+            self.jobs[job.id] = job
+            if tasks:
+                heapq.heappush(self._queue, (priority, job.id))
+            else:
+                # Nothing to dispatch (e.g. an empty batch), so it is done already
+                job.started = time.time()
+                job.result = combine([])
+                self._end(job, Job.FINISHED)
+            self._forget_old_jobs()
+            self._lock.notify_all()
+        return job.id
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self.jobs[job_id]
+            if job.status in (Job.QUEUED, Job.RUNNING):
+                self._end(job, Job.CANCELLED)
+            return job.info()
+
+    def info(self, job_id, wait=None):
+        job = self.jobs[job_id]
+        if wait:
+            job.ended.wait(wait)
+        with self._lock:
+            return job.info()
+
+    def list_jobs(self):
+        with self._lock:
+            return [job.info(with_result=False) for job in self.jobs.values()]
+
+    def _forget_old_jobs(self):
+        ended = [job for job in self.jobs.values() if job.ended.is_set()]
+        for job in ended[:max(0, len(ended) - FINISHED_JOBS_KEPT)]:
+            del self.jobs[job.id]
+
+    def _end(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+        job.ended.set()
+
+    def _next_task(self):
+        """Highest-priority job with tasks left, dropping ended jobs from the queue."""
+        while self._queue:
+            _, job_id = self._queue[0]
+            job = self.jobs.get(job_id)
+            if job is None or job.ended.is_set() or job.next_task >= len(job.tasks):
+                heapq.heappop(self._queue)
+                continue
+            return job
+        return None
+
+    def _dispatch(self):
+        with self._lock:
+            while not self._closed:
+                job = self._next_task() if self._in_flight < self.slots else None
+                if job is None:
+                    self._lock.wait()
+                    continue
+                index = job.next_task
+                job.next_task += 1
+                if job.status == Job.QUEUED:
+                    job.status = Job.RUNNING
+                    job.started = time.time()
+                fn, args = job.tasks[index]
+                self._in_flight += 1
+                job.running += 1
+                future = self.executor.submit(fn, *args)
+                future.add_done_callback(lambda f, job=job, index=index: self._task_done(job, index, f))
+
+    def _task_done(self, job, index, future):
+        with self._lock:
+            self._in_flight -= 1
+            job.running -= 1
+            self._lock.notify_all()
+            if job.ended.is_set():
+                return
+            if future.cancelled():
+                self._end(job, Job.CANCELLED)
+                return
+            if future.exception() is not None:
+                logger.error(f"Job {job.id} failed: {future.exception()!r}")
+                self._end(job, Job.FAILED, repr(future.exception()))
+                return
+            job.results[index] = future.result()
+            job.done += 1
+            if job.done == len(job.tasks):
+                job.result = job.combine(job.results)
+                job.results = None
+                self._end(job, Job.FINISHED)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    server_version = "EnigmaJobServer/1"
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def job_id(self, path):
+        parts = path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "jobs" and parts[1].isdigit():
+            return int(parts[1])
+        return None
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != "/jobs":
+            return self.send_json(404, {"error": "not found"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            job_id = self.server.jobs.submit(request)
+        except (ValueError, TypeError, AttributeError) as e:
+            return self.send_json(400, {"error": str(e)})
+        self.send_json(202, {"id": job_id})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.rstrip("/") == "/jobs":
+            return self.send_json(200, self.server.jobs.list_jobs())
+        job_id = self.job_id(url.path)
+        if job_id is None or job_id not in self.server.jobs.jobs:
+            return self.send_json(404, {"error": "no such job"})
+        wait = parse_qs(url.query).get("wait")
+        self.send_json(200, self.server.jobs.info(job_id, float(wait[0]) if wait else None))
+
+    def do_DELETE(self):
+        job_id = self.job_id(urlparse(self.path).path)
+        if job_id is None or job_id not in self.server.jobs.jobs:
+            return self.send_json(404, {"error": "no such job"})
+        self.send_json(200, self.server.jobs.cancel(job_id))
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def make_http_server(jobs, host="127.0.0.1", port=DEFAULT_PORT):
+    """HTTP front end for a started JobServer; call serve_forever() on it."""
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    server.jobs = jobs
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local Enigma job server with a warm worker pool")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="pool processes (default: CPU count)")
+    parser.add_argument("--slots", type=int, default=None, help="tasks in the pool at once (default: 2 per worker)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    jobs = JobServer(args.workers, args.slots).start()
+    server = make_http_server(jobs, args.host, args.port)
+    logger.info(f"Listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        jobs.close()
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import argparse
+import logging
+import sys
+
+from enigma_machine_sim import (
+    GREEK_WIRINGS,
+    M4_ROTOR_WIRINGS,
+    REFLECTOR_B,
+    REFLECTOR_C,
+    THIN_REFLECTORS,
+    EnigmaMachine,
+    Plugboard,
+    Reflector,
+    Rotor,
+    rotor_spec,
+)
+
+logger = logging.getLogger(__name__)
+
+# Chunked encryption of files and streams. The input is read into one
+# reusable buffer, so memory stays at `chunk_size` however large the file is,
+# and the machine keeps its rotor state between chunks, so the output is
+# exactly what encode_message would give for the whole input. Enigma is its
+# own inverse: decrypting is encrypting again with the same key.
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+REFLECTORS = {
+    "B": REFLECTOR_B,
+    "C": REFLECTOR_C,
+    "B-thin": THIN_REFLECTORS["B"],
+    "C-thin": THIN_REFLECTORS["C"],
+}
+
+
+def machine_from_key(rotor_ids, positions, plugboard_pairs=None, rings=None, reflector=REFLECTOR_B):
+    """
+    Three rotors from I-VIII, or four for an M4 with a Greek rotor first and
+    a thin reflector. `reflector` is a wiring string.
+    """
+    rings = rings or "A" * len(rotor_ids)
+    rotors = [
+        Rotor(*rotor_spec(rotor_id), position=pos, ring=ring)
+        for rotor_id, pos, ring in zip(rotor_ids, positions, rings)
+    ]
+    return EnigmaMachine(rotors, Reflector(reflector), Plugboard(plugboard_pairs or {}))
+
+
+def parse_plugboard(pairs):
+    """Turn cable specs such as ["AB", "CD"] (or "AB CD") into a plugboard dict."""
+    if isinstance(pairs, str):
+        pairs = pairs.split()
+    plugboard = {}
+    for pair in pairs:
+        pair = pair.upper()
+        if len(pair) != 2 or not pair.isalpha() or pair[0] == pair[1]:
+            raise ValueError(f"Bad plugboard pair: {pair!r}")
+        if pair[0] in plugboard or pair[1] in plugboard:
+            raise ValueError(f"Letter plugged twice: {pair!r}")
+        plugboard[pair[0]] = pair[1]
+        plugboard[pair[1]] = pair[0]
+    return plugboard
+
+
+def read_chunks(src, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield memoryviews of successive chunks of a binary file object, all
+    backed by one buffer: each view is only valid until the next one.
+    """
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    while True:
+        n = src.readinto(buffer)
+        if not n:
+            return
+        yield view[:n]
+
+
+def keystream_encoder(machine):
+    """encode_bytes of a KeystreamTable for `machine` (imports NumPy on first use)."""
+    from enigma_keystream import KeystreamTable
+
+    return KeystreamTable(machine).encode_bytes
+
+
+def encode_file(machine, src, dst, chunk_size=DEFAULT_CHUNK_SIZE, encode_chunk=None):
+    """
+    Encode binary file object `src` into `dst` chunk by chunk and return the
+    number of bytes read. `encode_chunk` defaults to machine.encode_bytes.
+    """
+    encode_chunk = encode_chunk or machine.encode_bytes
+    total = 0
+    for chunk in read_chunks(src, chunk_size):
+        total += len(chunk)
+        dst.write(encode_chunk(chunk))
+    return total
+
+
+def add_key_arguments(parser):
+    """Add --rotors, --positions, --rings, --reflector and --plugboard to an argparse parser."""
+    parser.add_argument(
+        "--rotors", nargs="+", default=["I", "II", "III"], choices=sorted(M4_ROTOR_WIRINGS) + sorted(GREEK_WIRINGS),
+        help="three rotors, or a Greek rotor and three for an M4 (e.g. Beta II IV I)",
+    )
+    parser.add_argument("--positions", default="AAA", help="start positions, e.g. AQZ")
+    parser.add_argument("--rings", default=None, help="ring settings, e.g. AJX (default all A)")
+    parser.add_argument("--reflector", default=None, choices=sorted(REFLECTORS), help="default B, or B-thin for an M4")
+    parser.add_argument("--plugboard", nargs="*", default=[], help="cables, e.g. AB CD")
+
+
+def machine_from_args(parser, args):
+    """Build the machine for arguments from add_key_arguments, or exit through parser.error."""
+    count = len(args.rotors)
+    if count not in (3, 4):
+        parser.error("--rotors takes three rotors, or four for an M4")
+    if any(rotor_id in GREEK_WIRINGS for rotor_id in args.rotors[count - 3:]) or (
+        count == 4 and args.rotors[0] not in GREEK_WIRINGS
+    ):
+        parser.error("Greek rotors (Beta, Gamma) only go in the fourth, leftmost slot")
+    positions = args.positions.upper()
+    rings = (args.rings or "A" * count).upper()
+    for name, letters in (("--positions", positions), ("--rings", rings)):
+        if len(letters) != count or not all(c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ" for c in letters):
+            parser.error(f"{name} needs one letter per rotor")
+    reflector = REFLECTORS[args.reflector or ("B-thin" if count == 4 else "B")]
+    try:
+        plugboard = parse_plugboard(args.plugboard)
+    except ValueError as e:
+        parser.error(str(e))
+    return machine_from_key(args.rotors, positions, plugboard, rings, reflector)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Encrypt or decrypt a file with the Enigma machine (the same operation)"
+    )
+    parser.add_argument("input", nargs="?", default="-", help="input file ('-' for stdin)")
+    parser.add_argument("output", nargs="?", default="-", help="output file ('-' for stdout)")
+    add_key_arguments(parser)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument(
+        "--no-table", action="store_true", help="encode letter by letter instead of through a keystream table"
+    )
+    args = parser.parse_args(argv)
+    machine = machine_from_args(parser, args)
+
+    src = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    dst = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        encode_chunk = None if args.no_table else keystream_encoder(machine)
+        total = encode_file(machine, src, dst, args.chunk_size, encode_chunk)
+    finally:
+        if src is not sys.stdin.buffer:
+            src.close()
+        if dst is not sys.stdout.buffer:
+            dst.close()
+    logger.info(f"Encoded {total} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -1,4 +1,9 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import streamlit as st
+from enigma_jobs import CrackJob
 from enigma_machine_sim import (
     REFLECTOR_B,
     ROTOR_WIRINGS,
@@ -33,6 +38,32 @@ def init_session_keys():
 
 init_session_keys()
 
+
+@st.cache_resource
+def get_executor():
+    # One process pool for the whole server, kept alive across reruns and
+    # sized to the machine; each job caps its own share with max_in_flight
+    return ProcessPoolExecutor(max_workers=os.cpu_count())
+
+
+def get_machine(rotor_ids, positions, plugboard_pairs):
+    """
+    Machine for these settings, built once per session and reused across
+    reruns, so editing the message does not rebuild anything.
+    """
+    machines = st.session_state.setdefault("machines", {})
+    key = (rotor_ids, positions, tuple(sorted(plugboard_pairs.items())))
+    machine = machines.get(key)
+    if machine is None:
+        rotors = [Rotor(*ROTOR_WIRINGS[r], position=p) for r, p in zip(rotor_ids, positions)]
+        machine = EnigmaMachine(rotors, Reflector(REFLECTOR_B), Plugboard(plugboard_pairs))
+        if len(machines) >= 32:
+            machines.clear()
+        machines[key] = machine
+    machine.reset_rotors()
+    return machine
+
+
 main_col1, main_col2 = st.columns([2, 1], gap="large")
 
 with main_col1:
@@ -84,14 +115,7 @@ with main_col1:
     except ValueError:
         st.warning("Invalid plugboard format. Use format like A:B,C:D")
 
-    rotors = [
-        Rotor(*ROTOR_WIRINGS[rotor1], position=pos1),
-        Rotor(*ROTOR_WIRINGS[rotor2], position=pos2),
-        Rotor(*ROTOR_WIRINGS[rotor3], position=pos3),
-    ]
-    reflector = Reflector(REFLECTOR_B)
-    plugboard = Plugboard(plugboard_pairs)
-    machine = EnigmaMachine(rotors, reflector, plugboard)
+    machine = get_machine((rotor1, rotor2, rotor3), (pos1, pos2, pos3), plugboard_pairs)
 
     if st.button("Encode / Decode"):
         output = machine.encode_message(plaintext)
@@ -116,3 +140,55 @@ with main_col2:
     ):
         st.error("No valid message key available. Generate a new key first.")
         st.session_state.update_rotors = False
+
+
+def show_crack_job(job):
+    st.progress(job.progress, text=f"{job.searched:,} / {job.total:,} candidates · {job.rate:,.0f}/s · {job.status}")
+    if job.error is not None:
+        st.error(f"Search failed: {job.error}")
+    matches = job.matches
+    if matches:
+        st.dataframe(
+            [{"Rotors": " ".join(rotor_ids), "Position": pos, "Decoded": decoded} for (rotor_ids, pos), decoded in matches],
+            use_container_width=True,
+        )
+    elif not job.running:
+        st.info("No matches.")
+
+
+def live_crack_job(job):
+    show_crack_job(job)
+    if not job.running:
+        # Rerun the whole page once so the Cancel button turns back into Start
+        st.rerun()
+
+
+st.divider()
+st.markdown("### 🔎 Crib Cracking")
+st.caption("Searches every rotor order and start position in the background, using the plugboard above.")
+
+crack_col1, crack_col2 = st.columns([2, 1], gap="large")
+with crack_col1:
+    crack_ciphertext = st.text_area("Ciphertext:", key="crack_ciphertext")
+    crack_crib = st.text_input("Crib (known plaintext at some offset):", key="crack_crib")
+with crack_col2:
+    crack_workers = st.number_input("Worker processes", 1, os.cpu_count() or 1, os.cpu_count() or 1)
+    job = st.session_state.get("crack_job")
+    if job is not None and job.running:
+        if st.button("Cancel search"):
+            job.cancel()
+    elif st.button("Start search", disabled=not (crack_ciphertext and crack_crib)):
+        st.session_state.crack_job = CrackJob(
+            get_executor(), crack_ciphertext, crack_crib, plugboard_pairs, max_in_flight=int(crack_workers)
+        ).start()
+
+job = st.session_state.get("crack_job")
+if job is not None and not job.running:
+    show_crack_job(job)
+elif job is not None and hasattr(st, "fragment"):
+    # Only this panel reruns while the search is going
+    st.fragment(run_every=1.0)(live_crack_job)(job)
+elif job is not None:
+    show_crack_job(job)
+    time.sleep(1.0)
+    st.rerun()
@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import os
+import tempfile
+
+import numpy as np
+from enigma_crib_cracker_np import rotor_arrays, rotor_offsets
+from enigma_machine_sim import REFLECTOR_B, ROTOR_WIRINGS, wiring_to_table
+
+logger = logging.getLogger(__name__)
+
+# On-disk store of precomputed scrambler permutations.
+#
+# For a rotor order, the plugboard-free scrambler only depends on the three
+# rotor offsets, so all of it fits in a (26, 26, 26, 26) uint8 array indexed
+# [left, middle, right, letter]: 457 KB per order, 27 MB for all 60. Each
+# order is kept in its own file and opened with mmap, so every process on
+# the machine shares one copy of the pages. File names carry a fingerprint
+# of the format version and wirings, so changing a wiring makes the store
+# build fresh files instead of reading stale ones.
+
+STORE_VERSION = 1
+
+DEFAULT_STORE_DIR = os.environ.get(
+    "ENIGMA_TABLE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "enigma_tables")
+)
+
+TABLE_SHAPE = (26, 26, 26, 26)
+
+
+def table_fingerprint(rotor_ids, reflector=REFLECTOR_B):
+    digest = hashlib.sha256(f"v{STORE_VERSION}".encode())
+    for rotor_id in rotor_ids:
+        digest.update(ROTOR_WIRINGS[rotor_id][0].encode())
+    digest.update(reflector.encode())
+    return digest.hexdigest()[:16]
+
+
+def compute_scrambler_table(rotor_ids, reflector=REFLECTOR_B):
+    """Scrambler permutation for every rotor state, shaped (26, 26, 26, 26)."""
+    forward_l, backward_l = rotor_arrays(rotor_ids[0])
+    forward_m, backward_m = rotor_arrays(rotor_ids[1])
+    forward_r, backward_r = rotor_arrays(rotor_ids[2])
+    reflect = np.array(wiring_to_table(reflector), dtype=np.uint8)
+
+    off_l, off_m, off_r, x = np.indices(TABLE_SHAPE, dtype=np.uint8)
+    x = forward_r[off_r, x]
+    x = forward_m[off_m, x]
+    x = forward_l[off_l, x]
+    x = reflect[x]
+    x = backward_l[off_l, x]
+    x = backward_m[off_m, x]
+    return backward_r[off_r, x]
+
+
+def table_scramblers(table, rotor_ids, letter_indices, left, middle, right):
+    """
+    Same result as enigma_crib_cracker_np.scrambler_arrays, but one gather
+    from a stored table instead of seven wiring lookups per cell.
+    """
+    letter_indices = np.asarray(letter_indices, dtype=np.intp)
+    length = int(letter_indices.max()) + 1 if letter_indices.size else 0
+    off_l, off_m, off_r = (
+        offsets[:, letter_indices]
+        for offsets in rotor_offsets(rotor_ids, length, left, middle, right)
+    )
+    return table[off_l, off_m, off_r]
+
+
+class TableStore:
+    def __init__(self, directory=DEFAULT_STORE_DIR, reflector=REFLECTOR_B):
+        self.directory = directory
+        self.reflector = reflector
+        self._open = {}
+
+    def path_for(self, rotor_ids):
+        name = f"{'-'.join(rotor_ids)}.{table_fingerprint(rotor_ids, self.reflector)}.u8"
+        return os.path.join(self.directory, name)
+
+    def build(self, rotor_ids):
+        """Compute the table for one rotor order and write it atomically."""
+        os.makedirs(self.directory, exist_ok=True)
+        table = compute_scrambler_table(rotor_ids, self.reflector)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(table.tobytes())
+            os.replace(tmp_path, self.path_for(rotor_ids))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        logger.info(f"Built scrambler table for {rotor_ids}")
+
+    def build_all(self, rotor_orders):
+        for rotor_ids in rotor_orders:
+            if not os.path.exists(self.path_for(rotor_ids)):
+                self.build(rotor_ids)
+
+    def table(self, rotor_ids):
+        """
+        Read-only memory map of the (26, 26, 26, 26) table for a rotor order,
+        building the file first if it does not exist yet.
+        """
+        rotor_ids = tuple(rotor_ids)
+        table = self._open.get(rotor_ids)
+        if table is None:
+            path = self.path_for(rotor_ids)
+            if not os.path.exists(path):
+                self.build(rotor_ids)
+            table = np.memmap(path, dtype=np.uint8, mode="r", shape=TABLE_SHAPE)
+            self._open[rotor_ids] = table
+        return table
+
+    def stale_files(self):
+        """Table files whose fingerprint no longer matches the current wirings."""
+        if not os.path.isdir(self.directory):
+            return []
+        stale = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".u8"):
+                continue
+            rotor_part, fingerprint, _ = name.rsplit(".", 2)
+            rotor_ids = tuple(rotor_part.split("-"))
+            if (
+                any(rotor_id not in ROTOR_WIRINGS for rotor_id in rotor_ids)
+                or table_fingerprint(rotor_ids, self.reflector) != fingerprint
+            ):
+                stale.append(os.path.join(self.directory, name))
+        return stale
+
+    def prune(self):
+        for path in self.stale_files():
+            os.unlink(path)
@@ -0,0 +1,63 @@
+import pytest
+
+from bench_enigma import bench_encode, compare, main, worker_counts
+
+
+def test_encode_benchmark_reports_rate_and_memory():
+    result = bench_encode(200, repeat=1)
+    assert result["unit"] == "letters/s"
+    assert result["rate"] > 0 and result["peak_kib"] > 0
+
+
+def test_compare_flags_slowdowns_and_memory_growth():
+    baseline = {
+        "encode": {"unit": "letters/s", "rate": 1000.0, "peak_kib": 1000.0},
+        "crack": {"unit": "candidates/s", "rate": 500.0, "peak_kib": 10.0},
+    }
+    steady = {
+        "encode": {"unit": "letters/s", "rate": 900.0, "peak_kib": 1100.0},
+        "crack": {"unit": "candidates/s", "rate": 700.0, "peak_kib": 40.0},
+        "new": {"unit": "letters/s", "rate": 1.0, "peak_kib": 1.0},
+    }
+    assert compare(steady, baseline, threshold=0.2) == []
+
+    regressed = {
+        "encode": {"unit": "letters/s", "rate": 700.0, "peak_kib": 1000.0},
+        "crack": {"unit": "candidates/s", "rate": 500.0, "peak_kib": 500.0},
+    }
+    messages = compare(regressed, baseline, threshold=0.2)
+    assert len(messages) == 2
+    assert messages[0].startswith("encode:") and "peak memory" in messages[1]
+
+
+def test_worker_counts_double_up_to_maximum():
+    assert worker_counts(1) == [1]
+    assert worker_counts(6) == [1, 2, 4, 6]
+    assert worker_counts(8) == [1, 2, 4, 8]
+
+
+def test_missing_baseline_is_an_error(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(SystemExit) as exit_info:
+        main(["--quick", "--baseline", "no_such_baseline.json"])
+    assert exit_info.value.code == 2
+    assert not (tmp_path / "bench_results.json").exists()
+
+
+def test_enigma_encode_starts_within_budget():
+    import subprocess
+    import sys
+
+    from bench_enigma import bench_startup
+    from enigma_cli import STARTUP_BUDGET
+
+    result = bench_startup(repeat=3)
+    assert result["seconds"] < STARTUP_BUDGET
+
+    # The encode path must not pull in NumPy, tqdm or the process pools
+    code = (
+        "import sys, enigma_cli; enigma_cli.main(['encode', 'HELLO']); "
+        "print(sorted(m for m in ('numpy', 'tqdm', 'concurrent.futures', 'multiprocessing') if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.splitlines()[-1] == "[]"
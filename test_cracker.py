@@ -32,6 +32,494 @@ def test_cracker_finds_correct_settings():
     matches = crack_with_crib(ciphertext, crib, plugboard_pairs=plugboard_pairs)
 
     assert any(
-        decoded.startswith(crib) and rotor_ids == match[0][0] and positions == match[0][1]
+        decoded.startswith(crib) and rotor_ids == match[0] and "".join(positions) == match[1]
         for match, decoded in matches
     ), "Cracker failed to find the correct rotor config for given crib."
+
+
+def test_vectorized_search_matches_per_position_search():
+    from enigma_crib_cracker_mt import crack_chunk
+    from enigma_crib_cracker_np import POSITIONS, crack_rotor_order_np
+
+    machine = build_machine()
+    ciphertext = machine.encode_message("ATTACK AT DAWN. WEATHER REPORT FOLLOWS")
+    expected = crack_chunk(rotor_ids, POSITIONS, ciphertext, "WEATHER", plugboard_pairs)
+    matches = crack_rotor_order_np(rotor_ids, ciphertext, "WEATHER", plugboard_pairs)
+    assert matches == expected
+    machine.reset_rotors()
+    assert ((rotor_ids, "".join(positions)), machine.encode_message(ciphertext)) in matches
+
+
+def test_ring_search_finds_key_with_ring_settings():
+    from enigma_crib_cracker_np import crack_rotor_order_rings_np, ring_machine
+
+    plaintext = "WETTERVORHERSAGEBISKAYAHEUTEKLAR"
+    ciphertext = ring_machine(("II", "IV", "I"), "QEV", "CJX", plugboard_pairs).encode_message(plaintext)
+    matches = crack_rotor_order_rings_np(("II", "IV", "I"), ciphertext, "WETTERVORHER", plugboard_pairs)
+
+    assert any(decoded == plaintext for _, decoded in matches)
+    for (ids, positions, rings), decoded in matches:
+        assert rings[0] == "A"
+        assert "WETTERVORHER" in decoded
+        assert ring_machine(ids, positions, rings, plugboard_pairs).encode_message(ciphertext) == decoded
+
+
+def test_m4_search_finds_key():
+    from enigma_crib_cracker_np import crack_with_crib_m4_np
+    from enigma_machine_sim import THIN_REFLECTORS
+    from enigma_stream import machine_from_key
+
+    plaintext = "FUNKSPRUCHANBDUVONUBOOTXXQUADRATAJ"
+    m4_key = (("Gamma", "VII", "III", "VI"), "KDRM")
+    ciphertext = machine_from_key(*m4_key, plugboard_pairs, rings="EAQC", reflector=THIN_REFLECTORS["C"]).encode_message(
+        plaintext
+    )
+    matches = crack_with_crib_m4_np(
+        ciphertext, "FUNKSPRUCH", plugboard_pairs, rotor_orders=[("VII", "III", "VI")],
+        greek_ids=("Gamma",), reflector_ids=("C",), rings=True,
+    )
+
+    assert any(decoded == plaintext for _, decoded in matches)
+    for (ids, positions, rings, reflector_id), decoded in matches:
+        assert rings[:2] == "AA"
+        machine = machine_from_key(ids, positions, plugboard_pairs, rings, THIN_REFLECTORS[reflector_id])
+        assert machine.encode_message(ciphertext) == decoded
+
+
+def test_bombe_recovers_unknown_plugboard():
+    from enigma_bombe import Menu, crack_with_bombe
+
+    true_plugboard = {'A': 'M', 'F': 'I', 'N': 'V', 'P': 'S', 'T': 'U', 'W': 'Z',
+                      'B': 'Q', 'C': 'G', 'D': 'L', 'E': 'K'}
+    machine = EnigmaMachine(
+        [
+            Rotor(*ROTOR_WIRINGS['II'], position='K'),
+            Rotor(*ROTOR_WIRINGS['V'], position='D'),
+            Rotor(*ROTOR_WIRINGS['III'], position='R'),
+        ],
+        reflector,
+        Plugboard(true_plugboard),
+    )
+    bombe_crib = "WETTERVORHERSAGEBISKAYA"
+    ciphertext = machine.encode_message(bombe_crib + "KEINEBESONDERENVORKOMMNISSE")
+    assert Menu(ciphertext, bombe_crib, 0).loops > 0
+
+    stops = crack_with_bombe(ciphertext, bombe_crib, offsets=[0], rotor_orders=[('II', 'V', 'III')])
+    assert stops == [((('II', 'V', 'III'), 'KDR'), 0, true_plugboard)]
+
+
+def test_crib_windows_only_at_legal_offsets():
+    from enigma_crib_cracker import (
+        crib_window_match,
+        legal_crib_offsets,
+        letter_indices,
+        letters_before,
+    )
+
+    assert legal_crib_offsets("ABCABC", "CA") == [0, 1, 3, 4]
+    assert letters_before("AB.C") == [0, 1, 2, 2]
+
+    machine = build_machine()
+    plaintext = "ATTACK AT DAWN. WEATHER REPORT FOLLOWS"
+    ciphertext = machine.encode_message(plaintext)
+    machine.reset_rotors()
+    offsets = legal_crib_offsets(ciphertext, "WEATHER")
+    offset = crib_window_match(
+        machine, letter_indices(ciphertext), letter_indices("WEATHER"), offsets, letters_before(ciphertext)
+    )
+    assert offset == plaintext.replace(" ", "").index("WEATHER")
+    assert machine.encode_message(ciphertext) == plaintext.replace(" ", "")
+
+
+def test_mt_cracker_stops_on_first_match():
+    from enigma_crib_cracker_mt import crack_with_crib_mt
+
+    ciphertext = build_machine().encode_message(message)
+    matches = crack_with_crib_mt(ciphertext, crib, plugboard_pairs, max_workers=2, stop_on_first=True)
+    assert matches == [((rotor_ids, "".join(positions)), message)]
+
+
+def test_shard_sizes_cover_keyspace():
+    from enigma_pool import chunk_ranges, shard_size_for
+
+    assert shard_size_for(17576, 100000) == 1
+    assert shard_size_for(60 * 17576, 1) == 2048
+    shards = chunk_ranges(17576, shard_size_for(17576, 7))
+    assert shards[0][0] == 0 and shards[-1][1] == 17576
+    assert all(a[1] == b[0] for a, b in zip(shards, shards[1:]))
+
+
+def test_run_bounded_limits_in_flight_tasks():
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    from enigma_pool import run_bounded
+
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    def work(x):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        with lock:
+            state["running"] -= 1
+        return x * x
+
+    submitted = []
+
+    def tasks():
+        for x in range(1000):
+            submitted.append(x)
+            yield (x,)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        stream = run_bounded(executor, work, tasks(), max_in_flight=8)
+        first = [next(stream) for _ in range(3)]
+        # Tasks are pulled lazily, never far ahead of what has been consumed
+        assert len(submitted) <= 8 + 3
+        results = first + list(stream)
+    assert sorted(result for _, result in results) == [x * x for x in range(1000)]
+    assert state["peak"] <= 8
+
+
+def test_plugboard_decryption_matches_machine():
+    from enigma_cracker_plugboard import PlugboardDecryption, decrypt_message
+
+    ciphertext = build_machine().encode_message("ATTACK AT DAWN. WEATHER REPORT FOLLOWS")
+    decryption = PlugboardDecryption(ciphertext, rotor_ids, "".join(positions))
+    for plugboard in ({}, plugboard_pairs, {'E': 'Z', 'Q': 'T', 'A': 'K'}):
+        expected = decrypt_message(ciphertext, rotor_ids, "".join(positions), plugboard)
+        assert decryption.decrypt(plugboard).tobytes().decode() == expected
+
+
+def test_ciphertext_only_ranks_true_setting_first():
+    from enigma_ciphertext_only import crack_ciphertext_only
+
+    plaintext = (
+        "THEWEATHERREPORTFORTHENORTHERNSECTORFOLLOWSATDAWNNOENEMYACTIVITYWASOBSERVED"
+        "OVERNIGHTANDTHECONVOYWILLPROCEEDASPLANNEDTOTHEHARBOURWHERETHESUPPLYSHIPSARE"
+        "WAITINGFORFURTHERORDERSFROMTHEHEADQUARTERSOFTHENORTHERNCOMMANDSTOP"
+    )
+    machine = EnigmaMachine(
+        [
+            Rotor(*ROTOR_WIRINGS['IV'], position='G'),
+            Rotor(*ROTOR_WIRINGS['I'], position='M'),
+            Rotor(*ROTOR_WIRINGS['V'], position='C'),
+        ],
+        reflector,
+        Plugboard({'A': 'K'}),
+    )
+    ciphertext = machine.encode_message(plaintext)
+    results = crack_ciphertext_only(
+        ciphertext, survivors=3, max_pairs=2,
+        rotor_orders=[('IV', 'I', 'V'), ('I', 'II', 'III')], max_workers=1,
+    )
+    (found_rotors, found_pos, _), _, _ = results[0]
+    assert (found_rotors, found_pos) == (('IV', 'I', 'V'), 'GMC')
+
+
+def test_table_store_matches_machine(tmp_path):
+    from enigma_crib_cracker_np import crack_rotor_order_np
+    from enigma_table_store import TableStore
+
+    store = TableStore(str(tmp_path))
+    table = store.table(rotor_ids)
+    machine = build_machine()
+    for pos in ("AAA", "QEV", "ZZZ"):
+        machine.set_positions(pos)
+        offsets = tuple(rotor.offset for rotor in machine.rotors)
+        assert tuple(table[offsets]) == machine.scrambler_table()
+
+    ciphertext = build_machine().encode_message(message)
+    assert crack_rotor_order_np(rotor_ids, ciphertext, crib, plugboard_pairs, table) == \
+        crack_rotor_order_np(rotor_ids, ciphertext, crib, plugboard_pairs)
+
+
+def test_table_store_invalidated_by_wiring_change(tmp_path, monkeypatch):
+    import enigma_table_store
+    from enigma_table_store import TableStore
+
+    store = TableStore(str(tmp_path))
+    old_path = store.path_for(rotor_ids)
+    store.table(rotor_ids)
+    assert store.stale_files() == []
+
+    wiring, notch = ROTOR_WIRINGS['I']
+    monkeypatch.setitem(enigma_table_store.ROTOR_WIRINGS, 'I', (wiring[1:] + wiring[0], notch))
+    assert store.path_for(rotor_ids) != old_path
+    assert store.stale_files() == [old_path]
+
+
+def test_journal_survives_torn_write(tmp_path):
+    import pytest
+    from enigma_journal import Journal
+
+    path = str(tmp_path / "sweep.journal")
+    with Journal(path, {"crib": crib}) as journal:
+        journal.record((rotor_ids, 0, 100), [])
+        journal.record((rotor_ids, 100, 200), [[[rotor_ids, "ABC"], "HELLO"]])
+    with open(path, "a") as f:
+        f.write('{"type": "shard", "key": [["I", "II"')
+
+    with Journal(path, {"crib": crib}, resume=True) as journal:
+        assert journal.is_done((rotor_ids, 0, 100)) and journal.is_done((rotor_ids, 100, 200))
+        assert not journal.is_done((rotor_ids, 200, 300))
+        assert journal.results == [((rotor_ids, "ABC"), "HELLO")]
+        journal.record((rotor_ids, 200, 300), [])
+    with Journal(path, {"crib": crib}, resume=True) as journal:
+        assert len(journal.done) == 3
+
+    with pytest.raises(ValueError):
+        Journal(path, {"crib": "OTHER"}, resume=True)
+
+
+def test_mt_cracker_resumes_from_journal(tmp_path, monkeypatch):
+    import enigma_crib_cracker_mt
+    from enigma_crib_cracker_mt import crack_with_crib_mt
+
+    path = str(tmp_path / "mt.journal")
+    ciphertext = build_machine().encode_message(message)
+    expected = [((rotor_ids, "".join(positions)), message)]
+    first = crack_with_crib_mt(
+        ciphertext, crib, plugboard_pairs, max_workers=2, stop_on_first=True, journal=path
+    )
+    assert first == expected
+
+    # Every recorded shard is skipped: the match comes from the journal alone
+    def fail(*args):
+        raise AssertionError("shard was searched again")
+
+    monkeypatch.setattr(enigma_crib_cracker_mt, "ProcessPoolExecutor", fail)
+    resumed = crack_with_crib_mt(
+        ciphertext, crib, plugboard_pairs, max_workers=2, stop_on_first=True,
+        journal=path, resume=True,
+    )
+    assert resumed == expected
+
+    # The shard size comes from the journal, so the worker count can change
+    resumed = crack_with_crib_mt(
+        ciphertext, crib, plugboard_pairs, max_workers=64, stop_on_first=True,
+        journal=path, resume=True,
+    )
+    assert resumed == expected
+
+
+def _take_shard_and_die(address, authkey):
+    import os
+    from multiprocessing.connection import Client
+
+    conn = Client(address, authkey=authkey)
+    conn.send(("hello", "doomed", os.getpid()))
+    conn.recv()
+    conn.send(("request",))
+    conn.recv()
+    os._exit(1)
+
+
+def test_cluster_matches_local_search_and_survives_dead_worker(monkeypatch):
+    import multiprocessing
+
+    import pytest
+
+    from enigma_cluster import Coordinator, crack_with_crib_cluster, crib_shards, start_local_workers
+    from enigma_crib_cracker_mt import POSITIONS, crack_chunk
+
+    ciphertext = build_machine().encode_message(message)
+    orders = [('III', 'II', 'I'), rotor_ids]
+    expected = [
+        match
+        for order in orders
+        for match in crack_chunk(order, POSITIONS, ciphertext, crib, plugboard_pairs)
+    ]
+    job = {"kind": "crib", "ciphertext": ciphertext, "crib": crib, "plugboard_pairs": plugboard_pairs}
+
+    # There is no default key
+    monkeypatch.delenv("ENIGMA_CLUSTER_KEY", raising=False)
+    with pytest.raises(ValueError):
+        Coordinator(job, [])
+
+    assert crack_with_crib_cluster(
+        ciphertext, crib, plugboard_pairs, authkey="test-key", local_workers=2, shard_size=4096,
+        rotor_orders=orders,
+    ) == expected
+
+    monkeypatch.setenv("ENIGMA_CLUSTER_KEY", "env-key")
+    with Coordinator(job, crib_shards([rotor_ids], 4096)) as coordinator:
+        doomed = multiprocessing.Process(target=_take_shard_and_die, args=(coordinator.address, b"env-key"))
+        doomed.start()
+        doomed.join()
+        workers = start_local_workers(coordinator.address, 1)
+        assert coordinator.wait(timeout=60)
+    for worker in workers:
+        worker.join()
+    assert sorted(coordinator.results) == [m for m in expected if m[0][0] == rotor_ids]
+
+
+def test_metrics_count_candidates_across_processes(tmp_path):
+    import json
+
+    from enigma_crib_cracker_mt import crack_with_crib_mt
+    from enigma_metrics import Metrics
+
+    ciphertext = build_machine().encode_message(message)
+
+    jsonl = str(tmp_path / "metrics.jsonl")
+    metrics = Metrics(export_path=jsonl)
+    matches = crack_with_crib(ciphertext, crib, plugboard_pairs, rotor_orders=[rotor_ids], metrics=metrics)
+    assert metrics.counters == {"candidates": 26 ** 3, "matches": len(matches)}
+    assert metrics.timers["decrypt"][1] == 26 ** 3
+    with open(jsonl) as f:
+        report = json.loads(f.readlines()[-1])
+    assert report["counters"]["candidates"] == 26 ** 3 and report["eta_seconds"] == 0
+
+    prom = str(tmp_path / "metrics.prom")
+    metrics = Metrics(export_path=prom, export_format="prometheus")
+    crack_with_crib_mt(
+        ciphertext, crib, plugboard_pairs, max_workers=2, rotor_orders=[rotor_ids], metrics=metrics
+    )
+    assert metrics.counters["candidates"] == 26 ** 3
+    assert sum(metrics.workers.values()) == 26 ** 3
+    with open(prom) as f:
+        text = f.read()
+    assert f"enigma_candidates_total {26 ** 3}" in text
+    assert 'enigma_time_seconds_total{phase="decrypt"}' in text
+
+
+def test_annealer_metrics_time_decrypt_and_score():
+    import random
+
+    from enigma_cracker_plugboard import simulated_annealing_plugboard_search
+    from enigma_metrics import Metrics
+
+    ciphertext = build_machine().encode_message("NOTHINGTOSEEHERE")
+    metrics = Metrics()
+    random.seed(1)
+    simulated_annealing_plugboard_search(
+        ciphertext, "ZZZZZ", rotor_ids, "AAA", {'E': 'F', 'F': 'E', 'G': 'H', 'H': 'G'},
+        num_iterations=200, metrics=metrics,
+    )
+    assert metrics.timers["decrypt"][1] == 200
+    assert metrics.timers["score"][1] == 200
+
+
+def test_background_crack_job_reports_and_cancels():
+    from concurrent.futures import ProcessPoolExecutor
+
+    from enigma_jobs import CrackJob
+
+    ciphertext = build_machine().encode_message(message)
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        job = CrackJob(executor, ciphertext, crib, plugboard_pairs, rotor_orders=[rotor_ids]).start()
+        assert job.wait(timeout=60)
+        assert job.status == CrackJob.FINISHED and job.progress == 1.0
+        assert ((rotor_ids, "".join(positions)), message) in job.matches
+
+        job = CrackJob(executor, ciphertext, crib, plugboard_pairs, shard_size=64).start()
+        job.cancel()
+        assert job.wait(timeout=60)
+        assert job.status == CrackJob.CANCELLED and job.searched < job.total
+
+
+def test_crack_async_streams_shares_pool_and_cancels():
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor
+
+    from enigma_async import SharedPool, crack_async
+
+    ciphertext = build_machine().encode_message(message)
+    expected = ((rotor_ids, "".join(positions)), message)
+
+    async def collect(pool, **kwargs):
+        return [match async for match in crack_async(ciphertext, crib, plugboard_pairs, pool=pool, **kwargs)]
+
+    async def main(executor):
+        pool = SharedPool(executor, slots=2)
+        # Two jobs at once on one pool, one of them with a tiny match queue
+        first, second = await asyncio.gather(
+            collect(pool, rotor_orders=[rotor_ids], shard_size=1024),
+            collect(pool, rotor_orders=[rotor_ids, ("II", "III", "I")], shard_size=2048, queue_size=1),
+        )
+        assert expected in first and expected in second
+
+        # Cancelling the consuming task stops the sweep
+        job = asyncio.create_task(collect(pool, shard_size=256))
+        await asyncio.sleep(0.2)
+        job.cancel()
+        try:
+            await job
+        except asyncio.CancelledError:
+            pass
+        assert job.cancelled()
+        for _ in range(100):
+            if pool.in_flight == 0:
+                break
+            await asyncio.sleep(0.1)
+        assert pool.in_flight == 0
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        asyncio.run(main(executor))
+
+
+def test_job_server_runs_prioritised_jobs_over_http():
+    import json
+    import threading
+    import urllib.request
+
+    from enigma_server import JobServer, make_http_server
+
+    jobs = JobServer(workers=1, slots=1).start()
+    server = make_http_server(jobs, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/jobs"
+
+    def call(method, path="", body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(url + path, data=data, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    try:
+        ciphertext = build_machine().encode_message(message)
+        status, crack = call("POST", body={
+            "kind": "crack", "ciphertext": ciphertext, "crib": crib, "plugboard": "AB CD", "priority": 5,
+            "rotor_orders": [list(ids) for ids in [("II", "I", "III"), ("III", "II", "I")] * 6 + [rotor_ids]],
+        })
+        assert status == 202
+        _, encode = call("POST", body={
+            "kind": "encode", "rotors": list(rotor_ids), "positions": "AAA", "message": message,
+            "plugboard": ["AB", "CD"],
+        })
+        _, batch = call("POST", body={
+            "kind": "batch-encode", "messages": [message, "ZZZ"],
+            "keys": [[list(rotor_ids), "AAA", "AB CD"], [["V", "I", "II"], "QRS", [], "ABC"]],
+        })
+
+        _, result = call("GET", f"/{encode['id']}?wait=60")
+        assert result["status"] == "finished" and result["result"] == ciphertext
+        # The urgent encode overtook the long crack queued before it
+        assert call("GET", f"/{crack['id']}")[1]["status"] == "running"
+
+        _, result = call("GET", f"/{batch['id']}?wait=60")
+        assert result["result"][0] == ciphertext and len(result["result"][1]) == 3
+
+        _, result = call("GET", f"/{crack['id']}?wait=60")
+        assert result["status"] == "finished" and result["progress"] == 1.0
+        assert {"rotors": list(rotor_ids), "positions": "AAA", "decoded": message} in result["result"]
+
+        _, slow = call("POST", body={"kind": "crack", "ciphertext": ciphertext, "crib": crib})
+        assert call("DELETE", f"/{slow['id']}")[1]["status"] == "cancelled"
+        assert call("POST", body={"kind": "decode"})[0] == 400
+        assert call("GET", "/999")[0] == 404
+
+        _, empty = call("POST", body={"kind": "batch-encode", "keys": [], "messages": []})
+        _, result = call("GET", f"/{empty['id']}?wait=5")
+        assert result["status"] == "finished" and result["result"] == []
+        assert len(call("GET")[1]) == 5
+    finally:
+        server.shutdown()
+        server.server_close()
+        jobs.close()
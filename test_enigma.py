@@ -1,3 +1,8 @@
+import logging
+import pickle
+
+import pytest
+
 from enigma_machine_sim import (
     REFLECTOR_B,
     ROTOR_WIRINGS,
@@ -41,3 +46,278 @@ def test_repeatability():
     out1 = machine1.encode_message(message)
     out2 = machine2.encode_message(message)
     assert out1 == out2, "Same configuration should produce same output"
+
+def test_known_ciphertext():
+    assert build_machine(positions).encode_message(message) == "ILACBBMTBE"
+    long_message = "THEQUICKBROWNFOXJUMPSOVERTHELAZYDOG" * 2
+    assert build_machine("QEV").encode_message(long_message) == (
+        "QMNCIXPTQFQZJRXNRMZZHDFZXGAGDYPHPZOVNYVKAPTZVZBDXWTRDFXYANNSFCSJGTZUHC"
+    )
+
+def test_debug_path_matches_fast_path(caplog):
+    long_message = "THE QUICK BROWN FOX JUMPS OVER THE LAZY DOG" * 3
+    fast = build_machine("QEV").encode_message(long_message)
+    with caplog.at_level(logging.DEBUG, logger="enigma_machine_sim"):
+        traced = build_machine("QEV").encode_message(long_message)
+    assert traced == fast
+    assert "Final encoded letter" in caplog.text
+
+def test_tables_follow_wiring_and_mapping():
+    machine = build_machine(positions)
+    machine.plugboard.mapping = {'A': 'C', 'C': 'A'}
+    machine.rotors[0].wiring = ROTOR_WIRINGS['IV'][0]
+    fast = machine.encode_message(message)
+    reference = EnigmaMachine(
+        [
+            Rotor(*ROTOR_WIRINGS['IV'][:1], ROTOR_WIRINGS[rotor_ids[0]][1]),
+            Rotor(*ROTOR_WIRINGS[rotor_ids[1]]),
+            Rotor(*ROTOR_WIRINGS[rotor_ids[2]]),
+        ],
+        reflector,
+        Plugboard({'A': 'C'}),
+    )
+    assert fast == reference.encode_message(message)
+
+    # Editing the mapping in place keeps the table in step as well
+    machine.reset_rotors()
+    machine.plugboard.mapping['C'] = 'E'
+    machine.plugboard.mapping['E'] = 'C'
+    del machine.plugboard.mapping['A']
+    reference.plugboard = Plugboard({'C': 'E'})
+    reference.reset_rotors()
+    assert machine.encode_message(message) == reference.encode_message(message)
+    assert pickle.loads(pickle.dumps(machine.plugboard)).table == machine.plugboard.table
+
+def test_shared_tables_are_read_only():
+    with pytest.raises(TypeError):
+        Rotor(*ROTOR_WIRINGS['I']).forward[0] = 0
+
+def test_walk_positions_reuses_one_machine():
+    machine = build_machine(positions)
+    rotors = list(machine.rotors)
+    for pos in machine.walk_positions(["AAA", "AAB", "QEV", "ZZZ"]):
+        assert machine.encode_message(message) == build_machine(pos).encode_message(message)
+        machine.reset_rotors()
+        assert "".join(rotor.position for rotor in machine.rotors) == pos
+    assert machine.rotors == rotors
+
+def test_advance_matches_stepping():
+    stepped = build_machine("ADU")
+    jumped = build_machine("ADU")
+    for _ in range(5000):
+        stepped.step_rotors()
+    jumped.advance(5000)
+    assert [r.offset for r in stepped.rotors] == [r.offset for r in jumped.rotors]
+
+def test_stream_matches_whole_message():
+    text = "Attack at dawn, 0600 hours! " * 40
+    expected = build_machine(positions).encode_message(text)
+
+    machine = build_machine(positions)
+    pieces = [text[k:k + 37] for k in range(0, len(text), 37)]
+    assert ''.join(machine.encode_stream(pieces)) == expected
+
+    machine = build_machine(positions)
+    data = text.encode()
+    chunks = [memoryview(data)[k:k + 50] for k in range(0, len(data), 50)]
+    assert b''.join(machine.encode_stream(chunks)) == expected.encode()
+
+def test_encode_file_and_cli_round_trip(tmp_path):
+    import io
+
+    from enigma_stream import encode_file, machine_from_key
+    from enigma_stream import main as stream_main
+
+    text = ("Weather report, sector 7: clear skies.\n" * 500).encode()
+    out = io.BytesIO()
+    assert encode_file(build_machine(positions), io.BytesIO(text), out, chunk_size=333) == len(text)
+    assert out.getvalue() == build_machine(positions).encode_bytes(text)
+
+    plain, cipher, back = tmp_path / "plain.txt", tmp_path / "cipher.txt", tmp_path / "back.txt"
+    plain.write_bytes(text)
+    key = ["--rotors", "II", "IV", "V", "--positions", "BLA", "--plugboard", "AQ", "EZ"]
+    assert stream_main([str(plain), str(cipher), *key, "--chunk-size", "4096"]) == 0
+    expected = machine_from_key(("II", "IV", "V"), "BLA", {"A": "Q", "Q": "A", "E": "Z", "Z": "E"})
+    assert cipher.read_bytes() == expected.encode_bytes(text)
+    assert stream_main([str(cipher), str(back), *key]) == 0
+    assert back.read_bytes() == text.upper().replace(b" ", b"")
+
+def test_seek_matches_encoding_the_prefix():
+    text = "THEQUICKBROWNFOXJUMPSOVERTHELAZYDOG" * 300
+    full = build_machine("QDV").encode_message(text)
+    machine = build_machine("QDV")
+    for offset in (0, 1, 25, 676, 5000, 10499):
+        machine.seek(offset)
+        assert machine.encode_message(text[offset:offset + 40]) == full[offset:offset + 40]
+
+def test_snapshot_and_restore():
+    machine = build_machine("ADU")
+    machine.encode_message("PREFIX")
+    state = machine.snapshot()
+    first = machine.encode_message("SOMETEXT")
+    machine.set_positions("ZZZ")
+    machine.restore(state)
+    assert machine.encode_message("SOMETEXT") == first
+    machine.reset_rotors()
+    assert "".join(rotor.position for rotor in machine.rotors) == "ADU"
+
+def test_batch_encode_matches_single_messages():
+    import random
+
+    from enigma_batch import encode_batch
+
+    rng = random.Random(7)
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    keys, messages = [], []
+    for _ in range(300):
+        cables = rng.sample(letters, 6)
+        keys.append((
+            tuple(rng.sample(list(ROTOR_WIRINGS), 3)),
+            "".join(rng.choice(letters) for _ in range(3)),
+            {cables[0]: cables[1], cables[2]: cables[3], cables[4]: cables[5]},
+            "".join(rng.choice(letters) for _ in range(3)),
+        ))
+        messages.append("".join(rng.choice(letters + " az,.1é") for _ in range(rng.randint(0, 700))))
+
+    expected = []
+    for (ids, pos, pairs, rings), text in zip(keys, messages):
+        rotors = [Rotor(*ROTOR_WIRINGS[r], position=p, ring=g) for r, p, g in zip(ids, pos, rings)]
+        expected.append(EnigmaMachine(rotors, reflector, Plugboard(pairs)).encode_message(text))
+    assert encode_batch(keys, messages) == expected
+    assert encode_batch([key[:3] for key in keys[:5]], messages[:5]) == [
+        EnigmaMachine(
+            [Rotor(*ROTOR_WIRINGS[r], position=p) for r, p in zip(ids, pos)], reflector, Plugboard(pairs)
+        ).encode_message(text)
+        for (ids, pos, pairs, _), text in zip(keys[:5], messages[:5])
+    ]
+
+def test_keystream_table_matches_machine():
+    from enigma_keystream import PERIOD, KeystreamTable
+
+    data = (b"Convoy sails at 0400, route B. " * 700) + b"end!"
+    expected = build_machine("QDV").encode_bytes(data)
+
+    table = KeystreamTable(build_machine("QDV"))
+    view = memoryview(data)
+    assert b"".join(table.encode_bytes(view[k:k + 999]) for k in range(0, len(data), 999)) == expected
+
+    out = bytearray(len(data))
+    eager = KeystreamTable(build_machine("QDV"), lazy=False)
+    assert bytes(out[:eager.encode_into(bytearray(data), out)]) == expected
+
+    # Rotor states repeat with the table's period
+    machine = build_machine("QDV")
+    for press in (0, 700, PERIOD - 1, PERIOD, PERIOD + 700):
+        machine.seek(press)
+        letter = machine.encode_index(4)
+        assert table.permutation(press)[4] == letter
+
+def test_ring_settings(caplog):
+    from enigma_keystream import KeystreamTable
+    from enigma_stream import machine_from_key
+
+    # Published test vectors for rotors I-II-III, reflector B, start AAA
+    assert machine_from_key(rotor_ids, "AAA").encode_message("AAAAA") == "BDZGO"
+    assert machine_from_key(rotor_ids, "AAA", rings="BBB").encode_message("AAAAA") == "EWTYX"
+
+    text = "KEINE BESONDEREN EREIGNISSE " * 40
+    machine = build_machine("QDV")
+    machine.set_rings("CJX")
+    assert [rotor.ring for rotor in machine.rotors] == ["C", "J", "X"]
+    expected = machine.encode_message(text)
+    machine.reset_rotors()
+    assert KeystreamTable(machine).encode_bytes(text.encode()).decode() == expected
+    machine.reset_rotors()
+    with caplog.at_level(logging.DEBUG, logger="enigma_machine_sim"):
+        assert machine.encode_message(text[:60]) == expected[:len(text[:60].replace(' ', ''))]
+
+    # Changing the ring of a rotor is the same as turning its wiring back
+    rotor = Rotor(*ROTOR_WIRINGS["IV"], position="D", ring="C")
+    plain = Rotor(*ROTOR_WIRINGS["IV"], position="B")
+    assert rotor.forward_at[rotor.offset] == plain.forward_at[plain.offset]
+    rotor.ring = "A"
+    assert rotor.forward_at == plain.forward_at
+
+def test_m4_machine(caplog):
+    from enigma_keystream import KeystreamTable
+    from enigma_machine_sim import REFLECTOR_C, THIN_REFLECTORS
+    from enigma_stream import machine_from_key
+
+    # Beta at A with thin B acts as reflector B, Gamma at A with thin C as C
+    text = "UBOOTMELDUNGQUADRATBRAVO" * 30
+    for greek, thin, full in (("Beta", "B", REFLECTOR_B), ("Gamma", "C", REFLECTOR_C)):
+        m4 = machine_from_key((greek, "II", "IV", "I"), "AQEV", rings="ABCD", reflector=THIN_REFLECTORS[thin])
+        m3 = machine_from_key(("II", "IV", "I"), "QEV", rings="BCD", reflector=full)
+        assert m4.encode_message(text) == m3.encode_message(text)
+
+    # Double-notch rotors turn their neighbour over at both notches
+    machine = machine_from_key(("Beta", "VI", "VII", "VIII"), "RLYK", rings="AMCZ", reflector=THIN_REFLECTORS["B"])
+    offsets = []
+    for _ in range(1500):
+        machine.encode_index(0)
+        offsets.append(tuple(rotor.offset for rotor in machine.rotors))
+    assert all(state[0] == 17 for state in offsets)
+    middle_turns = sum(1 for a, b in zip(offsets, offsets[1:]) if a[2] != b[2])
+    assert 110 <= middle_turns <= 120
+    for press in (1, 13, 26, 27, 700, 1499):
+        machine.seek(press)
+        assert tuple(rotor.offset for rotor in machine.rotors) == offsets[press - 1]
+
+    machine.reset_rotors()
+    expected = machine.encode_message(text)
+    machine.reset_rotors()
+    assert KeystreamTable(machine).encode_bytes(text.encode()).decode() == expected
+    machine.reset_rotors()
+    with caplog.at_level(logging.DEBUG, logger="enigma_machine_sim"):
+        assert machine.encode_message(text[:80]) == expected[:80]
+
+
+def test_m4_cli_round_trip(tmp_path):
+    from enigma_machine_sim import THIN_REFLECTORS
+    from enigma_stream import machine_from_key
+    from enigma_stream import main as stream_main
+
+    plain, cipher, back = tmp_path / "plain.txt", tmp_path / "cipher.txt", tmp_path / "back.txt"
+    plain.write_bytes(b"VONVONJLOOKSJHFFTTTEINSEINSDREIZWOYYQNNS" * 50)
+    key = ["--rotors", "Beta", "II", "IV", "I", "--positions", "VJNA", "--rings", "AAAV"]
+    assert stream_main([str(plain), str(cipher), *key]) == 0
+    expected = machine_from_key(("Beta", "II", "IV", "I"), "VJNA", rings="AAAV", reflector=THIN_REFLECTORS["B"])
+    assert cipher.read_bytes() == expected.encode_bytes(plain.read_bytes())
+    assert stream_main([str(cipher), str(back), *key]) == 0
+    assert back.read_bytes() == plain.read_bytes()
+    with pytest.raises(SystemExit):
+        stream_main([str(plain), str(cipher), "--rotors", "II", "Beta", "IV", "I", "--positions", "AAAA"])
+
+def test_enigma_cli(capsys, monkeypatch, tmp_path):
+    import io
+    import sys
+
+    from enigma_cli import main as cli_main
+
+    key = ["--rotors", "II", "IV", "V", "--positions", "BLA", "--rings", "AJX", "--plugboard", "AQ", "EZ"]
+    assert cli_main(["encode", "ATTACK AT DAWN", *key]) == 0
+    ciphertext = capsys.readouterr().out.strip()
+    assert cli_main(["decode", ciphertext, *key]) == 0
+    assert capsys.readouterr().out.strip() == "ATTACKATDAWN"
+
+    # stdin to stdout, with and without a keystream table
+    for table in ([], ["--table"]):
+        monkeypatch.setattr("sys.stdin", io.TextIOWrapper(io.BytesIO(b"Attack at dawn!\n")))
+        monkeypatch.setattr("sys.stdout", io.TextIOWrapper(io.BytesIO()))
+        assert cli_main(["encode", *key, *table]) == 0
+        sys.stdout.flush()
+        assert sys.stdout.buffer.getvalue() == (ciphertext[:12] + "!\n").encode()
+    monkeypatch.undo()
+
+    monkeypatch.chdir(tmp_path)
+    plain = build_machine(positions).encode_message(message)
+    assert cli_main(["crack-crib", plain, "HELLO", "--plugboard", "AB", "CD"]) == 0
+    assert f"I II III AAA {message}" in capsys.readouterr().out.splitlines()
+    assert list(tmp_path.iterdir()) == []
+
+    assert cli_main(["crack-plugboard", plain, "HELLO", "--rotors", "I", "II", "III", "--positions", "AAA",
+                     "--initial", "AB", "CD", "--iterations", "10", "--seed", "1"]) == 0
+    assert f"Decryption: {message}" in capsys.readouterr().out
+
+    with pytest.raises(SystemExit):
+        cli_main(["encode", "HI", "--positions", "AA"])
@@ -0,0 +1,79 @@
+import random
+
+import numpy as np
+
+from enigma_scoring import (
+    IoCScorer,
+    NgramScorer,
+    QuadgramScorer,
+    UnigramScorer,
+    load_ngram_scorer,
+)
+
+corpus = (
+    "THE WEATHER REPORT FOR THE NORTHERN SECTOR FOLLOWS AT DAWN. NO ENEMY "
+    "ACTIVITY WAS OBSERVED OVERNIGHT AND THE CONVOY WILL PROCEED AS PLANNED "
+    "TO THE HARBOUR WHERE THE SUPPLY SHIPS ARE WAITING FOR FURTHER ORDERS"
+)
+english = "THEWEATHERFORTHENORTHERNSECTORISCLEARANDTHECONVOYWILLPROCEED"
+
+
+def as_array(text):
+    return np.frombuffer(text.encode(), dtype=np.uint8).copy()
+
+
+def random_text(length, seed=0):
+    rnd = random.Random(seed)
+    return ''.join(rnd.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(length))
+
+
+def test_scorers_prefer_english():
+    noise = random_text(len(english))
+    for scorer in (UnigramScorer(), QuadgramScorer.from_corpus(corpus, 4), IoCScorer()):
+        assert scorer.score(as_array(english)) > scorer.score(as_array(noise))
+
+
+def test_rescore_matches_full_score():
+    old = as_array(english)
+    new = old.copy()
+    changed = np.array([0, 7, 8, len(new) - 1])
+    new[changed] = as_array("QXZ.")
+    for scorer in (
+        UnigramScorer(),
+        NgramScorer.from_corpus(corpus, 2),
+        NgramScorer.from_corpus(corpus, 3),
+        QuadgramScorer.from_corpus(corpus, 4),
+        IoCScorer(),
+    ):
+        expected = scorer.score(new)
+        assert abs(scorer.rescore(old, new, changed, scorer.score(old)) - expected) < 1e-6
+
+
+def test_batch_scoring_matches_single():
+    texts = np.stack([as_array(english), as_array(random_text(len(english), 1)), as_array(english[::-1])])
+    for scorer in (UnigramScorer(), QuadgramScorer.from_corpus(corpus, 4), IoCScorer()):
+        batch = scorer.score_batch(texts)
+        assert np.allclose(batch, [scorer.score(row) for row in texts])
+
+
+def test_load_ngram_scorer_from_counts_file(tmp_path):
+    path = tmp_path / "quadgrams.txt"
+    path.write_text("TION 300\nNTHE 200\nTHER 100\n")
+    scorer = load_ngram_scorer(str(path))
+    assert isinstance(scorer, QuadgramScorer)
+    assert load_ngram_scorer(str(path)) is scorer
+    assert scorer.score(as_array("TION")) > scorer.score(as_array("THER"))
+
+
+def test_annealer_accepts_scorer():
+    from enigma_cracker_plugboard import decrypt_message, simulated_annealing_plugboard_search
+
+    true_plugboard = {'A': 'B', 'B': 'A', 'C': 'D', 'D': 'C'}
+    ciphertext = decrypt_message(english, ('I', 'II', 'III'), 'AAA', true_plugboard)
+    random.seed(0)
+    best_plugboard, best_score = simulated_annealing_plugboard_search(
+        ciphertext, "WEATHER", ('I', 'II', 'III'), 'AAA', true_plugboard,
+        num_iterations=50, scorer=QuadgramScorer.from_corpus(corpus, 4),
+    )
+    assert best_plugboard == true_plugboard
+    assert isinstance(best_score, float)